@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+价格告警 - 在轮询路径上对每条新报价评估告警规则
+规则类型：价格穿越阈值（price_cross）、时间窗口内的涨跌幅（pct_change）、
+比值相对窗口均值的偏离（ratio_deviation，SOL/代币比值或跨链比值）。
+每个规则按代币（或代币对）维护增量的滚动窗口状态，不需要重新读取历史记录；
+条件持续成立时只告警一次（条件解除后重新生效），同一告警在冷却期内不重复发送。
+告警写入日志，并由后台线程投递到本地webhook或文件（JSON Lines）
+"""
+
+import abc
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from history_store import format_timestamp
+
+
+logger = logging.getLogger(__name__)
+
+# 规则可以观测的序列：名称 -> (记录类型, 数值字段)
+SERIES = {
+    'price': ('prices', 'token_price'),
+    'sol_ratio': ('prices', 'sol_to_token'),
+    'cross_chain_ratio': ('comparisons', 'sol_to_eth_ratio'),
+}
+
+
+class RollingWindow:
+    """时间窗口内的观测值：双端队列 + 滚动和，新值进入时淘汰过期值（每次观测摊还O(1)）"""
+    
+    __slots__ = ('window', 'values', 'total')
+    
+    def __init__(self, window: float):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+    
+    def __len__(self) -> int:
+        return len(self.values)
+    
+    def add(self, ts: float, value: float):
+        self.evict(ts)
+        self.values.append((ts, value))
+        self.total += value
+    
+    def evict(self, now: float):
+        """移除早于 now - window 的观测值"""
+        cutoff = now - self.window
+        while self.values and self.values[0][0] < cutoff:
+            self.total -= self.values.popleft()[1]
+        if not self.values:
+            self.total = 0.0
+    
+    @property
+    def first(self) -> Optional[float]:
+        """窗口内最早的观测值"""
+        return self.values[0][1] if self.values else None
+    
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / len(self.values) if self.values else None
+
+
+class AlertRule(abc.ABC):
+    """
+    告警规则基类：按主体（代币地址或代币对）分别维护状态
+    
+    evaluate 返回本次观测后各方向的条件是否成立；条件从不成立变为成立时才产生告警
+    """
+    
+    kind = ''
+    # 第一次观测到某个主体时是否允许告警（穿越类规则需要先有上一次的值）
+    fire_on_first = True
+    
+    def __init__(self, name: str, series: str = 'price', tokens: Optional[List[str]] = None,
+                 pairs: Optional[List[Tuple[str, str]]] = None):
+        if series not in SERIES:
+            raise ValueError(f"未知的告警序列: {series}（可选: {', '.join(SERIES)}）")
+        self.name = name
+        self.series = series
+        self.stream, self.field = SERIES[series]
+        self.tokens = {token.lower() for token in tokens} if tokens else None
+        self.pairs = {(sol.lower(), eth.lower()) for sol, eth in pairs} if pairs else None
+        self._active: Dict[Tuple, bool] = {}
+    
+    def subject(self, record: Dict) -> Optional[Tuple[str, ...]]:
+        """记录对应的告警主体，不属于该规则时返回None"""
+        if self.stream == 'prices':
+            address = record['token_address']
+            if self.tokens is not None and address.lower() not in self.tokens:
+                return None
+            return (address,)
+        pair = (record['sol_token_address'], record['eth_token_address'])
+        lowered = (pair[0].lower(), pair[1].lower())
+        if self.pairs is not None and lowered not in self.pairs:
+            return None
+        if self.tokens is not None and not self.tokens.intersection(lowered):
+            return None
+        return pair
+    
+    @abc.abstractmethod
+    def evaluate(self, subject: Tuple[str, ...], ts: float, value: float) -> List[Tuple[str, bool, Dict]]:
+        """返回 [(方向, 条件是否成立, 告警详情)]"""
+    
+    def observe(self, subject: Tuple[str, ...], ts: float, value: float) -> List[Tuple[str, Dict]]:
+        """评估一次观测，返回新触发的 [(方向, 告警详情)]"""
+        triggered = []
+        for direction, active, details in self.evaluate(subject, ts, value):
+            key = (subject, direction)
+            was_active = self._active.get(key)
+            self._active[key] = active
+            if active and not was_active and (was_active is not None or self.fire_on_first):
+                triggered.append((direction, details))
+        return triggered
+
+
+class PriceCrossRule(AlertRule):
+    """数值向上穿越 above 或向下穿越 below"""
+    
+    kind = 'price_cross'
+    fire_on_first = False
+    
+    def __init__(self, name: str, above: Optional[float] = None, below: Optional[float] = None, **kwargs):
+        super().__init__(name, **kwargs)
+        if above is None and below is None:
+            raise ValueError(f"告警规则 {name} 需要设置 above 或 below")
+        self.above = above
+        self.below = below
+    
+    def evaluate(self, subject, ts, value):
+        results = []
+        if self.above is not None:
+            results.append(('above', value > self.above, {'reference': self.above}))
+        if self.below is not None:
+            results.append(('below', value < self.below, {'reference': self.below}))
+        return results
+
+
+class PercentChangeRule(AlertRule):
+    """数值相对 window 秒内最早观测值的涨跌幅超过 threshold"""
+    
+    kind = 'pct_change'
+    
+    def __init__(self, name: str, threshold: float, window: float = 3600, **kwargs):
+        super().__init__(name, **kwargs)
+        self.threshold = threshold
+        self.window = window
+        self._windows: Dict[Tuple[str, ...], RollingWindow] = {}
+    
+    def evaluate(self, subject, ts, value):
+        window = self._windows.get(subject)
+        if window is None:
+            window = self._windows[subject] = RollingWindow(self.window)
+        window.add(ts, value)
+        reference = window.first
+        change = value / reference - 1 if reference else 0.0
+        details = {'reference': reference, 'change': change}
+        return [('up', change > self.threshold, details), ('down', change < -self.threshold, details)]
+
+
+class RatioDeviationRule(AlertRule):
+    """数值（默认SOL/代币比值）相对 window 秒内均值的偏离超过 threshold，窗口内至少需要 min_samples 个历史值"""
+    
+    kind = 'ratio_deviation'
+    
+    def __init__(self, name: str, threshold: float, window: float = 3600, min_samples: int = 3,
+                 series: str = 'sol_ratio', **kwargs):
+        super().__init__(name, series=series, **kwargs)
+        self.threshold = threshold
+        self.window = window
+        self.min_samples = max(1, min_samples)
+        self._windows: Dict[Tuple[str, ...], RollingWindow] = {}
+    
+    def evaluate(self, subject, ts, value):
+        window = self._windows.get(subject)
+        if window is None:
+            window = self._windows[subject] = RollingWindow(self.window)
+        window.evict(ts)
+        # 先与窗口内的历史均值比较，再把当前值加入窗口
+        mean = window.mean if len(window) >= self.min_samples else None
+        window.add(ts, value)
+        if not mean:
+            return [('above', False, {}), ('below', False, {})]
+        deviation = value / mean - 1
+        details = {'reference': mean, 'change': deviation}
+        return [('above', deviation > self.threshold, details), ('below', deviation < -self.threshold, details)]
+
+
+RULE_TYPES = {rule.kind: rule for rule in (PriceCrossRule, PercentChangeRule, RatioDeviationRule)}
+
+
+def build_rule(config: Dict) -> AlertRule:
+    """
+    根据配置创建规则：
+    {"name": ..., "type": "price_cross|pct_change|ratio_deviation", "series": "price|sol_ratio|cross_chain_ratio",
+     "token": <地址或地址列表>, "pair": [<SOL代币地址>, <ETH代币地址>], 以及各类型的参数}
+    """
+    config = dict(config)
+    rule_type = config.pop('type', None)
+    if rule_type not in RULE_TYPES:
+        raise ValueError(f"未知的告警规则类型: {rule_type}（可选: {', '.join(RULE_TYPES)}）")
+    name = config.pop('name', None) or rule_type
+    token = config.pop('token', None)
+    if token not in (None, '*'):
+        config['tokens'] = [token] if isinstance(token, str) else list(token)
+    pair = config.pop('pair', None)
+    if pair:
+        sol, eth = pair.split('/', 1) if isinstance(pair, str) else pair
+        config['pairs'] = [(sol, eth)]
+        config.setdefault('series', 'cross_chain_ratio')
+    return RULE_TYPES[rule_type](name, **config)
+
+
+# ---------- 告警投递 ----------
+
+class FileSink:
+    """把告警以JSON Lines格式追加到本地文件"""
+    
+    def __init__(self, path: str):
+        self.path = path
+    
+    def describe(self) -> str:
+        return self.path
+    
+    def send(self, alert: Dict):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(alert, ensure_ascii=False) + '\n')
+
+
+class WebhookSink:
+    """把告警以JSON POST到webhook（如本地的通知转发服务）"""
+    
+    def __init__(self, url: str, timeout: float = 5, headers: Optional[Dict[str, str]] = None):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+    
+    def describe(self) -> str:
+        return self.url
+    
+    def send(self, alert: Dict):
+        response = self.session.post(self.url, json=alert, timeout=self.timeout)
+        response.raise_for_status()
+
+
+def build_sink(config: Dict):
+    """根据配置创建投递目标：{"type": "file", "path": ...} 或 {"type": "webhook", "url": ...}"""
+    sink_type = config.get('type')
+    if sink_type == 'file':
+        return FileSink(config['path'])
+    if sink_type == 'webhook':
+        return WebhookSink(config['url'], timeout=float(config.get('timeout', 5)), headers=config.get('headers'))
+    raise ValueError(f"未知的告警投递类型: {sink_type}（可选: file, webhook）")
+
+
+class AlertEngine:
+    """
+    告警引擎：observe 在轮询线程中同步评估规则（只更新内存状态），
+    触发的告警经冷却期过滤后放入队列，由后台线程投递到各个目标，投递失败不影响轮询
+    """
+    
+    def __init__(self, rules: List[AlertRule], sinks: List, cooldown: float = 300, metrics=None):
+        self.rules = rules
+        self.sinks = sinks
+        self.cooldown = cooldown
+        self.metrics = metrics
+        self._by_stream: Dict[str, List[AlertRule]] = {}
+        for rule in rules:
+            self._by_stream.setdefault(rule.stream, []).append(rule)
+        self._last_sent: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.close)
+    
+    @classmethod
+    def from_config(cls, config: Dict, metrics=None, cooldown: float = 300) -> 'AlertEngine':
+        """
+        根据配置创建告警引擎：
+        {"cooldown": 300, "rules": [...], "sinks": [{"type": "webhook", "url": ...}, {"type": "file", "path": ...}]}
+        """
+        rules = [build_rule({'name': f"rule{i + 1}", **rule}) for i, rule in enumerate(config.get('rules', []))]
+        sinks = [build_sink(sink) for sink in config.get('sinks', [])]
+        return cls(rules, sinks, cooldown=float(config.get('cooldown', cooldown)), metrics=metrics)
+    
+    def observe(self, stream: str, records: List[Dict]) -> List[Dict]:
+        """对一批新记录（prices 或 comparisons）评估规则，返回本次发出的告警"""
+        rules = self._by_stream.get(stream)
+        if not rules or not records:
+            return []
+        alerts = []
+        with self._lock:
+            for record in records:
+                for rule in rules:
+                    subject = rule.subject(record)
+                    value = record.get(rule.field)
+                    if subject is None or not value:
+                        continue
+                    for direction, details in rule.observe(subject, record['ts'], float(value)):
+                        alert = self._make_alert(rule, subject, direction, record, float(value), details)
+                        if self._admit(alert):
+                            alerts.append(alert)
+        for alert in alerts:
+            logger.warning("🚨 %s", alert['message'])
+            if self.sinks:
+                self._enqueue(alert)
+        return alerts
+    
+    def _admit(self, alert: Dict) -> bool:
+        """冷却期内相同的告警（规则、主体、方向相同）只发送一次"""
+        now = time.monotonic()
+        last = self._last_sent.get(alert['id'])
+        if last is not None and now - last < self.cooldown:
+            self._count(alert['rule'], 'suppressed')
+            return False
+        self._last_sent[alert['id']] = now
+        self._count(alert['rule'], 'fired')
+        return True
+    
+    def _make_alert(self, rule: AlertRule, subject: Tuple[str, ...], direction: str, record: Dict,
+                    value: float, details: Dict) -> Dict:
+        if rule.stream == 'prices':
+            symbol = record.get('token_symbol') or subject[0][:8]
+        else:
+            symbol = f"{record.get('sol_token_symbol') or subject[0][:8]}/{record.get('eth_token_symbol') or subject[1][:8]}"
+        reference = details.get('reference')
+        change = details.get('change')
+        if rule.kind == 'price_cross':
+            text = f"{'向上' if direction == 'above' else '向下'}穿越 {reference:.8g}"
+        elif rule.kind == 'pct_change':
+            text = f"{rule.window:.0f}秒内变化 {change:+.2%}（起点 {reference:.8g}）"
+        else:
+            text = f"偏离{rule.window:.0f}秒均值 {change:+.2%}（均值 {reference:.8g}）"
+        return {
+            'id': f"{rule.name}:{'/'.join(subject)}:{direction}",
+            'rule': rule.name,
+            'type': rule.kind,
+            'series': rule.series,
+            'subject': list(subject),
+            'symbol': symbol,
+            'direction': direction,
+            'value': value,
+            'reference': reference,
+            'change': change,
+            'ts': record['ts'],
+            'time': format_timestamp(record['ts']),
+            'message': f"[{rule.name}] {symbol} {rule.series} = {value:.8g}，{text}"
+        }
+    
+    def _count(self, rule: str, result: str):
+        if self.metrics is not None:
+            self.metrics.alerts.inc(rule, result)
+    
+    def _enqueue(self, alert: Dict):
+        # 多个轮询线程可能同时发出第一条告警，在锁内启动投递线程，保证只启动一个
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._deliver_loop, name='alert-delivery', daemon=True)
+                self._thread.start()
+        self._queue.put(alert)
+    
+    def _deliver_loop(self):
+        while True:
+            alert = self._queue.get()
+            try:
+                if alert is None:
+                    return
+                self._deliver(alert)
+            finally:
+                self._queue.task_done()
+    
+    def _deliver(self, alert: Dict):
+        for sink in self.sinks:
+            try:
+                sink.send(alert)
+            except Exception as e:
+                logger.warning("⚠️ 告警投递失败 %s: %s", sink.describe(), e)
+                self._count(alert['rule'], 'failed')
+    
+    def close(self, timeout: float = 5):
+        """等待队列中的告警投递完成（最多 timeout 秒）并停止后台线程"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+
+def load_alert_config(path: str) -> Dict:
+    """读取告警配置文件（JSON）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+"""
+异步代币价格追踪器 - asyncio原生版本
+与 MultiApiSolTokenTracker 保持相同的方法名和返回值，所有网络方法改为协程：
+各API源共享一个 aiohttp 连接池，跨API源、跨代币并发gather，
+并发模式下一旦按优先级选出结果就取消仍在进行的慢请求
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from http_client import RETRY_STATUS_CODES
+from metrics import failure_reason, instrument_fetch
+from quotes import Quote
+from sol_token_price_tracker import SOL_QUOTE_KEY, STREAM_CHUNK_SIZE, MultiApiSolTokenTracker
+from source_registry import SOLANA, chain_config, chain_name, source_chain_id
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMultiApiSolTokenTracker(MultiApiSolTokenTracker):
+    """
+    MultiApiSolTokenTracker 的异步版本
+    
+    配置、缓存、限流器、响应解析和记录保存都继承自同步追踪器，
+    因此可以逐个调用点迁移：把 tracker.xxx(...) 换成 await tracker.xxx(...) 即可
+    """
+    
+    def __init__(self, history_backend: Optional[str] = None):
+        super().__init__(history_backend)
+        self._session: Optional[aiohttp.ClientSession] = None
+        # 进行中的请求（按缓存键合并）和后台刷新任务
+        self._async_inflight: Dict[str, asyncio.Task] = {}
+        self._refresh_tasks = set()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def close(self):
+        """等待后台刷新和合并中的请求完成，关闭共享的HTTP连接池并写出缓冲的历史记录"""
+        pending = list(self._refresh_tasks) + list(self._async_inflight.values())
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        self.flush_history()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的 aiohttp 会话（首次使用时在当前事件循环中创建）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.http_pool.pool_maxsize * 4,
+                                             limit_per_host=self.http_pool.pool_maxsize,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+    
+    async def _make_request(self, url: str, headers: dict = None, timeout: Optional[float] = None,
+                            source: Optional[str] = None,
+                            stream_parser: Optional[Callable] = None) -> Optional[Tuple[int, Dict, object]]:
+        """
+        发送异步HTTP请求，返回 (状态码, 响应头, JSON数据)；失败返回None
+        
+        与同步版本一致：请求前等待该API源的令牌，5xx按指数退避重试，429按 Retry-After 推迟该源的请求。
+        指定 stream_parser 时响应体逐块交给增量解析器，返回解析器 close() 的结果
+        """
+        if source is None:
+            source = self._source_for_url(url)
+        if timeout is None:
+            timeout = self.sources.get(source, {}).get('timeout', 10)
+        
+        if self._skip_source(source, url):
+            return None
+        
+        session = self._get_session()
+        max_retries = self.http_pool.max_retries
+        start = time.perf_counter()
+        for attempt in range(max_retries + 1):
+            if not await self.rate_limiter.acquire_async(source, max_wait=self.rate_limit_max_wait):
+                self.metrics.observe_failure(source, 'rate_limited')
+                logger.warning("⏳ %s 已达到请求频率限制，跳过请求 %s", source, url)
+                return None
+            try:
+                async with session.get(url, headers=headers or {},
+                                       timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    if response.status in RETRY_STATUS_CODES and attempt < max_retries:
+                        delay = self._retry_backoff(attempt, response.headers.get('Retry-After'))
+                        if delay is not None:
+                            self.http_pool.record_retry(source)
+                            await asyncio.sleep(delay)
+                            continue
+                    elapsed = time.perf_counter() - start
+                    self.source_health.record(source, elapsed, ok=not self._is_source_failure(response.status))
+                    self.metrics.observe_request(source, elapsed, response.status)
+                    if response.status == 429:
+                        self._defer_source(source, response.headers.get('Retry-After'))
+                    if response.status == 304:
+                        return 304, dict(response.headers), None
+                    if response.status >= 400:
+                        logger.warning("请求失败 %s: HTTP %s", url, response.status)
+                        return None
+                    if stream_parser:
+                        parser = stream_parser()
+                        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                            parser.feed(chunk)
+                        return response.status, dict(response.headers), parser.close()
+                    return response.status, dict(response.headers), await response.json(content_type=None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 只重试连接失败（请求没有发出）；超时不重试，挂起的源重试只会成倍增加等待时间
+                if attempt < max_retries and isinstance(e, aiohttp.ClientConnectorError):
+                    delay = self._retry_backoff(attempt)
+                    if delay is not None:
+                        self.http_pool.record_retry(source)
+                        await asyncio.sleep(delay)
+                        continue
+                if isinstance(e, ValueError):
+                    self.metrics.observe_failure(source, failure_reason(e))
+                else:
+                    elapsed = time.perf_counter() - start
+                    self.source_health.record(source, elapsed, ok=False)
+                    self.metrics.observe_request(source, elapsed, reason=failure_reason(e))
+                logger.warning("请求失败 %s: %s", url, e)
+                return None
+        return None
+    
+    async def _fetch_json(self, url: str, headers: dict = None, timeout: Optional[float] = None):
+        """发送请求并返回JSON数据"""
+        result = await self._make_request(url, headers, timeout=timeout)
+        return result[2] if result else None
+    
+    async def _coalesce_async(self, key: str, factory: Callable):
+        """
+        合并相同缓存键的并发请求：同一时刻只有一个任务执行 factory()，其余协程等待同一结果
+        
+        等待方被取消不会取消共享的请求任务
+        """
+        task = self._async_inflight.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(factory())
+            self._async_inflight[key] = task
+            task.add_done_callback(lambda done: self._async_inflight.pop(key, None)
+                                   if self._async_inflight.get(key) is done else None)
+        else:
+            self.metrics.cache_coalesced.inc()
+        return await asyncio.shield(task)
+    
+    def _refresh_in_background_async(self, key: str, factory: Callable):
+        """在后台任务中刷新过期的缓存值（该键已有请求进行中时不再重复发起）"""
+        if key in self._async_inflight:
+            return
+        
+        async def refresh():
+            try:
+                value = await self._coalesce_async(key, factory)
+            except Exception as e:
+                value = None
+                logger.warning("⚠️ 后台刷新缓存失败 %s: %s", key, e)
+            self.metrics.cache_refreshes.inc('ok' if value is not None else 'failed')
+        
+        logger.debug("📦 使用过期缓存 %s，后台刷新", key)
+        task = asyncio.ensure_future(refresh())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+    
+    async def _cached_async(self, key: str, factory: Callable):
+        """_cached 的异步版本（factory 返回协程）"""
+        value, fresh = self._lookup_cache(key)
+        if value is not None:
+            if not fresh:
+                self._refresh_in_background_async(key, factory)
+            return value
+        return await self._coalesce_async(key, factory)
+    
+    async def _fetch_json_cached(self, url: str, cache_key: str, headers: dict = None,
+                                 timeout: Optional[float] = None, transform: Optional[Callable] = None,
+                                 stream_parser: Optional[Callable] = None):
+        """_fetch_json_cached 的异步版本（stale-while-revalidate，相同缓存键的并发请求合并为一次）"""
+        return await self._cached_async(cache_key, lambda: self._request_json_cached(url, cache_key, headers, timeout,
+                                                                                     transform, stream_parser))
+    
+    async def _request_json_cached(self, url: str, cache_key: str, headers: dict = None,
+                                   timeout: Optional[float] = None, transform: Optional[Callable] = None,
+                                   stream_parser: Optional[Callable] = None):
+        """_request_json_cached 的异步版本（同样使用ETag / Last-Modified条件请求）"""
+        ttl = self._cache_ttl(cache_key)
+        entry = None
+        request_headers = dict(headers or {})
+        if self._persistent_cache:
+            try:
+                entry = self._persistent_cache.get_entry(cache_key)
+            except Exception:
+                entry = None
+            if entry:
+                if entry['etag']:
+                    request_headers['If-None-Match'] = entry['etag']
+                if entry['last_modified']:
+                    request_headers['If-Modified-Since'] = entry['last_modified']
+        
+        result = await self._make_request(url, request_headers, timeout=timeout, stream_parser=stream_parser)
+        if not result:
+            return None
+        status, response_headers, value = result
+        
+        if status == 304 and entry:
+            self.metrics.cache_revalidations.inc('not_modified')
+            self._cache[cache_key] = entry['value']
+            self._cache_expiry[cache_key] = time.time() + ttl
+            self._persistent_cache.touch(cache_key, ttl)
+            return entry['value']
+        
+        if entry and (entry['etag'] or entry['last_modified']):
+            self.metrics.cache_revalidations.inc('modified')
+        if transform:
+            # 构建索引是CPU密集操作，放到线程中执行避免阻塞事件循环
+            value = await asyncio.to_thread(transform, value)
+        self._set_cache(cache_key, value, ttl=ttl,
+                        etag=response_headers.get('ETag'),
+                        last_modified=response_headers.get('Last-Modified'))
+        return value
+    
+    # ---------- 异步获取方法 ----------
+    
+    @instrument_fetch('jupiter', 'sol')
+    async def get_sol_price_jupiter(self) -> Optional[float]:
+        """通过Jupiter API获取SOL价格"""
+        try:
+            data = await self._fetch_json(self._sol_price_url('jupiter'), self.sources['jupiter']['headers'])
+            return self._parse_sol_price_jupiter(data) if data else None
+        except Exception as e:
+            logger.warning("Jupiter API获取SOL价格失败: %s", e)
+            return None
+    
+    @instrument_fetch('dexscreener', 'sol')
+    async def get_sol_price_dexscreener(self) -> Optional[float]:
+        """通过DexScreener API获取SOL价格"""
+        try:
+            data = await self._fetch_json(self._sol_price_url('dexscreener'), self.sources['dexscreener']['headers'])
+            return self._parse_sol_price_dexscreener(data) if data else None
+        except Exception as e:
+            logger.warning("DexScreener API获取SOL价格失败: %s", e)
+            return None
+    
+    @instrument_fetch('coingecko', 'sol')
+    async def get_sol_price_coingecko(self) -> Optional[float]:
+        """通过CoinGecko API获取SOL价格"""
+        try:
+            data = await self._get_coingecko_simple_prices(['solana'])
+            return self._parse_sol_price_coingecko(data) if data else None
+        except Exception as e:
+            logger.warning("CoinGecko API获取SOL价格失败: %s", e)
+            return None
+    
+    async def get_market_chart_coingecko(self, coin_id: str, start: float,
+                                         end: float) -> Optional[List[Tuple[float, float]]]:
+        """通过CoinGecko获取币种在时间区间内的历史价格，请求失败时返回None"""
+        try:
+            data = await self._fetch_json(self._coingecko_market_chart_url(coin_id, start, end),
+                                          self.sources['coingecko']['headers'])
+            return self._parse_market_chart(data, start, end) if data is not None else None
+        except Exception as e:
+            logger.warning("CoinGecko API获取历史价格失败 %s: %s", coin_id, e)
+            return None
+    
+    async def _get_coingecko_index(self) -> Optional[Dict[str, Dict[str, Dict]]]:
+        """获取CoinGecko平台地址索引（与同步追踪器共享缓存）"""
+        return await self._fetch_json_cached(self._coingecko_list_url(), self._coingecko_index_key,
+                                             self.sources['coingecko']['headers'],
+                                             timeout=20, stream_parser=self._coingecko_index_parser)
+    
+    async def _get_coingecko_simple_prices(self, coin_ids: List[str]) -> Optional[Dict]:
+        """查询CoinGecko simple/price（价格类缓存）"""
+        return await self._fetch_json_cached(self._coingecko_price_url(coin_ids), f"coingecko_price:{','.join(coin_ids)}",
+                                             self.sources['coingecko']['headers'])
+    
+    async def get_token_prices(self, api_name: str, token_addresses: List[str],
+                               chain: str = SOLANA) -> Dict[str, Quote]:
+        """通过指定API源批量获取某条链上的代币价格，各分块并发请求"""
+        start = time.perf_counter()
+        kind = self._fetch_kind(chain, batch=len(token_addresses) > 1)
+        try:
+            if self.sources[api_name].get('coin_index'):
+                results = await self._get_coingecko_prices(token_addresses, chain)
+            else:
+                results = await self._get_source_prices(api_name, token_addresses, chain)
+        except asyncio.CancelledError:
+            self.metrics.observe_fetch(api_name, kind, time.perf_counter() - start, 'cancelled')
+            raise
+        except Exception:
+            self.metrics.observe_fetch(api_name, kind, time.perf_counter() - start, 'error')
+            raise
+        self.metrics.observe_fetch(api_name, kind, time.perf_counter() - start, 'ok' if results else 'empty')
+        return self._tag_chain(results, chain)
+    
+    async def get_token_price(self, api_name: str, token_address: str, chain: str = SOLANA) -> Optional[Quote]:
+        """通过指定API源获取单个代币的价格"""
+        return (await self.get_token_prices(api_name, [token_address], chain)).get(token_address)
+    
+    async def _get_source_prices(self, api_name: str, token_addresses: List[str], chain: str) -> Dict[str, Quote]:
+        """按API源声明的批量URL和解析器并发请求各分块"""
+        source = self.sources[api_name]
+        chain_id = source_chain_id(source, chain)
+        chunks = self._chunks(token_addresses, source.get('batch_size', 1))
+        responses = await asyncio.gather(*(self._fetch_json(source['price_url'](source, chain_id, chunk), source['headers'])
+                                           for chunk in chunks), return_exceptions=True)
+        results = {}
+        for chunk, data in zip(chunks, responses):
+            if isinstance(data, Exception):
+                logger.warning("%s API获取%s代币价格失败: %s", source['name'], chain_name(chain), data)
+            elif data:
+                results.update(source['parser'](data, chain_id, chunk))
+        return results
+    
+    async def _get_coingecko_prices(self, token_addresses: List[str], chain: str) -> Dict[str, Quote]:
+        """通过CoinGecko批量获取代币价格，各分块并发请求"""
+        source = self.sources['coingecko']
+        results = {}
+        try:
+            index = await self._get_coingecko_index()
+            if not index:
+                return results
+            
+            matched = self._match_coingecko_coins(index, chain, token_addresses)
+            chunks = self._chunks(list(matched), source['batch_size'])
+            responses = await asyncio.gather(*(self._get_coingecko_simple_prices([matched[a]['id'] for a in chunk])
+                                               for chunk in chunks))
+            for chunk, price_data in zip(chunks, responses):
+                if price_data:
+                    results.update(source['parser'](price_data, {address: matched[address] for address in chunk}))
+        except Exception as e:
+            logger.warning("CoinGecko API获取%s代币价格失败: %s", chain_name(chain), e)
+        return results
+    
+    # ---------- 多API源组合 ----------
+    
+    async def _race_fetchers(self, jobs: List[Tuple[str, str, Callable]], orders: Dict[str, List[str]],
+                             budget: float, wait_all: bool = False) -> Dict[str, Dict[str, object]]:
+        """
+        并发执行一组协程任务，返回 {类别: {API源: 结果}}
+        
+        语义与同步版本相同；不同之处在于提前返回或超出预算时，
+        仍未完成的慢请求会被直接取消，不再占用连接和限流令牌
+        """
+        results = {kind: {} for kind in orders}
+        tasks = {asyncio.ensure_future(fn()): (kind, api_name) for kind, api_name, fn in jobs}
+        
+        def resolved(kind: str) -> bool:
+            for api_name in orders[kind]:
+                if api_name not in results[kind]:
+                    return False
+                if results[kind][api_name]:
+                    return True
+            return True
+        
+        deadline = time.monotonic() + budget
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    kind, api_name = tasks[task]
+                    try:
+                        results[kind][api_name] = task.result()
+                    except Exception as e:
+                        logger.warning("❌ %s API失败: %s", api_name, e)
+                        results[kind][api_name] = None
+                if not wait_all and all(resolved(kind) for kind in orders):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        if pending and time.monotonic() >= deadline:
+            logger.warning("⏱️ 超出延迟预算 %.1fs，取消 %s 个未完成的请求", budget, len(pending))
+        return results
+    
+    async def get_all_api_prices(self, token_address: str, budget: Optional[float] = None) -> Dict[str, Dict]:
+        """并发向所有已配置的API源查询SOL价格和代币价格，在延迟预算内返回所有结果"""
+        apis = self._active_apis()
+        results = await self._race_fetchers(self._price_jobs(token_address, apis), {'sol': apis, 'token': apis},
+                                            self.fetch_budget if budget is None else budget, wait_all=True)
+        return self._collect_all_prices(results, apis)
+    
+    async def _get_multi_api_prices_concurrent(self, token_address: str,
+                                               budget: float) -> Tuple[Optional[float], Optional[Quote], str]:
+        """并发模式：同时查询所有源，按优先级选出结果后取消其余请求（SOL报价已缓存时只查询代币价格）"""
+        apis = self._active_apis()
+        logger.info("⚡ 并发查询 %s 个API源（预算 %.1fs）...", len(apis), budget)
+        sol_quote = self._cached_sol_quote()
+        orders = {'token': apis} if sol_quote else {'sol': apis, 'token': apis}
+        results = await self._race_fetchers(self._price_jobs(token_address, apis, include_sol=sol_quote is None),
+                                            orders, budget)
+        return self._pick_prices(results, apis, sol_quote)
+    
+    async def get_consensus_prices(self, token_address: str,
+                                   budget: Optional[float] = None) -> Tuple[Optional[float], Optional[Quote], str]:
+        """共识模式：在延迟预算内并发查询所有API源，返回加权中位数价格"""
+        apis = self._active_apis()
+        budget = self.fetch_budget if budget is None else budget
+        logger.info("🤝 共识模式：并发查询 %s 个API源（预算 %.1fs）...", len(apis), budget)
+        results = await self._race_fetchers(self._price_jobs(token_address, apis),
+                                            {'sol': apis, 'token': apis}, budget, wait_all=True)
+        return self._consensus_prices(results, apis)
+    
+    async def _get_consensus_prices_batch(self, token_addresses: List[str]) -> Tuple[Optional[float], Dict[str, Tuple[Quote, str]]]:
+        """共识模式的批量获取：所有源的批量请求并发进行，每个代币单独取共识"""
+        apis = self._active_apis()
+        logger.info("🤝 共识模式：%s 个API源并发批量查询 %s 个代币...", len(apis), len(token_addresses))
+        results = await self._race_fetchers(self._batch_consensus_jobs(token_addresses, apis),
+                                            {'sol': apis, 'token': apis}, self.fetch_budget, wait_all=True)
+        return self._batch_consensus(results, token_addresses, apis)
+    
+    async def get_multi_api_prices(self, token_address: str, concurrent: Optional[bool] = None,
+                                   budget: Optional[float] = None) -> Tuple[Optional[float], Optional[Quote], str]:
+        """使用多个API源获取价格数据（concurrent 为 None 时使用 CONCURRENT_FETCH 配置）"""
+        logger.info("🌐 使用多API源获取价格数据...")
+        
+        if concurrent is None:
+            concurrent = self.concurrent_fetch
+        if self.consensus_mode:
+            sol_price, token_info, used_source = await self.get_consensus_prices(token_address, budget)
+        elif concurrent:
+            sol_price, token_info, used_source = await self._get_multi_api_prices_concurrent(
+                token_address, self.fetch_budget if budget is None else budget)
+        else:
+            sol_price, token_info, used_source = await self._get_multi_api_prices_sequential(token_address)
+        return sol_price, self._apply_token_metadata(token_address, token_info), used_source
+    
+    async def _get_multi_api_prices_sequential(self, token_address: str) -> Tuple[Optional[float], Optional[Quote], str]:
+        """顺序模式：共享SOL报价与按优先级逐个尝试的代币价格并发获取"""
+        sol_task = asyncio.ensure_future(self.get_sol_price())
+        token_info = None
+        token_source = None
+        token_fetchers = self._token_price_fetchers()
+        depth = 0
+        
+        try:
+            for api_name in self._active_apis():
+                logger.info("🔄 尝试使用 %s API...", self.sources[api_name]['name'])
+                depth += 1
+                try:
+                    token_info = await token_fetchers[api_name](token_address)
+                except Exception as e:
+                    logger.warning("❌ %s API失败: %s", api_name, e)
+                    continue
+                if token_info:
+                    token_source = self.sources[api_name]['name']
+                    break
+            sol_price, sol_source = await sol_task
+        finally:
+            sol_task.cancel()
+        
+        self.metrics.fallback_depth.observe(depth, 'token')
+        used_source = self._source_label(token_source, sol_source if sol_price else None)
+        if sol_price and token_info:
+            logger.info("✅ 成功使用 %s 获取价格数据", used_source)
+        return sol_price, token_info, used_source
+    
+    async def get_all_chain_token_prices(self, token_address: str, chain: str = 'ethereum',
+                                         budget: Optional[float] = None) -> Dict[str, Optional[Quote]]:
+        """并发向支持该链的所有API源查询代币价格"""
+        apis, jobs = self._chain_price_jobs(token_address, chain)
+        results = await self._race_fetchers(jobs, {'token': apis},
+                                            self.fetch_budget if budget is None else budget, wait_all=True)
+        return {api_name: results['token'].get(api_name) for api_name in apis}
+    
+    async def get_chain_token_price(self, token_address: str, chain: str = 'ethereum',
+                                    concurrent: Optional[bool] = None,
+                                    budget: Optional[float] = None) -> Tuple[Optional[Quote], str]:
+        """获取任意已注册链上的代币价格（concurrent 为 None 时使用 CONCURRENT_FETCH 配置）"""
+        logger.info("🔍 正在获取%s代币价格: %s", chain_name(chain), token_address)
+        
+        if concurrent is None:
+            concurrent = self.concurrent_fetch
+        apis, jobs = self._chain_price_jobs(token_address, chain)
+        if self.consensus_mode:
+            results = await self._race_fetchers(jobs, {'token': apis},
+                                                self.fetch_budget if budget is None else budget, wait_all=True)
+            return self._chain_consensus(results['token'], chain)
+        if concurrent:
+            results = await self._race_fetchers(jobs, {'token': apis}, self.fetch_budget if budget is None else budget)
+            _, token_info = self._pick_by_priority(results['token'], apis)
+        else:
+            token_info = None
+            depth = 0
+            for _, api_name, fn in jobs:
+                logger.info("🔄 尝试使用 %s API...", self.sources[api_name]['name'])
+                depth += 1
+                try:
+                    token_info = await fn()
+                except Exception as e:
+                    logger.warning("❌ %s API失败: %s", self.sources[api_name]['name'], e)
+                if token_info:
+                    break
+            self.metrics.fallback_depth.observe(depth, self._fetch_kind(chain))
+        
+        if token_info:
+            logger.info("✅ 成功使用 %s 获取%s代币价格", token_info.source, chain_name(chain))
+            return token_info, token_info.source
+        return None, "未知"
+    
+    async def get_eth_token_price(self, eth_token_address: str, concurrent: Optional[bool] = None,
+                                  budget: Optional[float] = None) -> Tuple[Optional[Quote], str]:
+        """获取以太坊代币价格（get_chain_token_price 在以太坊上的简写）"""
+        return await self.get_chain_token_price(eth_token_address, 'ethereum', concurrent, budget)
+    
+    async def get_sol_price(self) -> Tuple[Optional[float], str]:
+        """获取SOL价格，返回 (价格, 数据源)（共享短TTL报价缓存，并发调用只发起一次请求）"""
+        quote = await self._cached_async(SOL_QUOTE_KEY, self._fetch_sol_quote)
+        if not quote:
+            return None, "未知"
+        return quote['price'], quote['source']
+    
+    async def _fetch_sol_quote(self) -> Optional[Dict]:
+        """按优先级从各API源获取SOL价格并写入共享报价缓存"""
+        sol_fetchers = self._sol_price_fetchers()
+        apis = [api_name for api_name in self._active_apis() if api_name in sol_fetchers]
+        for depth, api_name in enumerate(apis, 1):
+            sol_price = await sol_fetchers[api_name]()
+            if sol_price:
+                self.metrics.fallback_depth.observe(depth, 'sol')
+                return self._store_sol_quote(sol_price, self.sources[api_name]['name'])
+        self.metrics.fallback_depth.observe(len(apis), 'sol')
+        return None
+    
+    def _cached_sol_quote(self) -> Optional[Dict]:
+        """只查询缓存中的SOL报价，过期但在 stale 窗口内时返回旧值并创建后台刷新任务"""
+        quote, fresh = self._lookup_cache(SOL_QUOTE_KEY)
+        if quote is not None and not fresh:
+            self._refresh_in_background_async(SOL_QUOTE_KEY, self._fetch_sol_quote)
+        return quote
+    
+    async def get_multi_api_prices_batch(self, token_addresses: List[str]) -> Tuple[Optional[float], Dict[str, Tuple[Quote, str]]]:
+        """批量获取一组代币价格：SOL价格与按优先级回退的批量请求并发进行"""
+        if self.consensus_mode:
+            sol_price, found = await self._get_consensus_prices_batch(token_addresses)
+            return sol_price, self._apply_batch_metadata(found)
+        
+        (sol_price, _), found = await asyncio.gather(self.get_sol_price(), self._fetch_token_batch(token_addresses))
+        return sol_price, self._apply_batch_metadata(found)
+    
+    async def _fetch_token_batch(self, token_addresses: List[str], chain: str = SOLANA) -> Dict[str, Tuple[Quote, str]]:
+        """按优先级依次用各API源批量查询仍缺少报价的代币"""
+        found = {}
+        depth = 0
+        batch_fetchers = self._token_price_batch_fetchers(chain)
+        for api_name in self._active_apis(chain):
+            missing = [address for address in token_addresses if address not in found]
+            if not missing:
+                break
+            depth += 1
+            logger.info("🔄 使用 %s 批量查询 %s 个代币...", self.sources[api_name]['name'], len(missing))
+            for token_address, token_info in (await batch_fetchers[api_name](missing)).items():
+                found[token_address] = (token_info, self.sources[api_name]['name'])
+        
+        self.metrics.fallback_depth.observe(depth, self._fetch_kind(chain, batch=True))
+        return found
+    
+    async def get_chain_token_prices(self, token_addresses: List[str],
+                                     chain: str = 'ethereum') -> Dict[str, Tuple[Quote, str]]:
+        """批量获取某条链上一组代币的价格，返回 {代币地址: (代币信息, 数据源)}"""
+        chain_config(chain)
+        if not self.consensus_mode:
+            return await self._fetch_token_batch(token_addresses, chain)
+        apis = self._active_apis(chain)
+        results = await self._race_fetchers(self._batch_consensus_jobs(token_addresses, apis, chain),
+                                            {'token': apis}, self.fetch_budget, wait_all=True)
+        return self._batch_token_consensus(results['token'], token_addresses, apis, chain)
+    
+    # ---------- 追踪与记录 ----------
+    
+    async def track_token_price(self, token_address: str) -> bool:
+        """追踪指定代币价格并记录"""
+        logger.info("🔍 正在处理代币地址: %s", token_address)
+        logger.info("📋 API优先级: %s", ' → '.join(self._active_apis()))
+        sol_price, token_info, source = await self.get_multi_api_prices(token_address)
+        return self._record_token_price(token_address, sol_price, token_info, source)
+    
+    async def track_tokens(self, token_addresses: List[str]) -> Dict[str, bool]:
+        """批量追踪多个代币价格并记录，各批次并发获取"""
+        token_addresses = list(dict.fromkeys(a.strip() for a in token_addresses if a and a.strip()))
+        logger.info("🔍 正在批量处理 %s 个代币", len(token_addresses))
+        logger.info("📋 API优先级: %s", ' → '.join(self._active_apis()))
+        
+        chunks = self._chunks(token_addresses, self.track_batch_size)
+        batches = await asyncio.gather(*(self.get_multi_api_prices_batch(chunk) for chunk in chunks))
+        status = {}
+        for chunk, (sol_price, found) in zip(chunks, batches):
+            status.update(self._record_token_batch(chunk, sol_price, found))
+        return status
+    
+    async def compare_sol_eth_tokens(self, sol_token_address: str, eth_token_address: str,
+                                     chain: Optional[str] = None) -> bool:
+        """比较SOL代币和另一条链（默认 COMPARE_CHAIN）上代币的价格比值（两侧价格并发获取）"""
+        chain = (chain or self.compare_chain).lower()
+        logger.info("🔍 正在比较代币价格:")
+        logger.info("   SOL代币: %s", sol_token_address)
+        logger.info("   %s代币: %s", chain_name(chain), eth_token_address)
+        logger.info("="*60)
+        
+        (_, sol_token_info, sol_source), (eth_token_info, eth_source) = await asyncio.gather(
+            self.get_multi_api_prices(sol_token_address),
+            self.get_chain_token_price(eth_token_address, chain)
+        )
+        return self._record_comparison(sol_token_address, sol_token_info, sol_source,
+                                       eth_token_address, eth_token_info, eth_source)
+    
+    async def track_ratio_matrix(self, basket: List, path: Optional[str] = None,
+                                 threshold: Optional[float] = None) -> bool:
+        """计算一篮子代币的两两比值矩阵并保存为一个快照（各条链的批量请求并发执行，需要numpy）"""
+        try:
+            from ratio_matrix import run_ratio_matrix_async
+        except ImportError:
+            print("❌ 比值矩阵需要 numpy，请先运行: pip install numpy")
+            return False
+        entries = self._ratio_matrix_entries(basket)
+        if not entries:
+            return False
+        matrix, _ = await run_ratio_matrix_async(
+            self, entries, path or self.ratio_matrix_file,
+            threshold=self.ratio_matrix_threshold if threshold is None else threshold,
+            moves_path=self.ratio_matrix_moves_file
+        )
+        return matrix.priced >= 2
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+历史价格回填 - 为新的监控列表一次性补齐过去一段时间的价格历史
+已配置的API源中只有CoinGecko提供历史价格（/coins/{id}/market_chart/range），
+Jupiter、DexScreener和1inch只有实时报价，因此回填统一使用CoinGecko的数据：
+代币通过代币列表索引解析为币种ID（0x开头默认为以太坊代币，代币对可用 chain 指定 base、bsc 等链），
+SOL价格序列用于计算兑换比率
+
+时间区间按固定网格切分（默认90天一块，CoinGecko在该跨度内返回小时级数据），每块一个请求，
+由多个工作进程并行获取；每个进程的限流额度为 rate_limit / 进程数，合计不超过API源的限额。
+获取结果在主进程中转换为历史记录批量写入历史存储，写出后才把该区间记入检查点文件，
+中断后重新运行会跳过已完成的区间，只补齐缺口
+"""
+
+import bisect
+import inspect
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from quotes import Quote
+from source_registry import SOLANA
+
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_SOURCE = 'CoinGecko'
+BACKFILL_NOTE = '历史回填'
+DAY = 86400
+
+Series = List[Tuple[float, float]]
+
+
+# ---------- 区间与检查点 ----------
+
+def plan_ranges(start: float, end: float, chunk_days: float) -> List[Tuple[int, int]]:
+    """把 [start, end) 按以Unix纪元为起点的固定网格切分，网格不随运行时间变化"""
+    chunk = int(chunk_days * DAY)
+    ranges = []
+    cursor = int(start)
+    while cursor < end:
+        boundary = (cursor // chunk + 1) * chunk
+        ranges.append((cursor, int(min(boundary, end))))
+        cursor = boundary
+    return ranges
+
+
+def subtract_ranges(start: int, end: int, covered: List[List[int]]) -> List[Tuple[int, int]]:
+    """返回 [start, end) 中没有被 covered（已排序、不重叠）覆盖的部分"""
+    gaps = []
+    cursor = start
+    for done_start, done_end in covered:
+        if done_end <= cursor or done_start >= end:
+            continue
+        if done_start > cursor:
+            gaps.append((cursor, done_start))
+        cursor = max(cursor, done_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class BackfillCheckpoint:
+    """
+    检查点文件：{键: [[起始, 截止], ...]}，记录每个价格序列 / 代币对已写入历史存储的时间区间
+    
+    键为 prices:<代币地址> 或 comparisons:<SOL代币地址>/<ETH代币地址>；每次写入后原子地保存
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, List[List[int]]] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.done = json.load(f).get('done', {})
+    
+    def gaps(self, key: str, start: int, end: int) -> List[Tuple[int, int]]:
+        return subtract_ranges(start, end, self.done.get(key, []))
+    
+    def mark(self, key: str, start: int, end: int):
+        """记录一个已完成的区间（与相邻或重叠的区间合并）并保存"""
+        merged = []
+        for done_start, done_end in sorted(self.done.get(key, []) + [[start, end]]):
+            if merged and done_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], done_end)
+            else:
+                merged.append([done_start, done_end])
+        self.done[key] = merged
+        self.save()
+    
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'updated_at': time.time(), 'done': self.done}, f)
+        os.replace(temp_path, self.path)
+
+
+# ---------- 工作进程 ----------
+
+_worker_tracker = None
+
+
+def _init_worker(source_configs: Dict[str, Dict], rate_share: float):
+    """
+    工作进程初始化：创建独立的追踪器，沿用主进程的API源地址和限额，并按进程数分摊限流额度
+    
+    工作进程只请求历史价格，记录由主进程写出：不打开历史存储、持久化缓存和告警，
+    也不在退出时保存API源健康度（避免与主进程同时改写这些文件）
+    """
+    global _worker_tracker
+    os.environ.update({'SOURCE_HEALTH_PATH': '', 'CACHE_BACKEND': 'memory', 'ALERT_RULES': ''})
+    from sol_token_price_tracker import MultiApiSolTokenTracker
+    
+    tracker = MultiApiSolTokenTracker(history_backend='none')
+    for name, config in tracker.sources.items():
+        config.update(source_configs.get(name, {}))
+        rate_limit = config.get('rate_limit')
+        tracker.rate_limiter.configure(name, rate_limit * rate_share if rate_limit else None)
+    tracker.rate_limit_max_wait = None  # 回填可以排队等待，不跳过请求
+    _worker_tracker = tracker
+
+
+def _fetch_series(coin_id: str, start: int, end: int) -> Optional[Series]:
+    return _worker_tracker.get_market_chart_coingecko(coin_id, start, end)
+
+
+# ---------- 主进程 ----------
+
+def _align(series: Series, ts: float, tolerance: float) -> Optional[float]:
+    """取序列中不晚于 ts 的最近一个价格（没有时取之后最近的），相差超过 tolerance 时返回None"""
+    index = bisect.bisect_right(series, (ts, float('inf')))
+    candidates = [series[i] for i in (index - 1, index) if 0 <= i < len(series)]
+    if not candidates:
+        return None
+    point_ts, price = min(candidates, key=lambda point: abs(point[0] - ts))
+    return price if abs(point_ts - ts) <= tolerance else None
+
+
+class Backfill:
+    """
+    回填任务规划与执行
+    
+    tokens 为要回填价格历史的代币地址，pairs 为要回填比值历史的 (SOL代币地址, 另一侧代币地址)；
+    chains 为 {代币地址: 链}，没有指定时0x开头的地址视为以太坊代币，其余为Solana代币
+    """
+    
+    def __init__(self, tracker, tokens: List[str], pairs: List[Tuple[str, str]], days: float = 30,
+                 workers: int = 4, checkpoint_path: str = 'backfill_checkpoint.json', chunk_days: float = 90,
+                 align_tolerance: float = 2 * 3600, chains: Optional[Dict[str, str]] = None):
+        if inspect.iscoroutinefunction(tracker._get_coingecko_index):
+            raise TypeError("回填在多个工作进程中使用同步追踪器，请传入 MultiApiSolTokenTracker 而不是异步追踪器")
+        self.tracker = tracker
+        self.chains = chains or {}
+        self.tokens = list(dict.fromkeys(tokens))
+        self.pairs = list(dict.fromkeys(pairs))
+        self.workers = max(1, workers)
+        self.checkpoint = BackfillCheckpoint(checkpoint_path)
+        self.align_tolerance = align_tolerance
+        self.end = int(time.time()) // 3600 * 3600
+        self.ranges = plan_ranges(self.end - days * DAY, self.end, chunk_days)
+        self.sol_coin_id = tracker.sources['coingecko']['sol_mint']
+        self.coins: Dict[str, Dict] = {}
+        self._written = set()
+    
+    def _chain(self, address: str) -> str:
+        return self.chains.get(address) or ('ethereum' if address.lower().startswith('0x') else SOLANA)
+    
+    def _resolve_coins(self) -> bool:
+        """通过CoinGecko代币列表索引把代币地址解析为币种"""
+        index = self.tracker._get_coingecko_index()
+        if not index:
+            logger.error("❌ 无法获取CoinGecko代币列表，不能解析币种ID")
+            return False
+        addresses = self.tokens + [address for pair in self.pairs for address in pair]
+        for address in dict.fromkeys(addresses):
+            chain = self._chain(address)
+            coin = self.tracker._coingecko_platform_index(index, chain).get(address.lower())
+            if coin:
+                self.coins[address] = coin
+            else:
+                logger.warning("⚠️ CoinGecko %s 平台上没有找到代币 %s，跳过", chain, address)
+        return True
+    
+    def plan(self) -> List[Tuple[str, int, int, List[str]]]:
+        """
+        生成待写入的单元 [(检查点键, 起始, 截止, [依赖的币种ID, ...])]
+        
+        每个单元依赖的价格序列以 (币种ID, 起始, 截止) 标识，相同的序列只获取一次
+        """
+        units = []
+        for address in self.tokens:
+            if address not in self.coins:
+                continue
+            key = f"prices:{address}"
+            for start, end in self.ranges:
+                for gap_start, gap_end in self.checkpoint.gaps(key, start, end):
+                    units.append((key, gap_start, gap_end, [self.coins[address]['id'], self.sol_coin_id]))
+        for sol_address, eth_address in self.pairs:
+            if sol_address not in self.coins or eth_address not in self.coins:
+                continue
+            key = f"comparisons:{sol_address}/{eth_address}"
+            for start, end in self.ranges:
+                for gap_start, gap_end in self.checkpoint.gaps(key, start, end):
+                    units.append((key, gap_start, gap_end,
+                                  [self.coins[sol_address]['id'], self.coins[eth_address]['id']]))
+        return units
+    
+    def _price_rows(self, address: str, series: Series, sol_series: Series) -> List[Dict]:
+        coin = self.coins[address]
+        rows = []
+        for ts, price in series:
+            sol_price = _align(sol_series, ts, self.align_tolerance)
+            if not sol_price or not price:
+                continue
+            quote = Quote(price, coin['name'], coin['symbol'], BACKFILL_SOURCE, ts)
+            sol_to_token, token_to_sol = self.tracker.calculate_exchange_rates(sol_price, price)
+            record = self.tracker._history_record(address, quote, sol_price, price, sol_to_token, token_to_sol,
+                                                  BACKFILL_SOURCE, ts)
+            record['note'] = BACKFILL_NOTE
+            rows.append(record)
+        return rows
+    
+    def _comparison_rows(self, sol_address: str, eth_address: str, sol_series: Series,
+                         eth_series: Series) -> List[Dict]:
+        sol_coin, eth_coin = self.coins[sol_address], self.coins[eth_address]
+        rows = []
+        for ts, sol_price in sol_series:
+            eth_price = _align(eth_series, ts, self.align_tolerance)
+            if not eth_price or not sol_price:
+                continue
+            sol_quote = Quote(sol_price, sol_coin['name'], sol_coin['symbol'], BACKFILL_SOURCE, ts)
+            eth_quote = Quote(eth_price, eth_coin['name'], eth_coin['symbol'], BACKFILL_SOURCE, ts,
+                              platform=self._chain(eth_address))
+            sol_to_eth, eth_to_sol = self.tracker.calculate_token_ratio(sol_price, eth_price)
+            rows.append(self.tracker._comparison_record(
+                sol_address, sol_quote, eth_address, eth_quote, sol_price, eth_price, sol_to_eth, eth_to_sol,
+                BACKFILL_SOURCE, BACKFILL_SOURCE, ts, BACKFILL_NOTE))
+        return rows
+    
+    def _write(self, unit, series: Dict[Tuple[str, int, int], Series]) -> int:
+        """把一个单元的记录批量写入历史存储，写出后记入检查点"""
+        key, start, end, coin_ids = unit
+        first, second = (series[(coin_id, start, end)] for coin_id in coin_ids)
+        kind, target = key.split(':', 1)
+        if kind == 'prices':
+            rows = self._price_rows(target, first, second)
+        else:
+            rows = self._comparison_rows(*target.split('/', 1), first, second)
+        if rows:
+            self.tracker.history_store.append(kind, rows)
+            self.tracker.flush_history()
+            self._written.add(kind)
+        self.checkpoint.mark(key, start, end)
+        return len(rows)
+    
+    def _worker_config(self) -> Tuple[Dict[str, Dict], float]:
+        source_configs = {name: {'base_url': config['base_url'], 'rate_limit': config.get('rate_limit')}
+                          for name, config in self.tracker.sources.items()}
+        return source_configs, 1.0 / self.workers
+    
+    def run(self) -> Dict[str, int]:
+        """执行回填，返回统计 {units, rows, failed}"""
+        stats = {'units': 0, 'rows': 0, 'failed': 0}
+        if not self._resolve_coins():
+            return stats
+        units = self.plan()
+        if not units:
+            logger.info("✅ 所有区间都已回填，无需获取")
+            return stats
+        
+        # 每个序列被多少个单元使用：用完即释放，内存只保留尚未写入的单元所需的序列
+        users: Dict[Tuple[str, int, int], int] = {}
+        for _, start, end, coin_ids in units:
+            for coin_id in coin_ids:
+                users[(coin_id, start, end)] = users.get((coin_id, start, end), 0) + 1
+        # SOL价格序列被所有价格单元共用，最先获取
+        fetches = sorted(users, key=lambda task: task[0] != self.sol_coin_id)
+        logger.info("📥 开始回填：%s 个写入单元，%s 个历史价格请求，%s 个工作进程",
+                    len(units), len(fetches), self.workers)
+        
+        series: Dict[Tuple[str, int, int], Series] = {}
+        failed = set()
+        pending_units = list(units)
+        executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker, initargs=self._worker_config())
+        futures = {executor.submit(_fetch_series, *task): task for task in fetches}
+        try:
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = futures.pop(future)
+                    result = future.result()
+                    if result is None:
+                        failed.add(task)
+                        logger.warning("⚠️ 获取历史价格失败 %s [%s, %s)，下次运行时重试", *task)
+                    elif users[task] > 0:
+                        series[task] = result
+                
+                remaining = []
+                for unit in pending_units:
+                    _, start, end, coin_ids = unit
+                    tasks = [(coin_id, start, end) for coin_id in coin_ids]
+                    if any(task in failed for task in tasks):
+                        stats['failed'] += 1
+                    elif all(task in series for task in tasks):
+                        stats['rows'] += self._write(unit, series)
+                        stats['units'] += 1
+                    else:
+                        remaining.append(unit)
+                        continue
+                    for task in tasks:
+                        users[task] -= 1
+                        if users[task] == 0:
+                            series.pop(task, None)
+                pending_units = remaining
+                logger.info("📈 回填进度：%s/%s 个单元，已写入 %s 条记录",
+                            stats['units'] + stats['failed'], len(units), stats['rows'])
+        except KeyboardInterrupt:
+            logger.info("\n🛑 回填已中断，已完成的区间记录在 %s，重新运行即可继续", self.checkpoint.path)
+            raise
+        finally:
+            # 中断或出错时还有未完成的任务：取消尚未开始的任务，不等待正在运行的工作进程
+            executor.shutdown(wait=not futures, cancel_futures=True)
+            self._restore_order()
+        return stats
+    
+    def _restore_order(self):
+        """回填的记录早于已有记录，写完后让历史存储恢复按时间排列（CSV后端需要）"""
+        for kind in self._written:
+            if self.tracker.history_store.sort_by_time(kind):
+                logger.info("🔃 已按时间重新排列 %s", self.tracker.history_store.location(kind))
+
+
+def run_backfill(tracker, watchlist: Dict, days: float = 30, workers: int = 4,
+                 checkpoint_path: str = 'backfill_checkpoint.json', chunk_days: float = 90) -> Dict[str, int]:
+    """按监控列表回填历史：tokens 回填价格历史，pairs 回填比值历史"""
+    tokens = [entry['address'] if isinstance(entry, dict) else entry for entry in watchlist.get('tokens', [])]
+    pairs = [(pair['sol'], pair['eth']) for pair in watchlist.get('pairs', [])]
+    chains = {pair['eth']: pair['chain'].lower() for pair in watchlist.get('pairs', []) if pair.get('chain')}
+    if not tokens and not pairs:
+        logger.error("❌ 回填列表为空，请提供代币地址或代币对")
+        return {'units': 0, 'rows': 0, 'failed': 0}
+    
+    backfill = Backfill(tracker, tokens, pairs, days, workers, checkpoint_path, chunk_days, chains=chains)
+    start = time.monotonic()
+    stats = backfill.run()
+    logger.info("🎉 回填完成：%s 个单元，写入 %s 条记录，%s 个单元失败（%.1fs）",
+                stats['units'], stats['rows'], stats['failed'], time.monotonic() - start)
+    if stats['failed']:
+        logger.info("💡 重新运行相同的命令即可重试失败的区间")
+    return stats
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+本地模拟API服务器 - 用录制的响应代替 Jupiter / DexScreener / CoinGecko / 1inch
+按请求回放 fixtures/ 中的JSON响应，可为每个API源注入延迟（含抖动）和错误（503/429），
+以 Bench 开头的合成代币地址（以及合成币种在其他EVM链上的地址）按序号生成确定的价格，便于测量大批量查询；
+CoinGecko历史价格（market_chart/range）以当前价格为基准合成；
+CoinGecko代币列表可补齐到指定条数，以接近真实列表的下载和解析开销
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SOURCES = ('jupiter', 'dexscreener', 'coingecko', 'oneinch')
+SYNTHETIC_PREFIX = 'Bench'
+# 合成币种附带的其他链（CoinGecko平台ID）及其DexScreener链ID
+OTHER_CHAINS = ('binance-smart-chain', 'polygon-pos', 'arbitrum-one', 'base', 'avalanche', 'optimistic-ethereum')
+DEXSCREENER_CHAINS = ('bsc', 'polygon', 'arbitrum', 'base', 'avalanche', 'optimism')
+EVM_SUFFIX = 'b' * 28
+
+
+def synthetic_address(index: int) -> str:
+    """第 index 个合成代币的地址"""
+    return f"{SYNTHETIC_PREFIX}{index:06d}TokenMint1111111111111111111"
+
+
+def synthetic_index(address: str) -> Optional[int]:
+    """从合成代币地址解析出序号，不是合成地址时返回None"""
+    if not address.startswith(SYNTHETIC_PREFIX):
+        return None
+    digits = address[len(SYNTHETIC_PREFIX):len(SYNTHETIC_PREFIX) + 6]
+    return int(digits) if digits.isdigit() else None
+
+
+def synthetic_evm_address(index: int, offset: int) -> str:
+    """第 index 个合成币种在 OTHER_CHAINS[offset] 链上的合约地址"""
+    return f"0x{index:08x}{offset:04x}{EVM_SUFFIX}"
+
+
+def synthetic_evm_index(address: str) -> Optional[tuple]:
+    """从合成EVM地址解析出 (序号, 链序号)，不是合成地址时返回None"""
+    address = address.lower()
+    if len(address) != 42 or not address.startswith('0x') or not address.endswith(EVM_SUFFIX):
+        return None
+    try:
+        return int(address[2:10], 16), int(address[10:14], 16)
+    except ValueError:
+        return None
+
+
+def synthetic_price(index: int) -> float:
+    return round(0.5 + (index * 7919 % 10000) / 1000, 6)
+
+
+def load_fixture(name: str):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class MockApiServer:
+    """
+    模拟API服务器（后台线程运行）
+    
+    latency 为各API源的平均响应延迟（秒），jitter 为延迟的随机浮动比例，
+    error_rate 为每个请求返回 error_status 的概率
+    """
+    
+    def __init__(self, port: int = 0, host: str = '127.0.0.1',
+                 latency: Optional[Dict[str, float]] = None, jitter: float = 0.2,
+                 error_rate: float = 0.0, error_status: int = 503,
+                 coin_list_size: int = 15000, seed: int = 42):
+        self.host = host
+        self.port = port
+        self.latency = {source: 0.0 for source in SOURCES}
+        self.latency.update(latency or {})
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.coin_list_size = coin_list_size
+        self.request_counts = {source: 0 for source in SOURCES}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        
+        self.jupiter_prices = load_fixture('jupiter_price.json')['data']
+        self.dexscreener_pairs = load_fixture('dexscreener_tokens.json')['pairs']
+        self.coingecko_prices = load_fixture('coingecko_simple_price.json')
+        self.oneinch_prices = load_fixture('oneinch_price.json')
+        self.coin_list_body = self._build_coin_list(load_fixture('coingecko_coins_list.json'))
+        self.coin_list_etag = f'W/"{len(self.coin_list_body)}"'
+    
+    def _build_coin_list(self, coins: List[Dict]) -> bytes:
+        """
+        录制的代币列表补齐合成代币到 coin_list_size 条
+        
+        与真实列表类似，大部分币种还部署在其他链上（每个合成币种附带几个EVM链地址）
+        """
+        coins = list(coins)
+        for index in range(max(0, self.coin_list_size - len(coins))):
+            platforms = {'solana': synthetic_address(index)}
+            for offset, chain in enumerate(OTHER_CHAINS[:index % (len(OTHER_CHAINS) + 1)]):
+                platforms[chain] = synthetic_evm_address(index, offset)
+            coins.append({
+                'id': f'bench-{index}',
+                'symbol': f'b{index}',
+                'name': f'Bench Token {index}',
+                'platforms': platforms
+            })
+        return json.dumps(coins, separators=(',', ':')).encode('utf-8')
+    
+    # ---------- 响应生成 ----------
+    
+    def jupiter_response(self, ids: List[str]) -> Dict:
+        data = {}
+        for address in ids:
+            if address in self.jupiter_prices:
+                data[address] = self.jupiter_prices[address]
+                continue
+            index = synthetic_index(address)
+            if index is not None:
+                data[address] = {'id': address, 'mintSymbol': f'B{index}', 'price': synthetic_price(index)}
+        return {'data': data, 'timeTaken': 0.001}
+    
+    def dexscreener_response(self, addresses: List[str]) -> Dict:
+        wanted = {address.lower() for address in addresses}
+        pairs = [pair for pair in self.dexscreener_pairs if pair['baseToken']['address'].lower() in wanted]
+        for address in addresses:
+            index, chain_id = synthetic_index(address), 'solana'
+            if index is None and synthetic_evm_index(address):
+                index, offset = synthetic_evm_index(address)
+                chain_id = DEXSCREENER_CHAINS[offset] if offset < len(DEXSCREENER_CHAINS) else None
+            if index is not None and chain_id:
+                pairs.append({
+                    'chainId': chain_id,
+                    'dexId': 'raydium' if chain_id == 'solana' else 'uniswap',
+                    'baseToken': {'address': address, 'name': f'Bench Token {index}', 'symbol': f'B{index}'},
+                    'priceUsd': str(synthetic_price(index)),
+                    'liquidity': {'usd': 250000.0}
+                })
+        return {'schemaVersion': '1.0.0', 'pairs': pairs}
+    
+    def coingecko_price_response(self, ids: List[str]) -> Dict:
+        result = {}
+        for coin_id in ids:
+            if coin_id in self.coingecko_prices:
+                result[coin_id] = self.coingecko_prices[coin_id]
+            elif coin_id.startswith('bench-') and coin_id[6:].isdigit():
+                result[coin_id] = {'usd': synthetic_price(int(coin_id[6:]))}
+        return result
+    
+    def coin_usd_price(self, coin_id: str) -> Optional[float]:
+        """录制的或合成币种的美元价格，未知币种返回None"""
+        if coin_id in self.coingecko_prices:
+            return self.coingecko_prices[coin_id].get('usd')
+        if coin_id.startswith('bench-') and coin_id[6:].isdigit():
+            return synthetic_price(int(coin_id[6:]))
+        return None
+    
+    def market_chart_response(self, coin_id: str, start: float, end: float) -> Optional[Dict]:
+        """
+        合成的历史价格序列：以当前价格为基准按日正弦波动
+        
+        与CoinGecko一致，区间不超过90天时为小时级数据，否则为日级数据；未知币种返回None
+        """
+        base = self.coin_usd_price(coin_id)
+        if base is None:
+            return None
+        step = 3600 if end - start <= 90 * 86400 else 86400
+        phase = sum(coin_id.encode()) % 24
+        prices = []
+        ts = math.ceil(start / step) * step
+        while ts <= end:
+            prices.append([ts * 1000, round(base * (1 + 0.05 * math.sin(ts / 86400 + phase)), 10)])
+            ts += step
+        return {'prices': prices, 'market_caps': [], 'total_volumes': []}
+    
+    def oneinch_response(self, addresses: List[str]) -> Dict:
+        return {address: self.oneinch_prices[address.lower()]
+                for address in addresses if address.lower() in self.oneinch_prices}
+    
+    # ---------- 服务器 ----------
+    
+    def _delay(self, source: str) -> float:
+        base = self.latency.get(source, 0.0)
+        if base <= 0:
+            return 0.0
+        with self._lock:
+            return max(0.0, base * (1 + self._random.uniform(-self.jitter, self.jitter)))
+    
+    def _should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+    
+    def _make_handler(self):
+        mock = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 响应头和响应体分两次写出，保持连接时避免Nagle算法和延迟ACK叠加出的约40ms停顿
+            disable_nagle_algorithm = True
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def _send(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def _send_json(self, obj, status: int = 200):
+                self._send(status, json.dumps(obj, separators=(',', ':')).encode('utf-8'))
+            
+            def do_GET(self):
+                url = urlparse(self.path)
+                parts = url.path.strip('/').split('/')
+                source = parts[0] if parts else ''
+                if source not in SOURCES:
+                    self._send_json({'error': 'not found'}, 404)
+                    return
+                with mock._lock:
+                    mock.request_counts[source] += 1
+                
+                delay = mock._delay(source)
+                if delay:
+                    time.sleep(delay)
+                if mock._should_fail():
+                    self._send_json({'error': 'injected failure'}, mock.error_status)
+                    return
+                
+                query = parse_qs(url.query)
+                rest = '/'.join(parts[1:])
+                if source == 'jupiter' and rest == 'v4/price':
+                    self._send_json(mock.jupiter_response(query.get('ids', [''])[0].split(',')))
+                elif source == 'dexscreener' and rest.startswith('latest/dex/tokens/'):
+                    self._send_json(mock.dexscreener_response(parts[-1].split(',')))
+                elif source == 'coingecko' and rest == 'coins/list':
+                    if self.headers.get('If-None-Match') == mock.coin_list_etag:
+                        self._send(304, b'', {'ETag': mock.coin_list_etag})
+                    else:
+                        self._send(200, mock.coin_list_body, {'ETag': mock.coin_list_etag})
+                elif source == 'coingecko' and rest.startswith('coins/') and rest.endswith('/market_chart/range'):
+                    chart = mock.market_chart_response(parts[2], float(query.get('from', ['0'])[0]),
+                                                       float(query.get('to', ['0'])[0]))
+                    if chart is None:
+                        self._send_json({'error': 'coin not found'}, 404)
+                    else:
+                        self._send_json(chart)
+                elif source == 'coingecko' and rest == 'simple/price':
+                    self._send_json(mock.coingecko_price_response(query.get('ids', [''])[0].split(',')))
+                elif source == 'oneinch' and rest.startswith('price/'):
+                    self._send_json(mock.oneinch_response(parts[-1].split(',')))
+                else:
+                    self._send_json({'error': 'not found'}, 404)
+        
+        return Handler
+    
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+    
+    def start(self) -> 'MockApiServer':
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='mock-api', daemon=True).start()
+        return self
+    
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def point_tracker(self, tracker):
+        """把追踪器的各API源 base_url 指向本服务器"""
+        for source in SOURCES:
+            tracker.sources[source]['base_url'] = f"{self.base_url}/{source}"
+
+
+def parse_latency(values: List[str], default_ms: float) -> Dict[str, float]:
+    """解析 --latency 参数：单个数字作用于所有API源，或 source=毫秒 单独设置"""
+    latency = {source: default_ms / 1000 for source in SOURCES}
+    for value in values or []:
+        if '=' in value:
+            source, ms = value.split('=', 1)
+            latency[source.strip()] = float(ms) / 1000
+        else:
+            latency = {source: float(value) / 1000 for source in SOURCES}
+    return latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟API服务器（回放录制的API响应）')
+    parser.add_argument('--port', type=int, default=8999, help='监听端口（默认8999）')
+    parser.add_argument('--latency', action='append',
+                        help='响应延迟毫秒，如 50 或 jupiter=200（可重复指定）')
+    parser.add_argument('--jitter', type=float, default=0.2, help='延迟随机浮动比例（默认0.2）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='注入错误的概率（默认0）')
+    parser.add_argument('--error-status', type=int, default=503, help='注入错误时返回的状态码（默认503）')
+    parser.add_argument('--coin-list-size', type=int, default=15000, help='CoinGecko代币列表条数（默认15000）')
+    args = parser.parse_args()
+    
+    server = MockApiServer(port=args.port, latency=parse_latency(args.latency, 0), jitter=args.jitter,
+                           error_rate=args.error_rate, error_status=args.error_status,
+                           coin_list_size=args.coin_list_size).start()
+    print(f"🧪 模拟API服务器已启动: {server.base_url}")
+    for source in SOURCES:
+        print(f"   {source:<12} {server.base_url}/{source}")
+    print("按 Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+离线性能基准 - 针对本地模拟API服务器测量追踪器性能，结果保存为JSON
+测量项目：
+  single_lookup            单个代币顺序回退查询的延迟分布
+  single_lookup_concurrent 单个代币并发查询的延迟分布
+  batch_throughput         批量查询合成代币的吞吐量
+  coingecko_list           CoinGecko代币列表冷启动 / 持久化缓存 / 内存缓存 / 返回旧值 / 条件请求重新验证的耗时
+  history_csv / history_sqlite  历史记录写入、尾部读取和全量扫描速率
+
+用法：
+  python benchmarks/run_benchmarks.py --latency 50 --output results.json
+  python benchmarks/run_benchmarks.py --latency jupiter=300 --error-rate 0.05 --baseline results.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from history_store import open_history_store  # noqa: E402
+from mock_api import MockApiServer, parse_latency, synthetic_address  # noqa: E402
+from sol_token_price_tracker import MultiApiSolTokenTracker  # noqa: E402
+
+
+BENCHMARKS = ('single_lookup', 'single_lookup_concurrent', 'batch_throughput',
+              'coingecko_list', 'history_csv', 'history_sqlite')
+
+# 录制响应中包含的代币（轮流查询）
+FIXTURE_TOKENS = [
+    'EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v',  # USDC
+    'Es9vMFrzaCERmJfrF4H2FYD4KCoNkY11McCe8BenwNYB',  # USDT
+    'DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263',  # BONK
+    'JUPyiwrYJFskUPiHa7hkeR8VUtAeFoSYbKedZNsDvCN',   # JUP
+    'EKpQGSJtjMFqKZ9KQanSqYXRcF8fBopzLHYxdM65zcjm',  # WIF
+]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """延迟分布（毫秒）"""
+    ordered = sorted(samples)
+    
+    def percentile(p: float) -> float:
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+        return ordered[index] * 1000
+    
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        'min_ms': ordered[0] * 1000 if ordered else 0.0,
+        'p50_ms': percentile(50),
+        'p90_ms': percentile(90),
+        'p99_ms': percentile(99),
+        'max_ms': ordered[-1] * 1000 if ordered else 0.0,
+    }
+
+
+def timed(fn: Callable) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+class BenchmarkRunner:
+    """在临时目录中创建追踪器并依次运行各项基准"""
+    
+    def __init__(self, server: MockApiServer, workdir: str, args: argparse.Namespace):
+        self.server = server
+        self.workdir = workdir
+        self.args = args
+    
+    def make_tracker(self, cache_name: str = 'price_cache.db') -> MultiApiSolTokenTracker:
+        """创建指向模拟服务器的追踪器：固定API顺序、关闭限流，缓存和历史文件放在临时目录"""
+        os.environ.update({
+            'CACHE_PATH': os.path.join(self.workdir, cache_name),
+            'SOURCE_HEALTH_PATH': '',
+            'ADAPTIVE_RANKING': 'false',
+            'CONSENSUS_MODE': 'false',
+            'CONCURRENT_FETCH': 'false',
+            'HISTORY_BACKEND': 'csv',
+            'PREFERRED_APIS': 'jupiter,dexscreener,coingecko',
+        })
+        tracker = MultiApiSolTokenTracker()
+        self.server.point_tracker(tracker)
+        for name in tracker.sources:
+            tracker.rate_limiter.configure(name, None)
+        return tracker
+    
+    def _requests_made(self) -> int:
+        return sum(self.server.request_counts.values())
+    
+    def single_lookup(self, concurrent: bool = False) -> Dict:
+        tracker = self.make_tracker()
+        rounds = self.args.rounds
+        tracker.get_multi_api_prices(FIXTURE_TOKENS[0], concurrent=concurrent)  # 预热连接
+        before = self._requests_made()
+        samples, failures = [], 0
+        for i in range(rounds):
+            token = FIXTURE_TOKENS[i % len(FIXTURE_TOKENS)]
+            start = time.perf_counter()
+            sol_price, token_info, _ = tracker.get_multi_api_prices(token, concurrent=concurrent)
+            samples.append(time.perf_counter() - start)
+            if not (sol_price and token_info):
+                failures += 1
+        result = latency_summary(samples)
+        result['failures'] = failures
+        result['requests_per_lookup'] = (self._requests_made() - before) / rounds if rounds else 0.0
+        return result
+    
+    def batch_throughput(self) -> Dict:
+        tracker = self.make_tracker()
+        tokens = [synthetic_address(i) for i in range(self.args.batch_tokens)]
+        chunks = tracker._chunks(tokens, tracker.track_batch_size)
+        before = self._requests_made()
+        found = 0
+        start = time.perf_counter()
+        for chunk in chunks:
+            _, results = tracker.get_multi_api_prices_batch(chunk)
+            found += len(results)
+        elapsed = time.perf_counter() - start
+        return {
+            'tokens': len(tokens),
+            'found': found,
+            'batches': len(chunks),
+            'seconds': elapsed,
+            'tokens_per_second': len(tokens) / elapsed if elapsed else 0.0,
+            'requests': self._requests_made() - before,
+        }
+    
+    def coingecko_list(self) -> Dict:
+        cache_name = 'coingecko_list_cache.db'
+        cache_path = os.path.join(self.workdir, cache_name)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        
+        cold_tracker = self.make_tracker(cache_name)
+        cold = timed(cold_tracker._get_coingecko_index)
+        warm_memory = timed(cold_tracker._get_coingecko_index)
+        
+        persistent_tracker = self.make_tracker(cache_name)
+        warm_persistent = timed(persistent_tracker._get_coingecko_index)
+        
+        # 让持久化缓存过期：stale 窗口内先返回旧值并在后台重新验证
+        cache_key = persistent_tracker._coingecko_index_key
+        persistent_tracker._persistent_cache.touch(cache_key, -1)
+        stale_tracker = self.make_tracker(cache_name)
+        stale = timed(stale_tracker._get_coingecko_index)
+        stale_tracker._refresh_executor.shutdown(wait=True)
+        
+        # 关闭 stale 窗口时，新进程同步地通过 If-None-Match 条件请求重新验证（304）
+        persistent_tracker._persistent_cache.touch(cache_key, -1)
+        revalidate_tracker = self.make_tracker(cache_name)
+        revalidate_tracker._cache_policies['metadata'] = (revalidate_tracker._cache_ttl(cache_key), 0)
+        revalidate = timed(revalidate_tracker._get_coingecko_index)
+        
+        # 冷启动下载和解析期间的Python内存峰值（单独测量，tracemalloc 会拖慢计时）
+        peak_tracker = self.make_tracker('coingecko_list_peak.db')
+        tracemalloc.start()
+        index = peak_tracker._get_coingecko_index()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        return {
+            'coins': self.server.coin_list_size,
+            'payload_bytes': len(self.server.coin_list_body),
+            'cold_ms': cold * 1000,
+            'warm_persistent_ms': warm_persistent * 1000,
+            'warm_memory_ms': warm_memory * 1000,
+            'stale_ms': stale * 1000,
+            'revalidate_304_ms': revalidate * 1000,
+            'index_entries': sum(len(addresses) for addresses in (index or {}).values()),
+            'cold_peak_kb': peak / 1024,
+        }
+    
+    def history(self, backend: str) -> Dict:
+        directory = os.path.join(self.workdir, f'history_{backend}')
+        os.makedirs(directory, exist_ok=True)
+        store = open_history_store(backend,
+                                   price_path=os.path.join(directory, 'token_price_history.csv'),
+                                   comparison_path=os.path.join(directory, 'token_price_comparison.csv'),
+                                   db_path=os.path.join(directory, 'price_history.db'),
+                                   flush_rows=self.args.flush_rows, flush_interval=0)
+        rows = self.args.history_rows
+        tokens = [synthetic_address(i) for i in range(20)]
+        base_ts = time.time() - rows
+        records = []
+        for i in range(rows):
+            price = 1.0 + (i % 1000) / 1000
+            records.append({
+                'ts': base_ts + i,
+                'token_address': tokens[i % len(tokens)],
+                'token_name': f'Bench Token {i % len(tokens)}',
+                'token_symbol': f'B{i % len(tokens)}',
+                'sol_price': 150.0,
+                'token_price': price,
+                'sol_to_token': 150.0 / price,
+                'token_to_sol': price / 150.0,
+                'source': 'Jupiter',
+                'note': '基准测试',
+                'spread': None,
+            })
+        
+        batch = self.args.write_batch
+        start = time.perf_counter()
+        for i in range(0, rows, batch):
+            store.append('prices', records[i:i + batch])
+        store.flush()
+        write_seconds = time.perf_counter() - start
+        
+        tail_samples = [timed(lambda: store.tail('prices', 20)) for _ in range(20)]
+        token_tail_samples = [timed(lambda: store.tail('prices', 20, token=tokens[3])) for _ in range(20)]
+        window_samples = [timed(lambda: store.tail('prices', 100, since=base_ts + rows * 0.9)) for _ in range(20)]
+        
+        start = time.perf_counter()
+        scanned = sum(len(chunk) for chunk in store.iter_chunks('prices'))
+        scan_seconds = time.perf_counter() - start
+        store.close()
+        
+        return {
+            'rows': rows,
+            'write_batch': batch,
+            'write_rows_per_second': rows / write_seconds if write_seconds else 0.0,
+            'tail_20_ms': statistics.median(tail_samples) * 1000,
+            'tail_20_token_ms': statistics.median(token_tail_samples) * 1000,
+            'tail_100_since_ms': statistics.median(window_samples) * 1000,
+            'scan_rows': scanned,
+            'scan_rows_per_second': scanned / scan_seconds if scan_seconds else 0.0,
+        }
+    
+    def run(self, names: List[str]) -> Dict[str, Dict]:
+        dispatch = {
+            'single_lookup': lambda: self.single_lookup(concurrent=False),
+            'single_lookup_concurrent': lambda: self.single_lookup(concurrent=True),
+            'batch_throughput': self.batch_throughput,
+            'coingecko_list': self.coingecko_list,
+            'history_csv': lambda: self.history('csv'),
+            'history_sqlite': lambda: self.history('sqlite'),
+        }
+        results = {}
+        for name in names:
+            print(f"⏱️ {name} ...", flush=True)
+            results[name] = dispatch[name]()
+        return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def flatten(results: Dict, prefix: str = '') -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare_with_baseline(results: Dict, baseline_path: str, threshold: float):
+    """与基线结果对比，打印变化超过阈值的指标（耗时类增加、速率类下降视为退化）"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = flatten(json.load(f).get('results', {}))
+    current = flatten(results)
+    
+    print(f"\n📊 与基线对比: {baseline_path}")
+    regressions = 0
+    for name, value in current.items():
+        old = baseline.get(name)
+        if not old or not (name.endswith('_ms') or name.endswith('_per_second')):
+            continue
+        change = (value - old) / old
+        worse = change > threshold if name.endswith('_ms') else change < -threshold
+        better = change < -threshold if name.endswith('_ms') else change > threshold
+        mark = '🔴' if worse else ('🟢' if better else '  ')
+        regressions += 1 if worse else 0
+        print(f"{mark} {name:<48}{old:>14.2f} → {value:>14.2f}  ({change:+.1%})")
+    print(f"共 {regressions} 项退化（阈值 {threshold:.0%}）")
+
+
+def print_results(results: Dict[str, Dict]):
+    for name, result in results.items():
+        print(f"\n== {name}")
+        for key, value in result.items():
+            print(f"   {key:<24}{value:>14.2f}" if isinstance(value, float) else f"   {key:<24}{value:>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线性能基准（本地模拟API服务器）')
+    parser.add_argument('--only', type=str,
+                        help=f"只运行指定项目，逗号分隔（可选：{', '.join(BENCHMARKS)}）")
+    parser.add_argument('--latency', action='append',
+                        help='模拟API响应延迟毫秒，如 50 或 jupiter=300（可重复指定，默认20）')
+    parser.add_argument('--jitter', type=float, default=0.2, help='延迟随机浮动比例（默认0.2）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='注入错误的概率（默认0）')
+    parser.add_argument('--error-status', type=int, default=503, help='注入错误时返回的状态码（默认503）')
+    parser.add_argument('--rounds', type=int, default=50, help='单代币查询次数（默认50）')
+    parser.add_argument('--batch-tokens', type=int, default=500, help='批量吞吐量测试的代币数（默认500）')
+    parser.add_argument('--coin-list-size', type=int, default=15000, help='CoinGecko代币列表条数（默认15000）')
+    parser.add_argument('--history-rows', type=int, default=100000, help='历史记录写入行数（默认100000）')
+    parser.add_argument('--write-batch', type=int, default=30, help='每次追加的记录数（默认30，即一批代币）')
+    parser.add_argument('--flush-rows', type=int, default=100, help='历史写入缓冲行数（默认100）')
+    parser.add_argument('--seed', type=int, default=42, help='延迟和错误注入的随机种子')
+    parser.add_argument('--output', type=str, default='benchmark_results.json', help='结果JSON文件')
+    parser.add_argument('--baseline', type=str, help='与之前保存的结果JSON对比')
+    parser.add_argument('--threshold', type=float, default=0.1, help='对比时视为变化的比例（默认0.1）')
+    parser.add_argument('--keep-workdir', action='store_true', help='保留临时目录（缓存和历史文件）')
+    args = parser.parse_args()
+    
+    names = [name.strip() for name in args.only.split(',')] if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准项目: {', '.join(unknown)}")
+    
+    logging.basicConfig(level=logging.ERROR, format='%(message)s')
+    latency = parse_latency(args.latency, 20)
+    server = MockApiServer(latency=latency, jitter=args.jitter, error_rate=args.error_rate,
+                           error_status=args.error_status, coin_list_size=args.coin_list_size,
+                           seed=args.seed).start()
+    workdir = tempfile.mkdtemp(prefix='price-bench-')
+    cwd = os.getcwd()
+    output = os.path.abspath(args.output)
+    print(f"🧪 模拟API服务器: {server.base_url}  临时目录: {workdir}")
+    try:
+        os.chdir(workdir)
+        results = BenchmarkRunner(server, workdir, args).run(names)
+    finally:
+        os.chdir(cwd)
+        server.stop()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': {
+                'latency_ms': {source: seconds * 1000 for source, seconds in latency.items()},
+                'jitter': args.jitter,
+                'error_rate': args.error_rate,
+                'error_status': args.error_status,
+                'rounds': args.rounds,
+                'batch_tokens': args.batch_tokens,
+                'coin_list_size': args.coin_list_size,
+                'history_rows': args.history_rows,
+                'write_batch': args.write_batch,
+                'flush_rows': args.flush_rows,
+                'seed': args.seed,
+            },
+        },
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    
+    print_results(results)
+    print(f"\n💾 结果已保存到 {output}")
+    if args.baseline:
+        compare_with_baseline(results, args.baseline, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
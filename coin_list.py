@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+CoinGecko代币列表增量解析 - 边下载边解析 /coins/list?include_platform=true
+完整列表有上万个币种、数十MB，一次性 response.json() 会同时持有整个响应文本和
+完整的嵌套列表。这里按块接收响应体，用 JSONDecoder.raw_decode 逐个解析数组元素，
+只保留所需平台的 {小写合约地址: 币种信息} 索引，内存中最多只有一个数据块和一个元素
+"""
+
+import codecs
+import json
+import re
+from typing import Dict, Iterable, Optional
+
+
+DEFAULT_PLATFORMS = ('solana', 'ethereum')
+
+# 数组元素之间的空白和逗号
+_SEPARATOR = re.compile(r'[\s,]*')
+_WHITESPACE = re.compile(r'\s*')
+
+
+def parse_platforms(value: Optional[str], default: Iterable[str] = DEFAULT_PLATFORMS) -> tuple:
+    """解析逗号分隔的平台列表（如 COINGECKO_PLATFORMS），为空时使用默认平台"""
+    platforms = tuple(p.strip().lower() for p in (value or '').split(',') if p.strip())
+    return platforms or tuple(default)
+
+
+class CoinListIndexBuilder:
+    """
+    增量构建平台地址索引
+    
+    用法：对每个响应数据块调用 feed(chunk)，全部接收后调用 close() 得到
+    {平台: {小写合约地址: {'id', 'name', 'symbol'}}}；响应不是合法的JSON数组时抛出 ValueError
+    """
+    
+    def __init__(self, platforms: Iterable[str] = DEFAULT_PLATFORMS):
+        self.platforms = frozenset(platforms)
+        self.index: Dict[str, Dict[str, Dict]] = {platform: {} for platform in self.platforms}
+        self.coins = 0
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._started = False
+        self._finished = False
+    
+    def feed(self, chunk):
+        """接收一块响应数据（bytes 或 str），解析其中所有完整的数组元素"""
+        if isinstance(chunk, bytes):
+            chunk = self._text_decoder.decode(chunk)
+        if self._finished:
+            if chunk.strip():
+                raise ValueError("CoinGecko代币列表在数组结束后还有多余数据")
+            return
+        self._buffer += chunk
+        self._parse()
+    
+    def _parse(self):
+        buffer = self._buffer
+        pos = _WHITESPACE.match(buffer).end()
+        if not self._started:
+            if pos >= len(buffer):
+                self._buffer = ''
+                return
+            if buffer[pos] != '[':
+                raise ValueError("CoinGecko代币列表不是JSON数组")
+            self._started = True
+            pos += 1
+        
+        while True:
+            pos = _SEPARATOR.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ']':
+                self._finished = True
+                pos += 1
+                break
+            try:
+                coin, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # 元素还没有接收完整，等待下一块数据
+            self._add(coin)
+            pos = end
+        
+        self._buffer = buffer[pos:]
+        if self._finished and self._buffer.strip():
+            raise ValueError("CoinGecko代币列表在数组结束后还有多余数据")
+    
+    def _add(self, coin: Dict):
+        self.coins += 1
+        platforms = coin.get('platforms') if isinstance(coin, dict) else None
+        if not platforms:
+            return
+        entry = None
+        for platform, address in platforms.items():
+            if address and platform in self.platforms:
+                if entry is None:
+                    entry = {'id': coin['id'], 'name': coin['name'], 'symbol': coin['symbol']}
+                # 同一地址出现在多个币种中时保留列表中的第一个（与逐个扫描列表的结果一致）
+                self.index[platform].setdefault(address.lower(), entry)
+    
+    def close(self) -> Dict[str, Dict[str, Dict]]:
+        """结束解析并返回索引"""
+        self._buffer += self._text_decoder.decode(b'', final=True)
+        if not self._finished:
+            if self._buffer.strip():
+                self._decoder.raw_decode(self._buffer.strip())  # 抛出具体的JSON解析错误
+            raise ValueError("CoinGecko代币列表不完整")
+        return self.index
+
+
+def build_coin_list_index(chunks: Iterable, platforms: Iterable[str] = DEFAULT_PLATFORMS) -> Dict[str, Dict[str, Dict]]:
+    """从响应数据块序列构建平台地址索引"""
+    builder = CoinListIndexBuilder(platforms)
+    for chunk in chunks:
+        builder.feed(chunk)
+    return builder.close()
@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 """
-使用示例：演示如何使用SolTokenPriceTracker类
+使用示例：演示如何使用MultiApiSolTokenTracker类
 """
 
-from sol_token_price_tracker import SolTokenPriceTracker
+import logging
+
+from sol_token_price_tracker import MultiApiSolTokenTracker
 
 def main():
+    # 追踪器通过logging输出进度信息
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    
     # 创建追踪器实例
-    tracker = SolTokenPriceTracker()
+    tracker = MultiApiSolTokenTracker()
     
     # 一些常见的Solana代币地址用于测试
     test_tokens = {
@@ -18,14 +23,14 @@ def main():
     
     print("=== Solana代币价格追踪器示例 ===\n")
     
+    # 批量追踪：每批只获取一次SOL价格，每个API源只发一次批量请求
+    status = tracker.track_tokens(list(test_tokens.values()))
     for token_name, token_address in test_tokens.items():
-        print(f"正在测试 {token_name}...")
-        success = tracker.track_token_price(token_address)
-        if success:
-            print(f"✅ {token_name} 价格获取成功\n")
+        if status.get(token_address):
+            print(f"✅ {token_name} 价格获取成功")
         else:
-            print(f"❌ {token_name} 价格获取失败\n")
-        print("-" * 50)
+            print(f"❌ {token_name} 价格获取失败")
+    print("-" * 50)
     
     # 显示历史记录
     print("\n显示历史记录:")
@@ -0,0 +1,851 @@
+#!/usr/bin/env python3
+"""
+历史记录存储 - 可插拔的价格历史后端
+记录先缓存在内存中，达到行数上限或间隔时间后批量写出，进程退出时自动写出剩余记录：
+- csv：追加写入CSV文件（持有文件锁，多个进程可以安全地共享同一个文件）
+- sqlite：数值类型列 + (代币地址, 时间戳) 主键索引，可按需导出为CSV
+"""
+
+import atexit
+import csv
+import datetime
+import heapq
+import io
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+logger = logging.getLogger(__name__)
+
+
+# 记录字段（存储后端使用的列名），记录以 {字段: 值} 字典传入
+PRICE_FIELDS = (
+    'ts', 'token_address', 'token_name', 'token_symbol', 'sol_price',
+    'token_price', 'sol_to_token', 'token_to_sol', 'source', 'note', 'spread'
+)
+COMPARISON_FIELDS = (
+    'ts', 'sol_token_address', 'sol_token_name', 'sol_token_symbol', 'sol_token_price',
+    'eth_token_address', 'eth_token_name', 'eth_token_symbol', 'eth_token_price',
+    'sol_to_eth_ratio', 'eth_to_sol_ratio', 'sol_source', 'eth_source', 'note',
+    'sol_spread', 'eth_spread'
+)
+
+PRICE_CSV_HEADER = [
+    '时间戳', '代币地址', '代币名称', '代币符号',
+    'SOL价格(USD)', '代币价格(USD)', 'SOL/代币比值',
+    '代币/SOL比值', '数据源', '备注', '源间价差'
+]
+COMPARISON_CSV_HEADER = [
+    '时间戳', 'SOL代币地址', 'SOL代币名称', 'SOL代币符号', 'SOL代币价格(USD)',
+    'ETH代币地址', 'ETH代币名称', 'ETH代币符号', 'ETH代币价格(USD)',
+    'SOL代币/ETH代币比值', 'ETH代币/SOL代币比值',
+    'SOL数据源', 'ETH数据源', '备注', 'SOL代币源间价差', 'ETH代币源间价差'
+]
+
+# CSV中各数值列的格式（与历史文件保持一致）
+_PRICE_FORMATS = {'sol_price': '.6f', 'token_price': '.8f', 'sol_to_token': '.8f', 'token_to_sol': '.8f',
+                  'spread': '.6f'}
+_COMPARISON_FORMATS = {'sol_token_price': '.8f', 'eth_token_price': '.8f',
+                       'sol_to_eth_ratio': '.8f', 'eth_to_sol_ratio': '.8f',
+                       'sol_spread': '.6f', 'eth_spread': '.6f'}
+
+KINDS = {
+    'prices': (PRICE_FIELDS, PRICE_CSV_HEADER, _PRICE_FORMATS),
+    'comparisons': (COMPARISON_FIELDS, COMPARISON_CSV_HEADER, _COMPARISON_FORMATS),
+}
+
+
+# CSV记录允许的时间乱序范围（秒）：多个进程各自缓冲后写出的记录会交错，
+# 夏令时结束时本地时间会回退一小时；tail / iter_chunks 会越过时间边界多扫描这么长的记录
+ORDER_SLACK = 3600
+
+
+def format_timestamp(ts: float) -> str:
+    """时间戳（秒）转为CSV中使用的本地时间字符串"""
+    return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_timestamp(text: str) -> float:
+    """format_timestamp 的逆操作"""
+    return datetime.datetime.strptime(text, "%Y-%m-%d %H:%M:%S").timestamp()
+
+
+def parse_time_arg(text: str, now: Optional[float] = None) -> float:
+    """
+    解析命令行中的时间参数，返回Unix秒
+    支持 "2024-01-31"、"2024-01-31 08:00"、"2024-01-31 08:00:00" 以及相对时间 "30m"、"24h"、"7d"
+    """
+    text = text.strip()
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if text and text[-1].lower() in units and text[:-1].replace('.', '', 1).isdigit():
+        return (time.time() if now is None else now) - float(text[:-1]) * units[text[-1].lower()]
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValueError(f"无法解析时间: {text}（示例：2024-01-31、2024-01-31 08:00、24h、7d）")
+
+
+def format_csv_row(kind: str, record: Dict) -> List[str]:
+    """把一条记录格式化为CSV行"""
+    fields, _, formats = KINDS[kind]
+    row = []
+    for field in fields:
+        value = record.get(field)
+        if field == 'ts':
+            row.append(format_timestamp(value))
+        elif field in formats and value is not None:
+            row.append(format(value, formats[field]))
+        else:
+            row.append('' if value is None else str(value))
+    return row
+
+
+def _address_columns(kind: str) -> List[int]:
+    """某类记录中代币地址所在的列"""
+    return [i for i, field in enumerate(KINDS[kind][0]) if field.endswith('token_address')]
+
+
+def _reverse_lines(file, start: int, end: int, block_size: int = 64 * 1024):
+    """从 end 向前逐行读取二进制文件（不早于 start），每次只读取一个块"""
+    position = end
+    remainder = b''
+    while position > start:
+        size = min(block_size, position - start)
+        position -= size
+        file.seek(position)
+        lines = (file.read(size) + remainder).split(b'\n')
+        remainder = lines.pop(0)  # 第一段可能是不完整的行，留到下一个块
+        for line in reversed(lines):
+            if line.strip():
+                yield line
+    if remainder.strip():
+        yield remainder
+
+
+def _line_at(file, offset: int, end: int) -> Tuple[int, bytes]:
+    """返回从 offset 起（含）第一个完整行的起始位置和内容"""
+    if offset > 0:
+        file.seek(offset - 1)
+        if file.read(1) != b'\n':
+            file.readline()  # offset 落在行中间，跳到下一行
+    else:
+        file.seek(0)
+    position = file.tell()
+    if position >= end:
+        return end, b''
+    return position, file.readline()
+
+
+def _bisect_timestamp(file, start: int, end: int, timestamp: str) -> int:
+    """
+    二分查找第一个时间戳大于 timestamp 的行的起始位置
+    
+    CSV按时间顺序追加，时间戳为定宽的 "%Y-%m-%d %H:%M:%S" 字符串，可以直接按字典序比较；
+    记录有少量乱序时结果只是近似位置，调用方需要留出 ORDER_SLACK 的余量
+    """
+    target = timestamp.encode('utf-8')
+    low, high = start, end
+    while low < high:
+        middle = (low + high) // 2
+        _, line = _line_at(file, middle, end)
+        if not line or line[:len(target)] > target:
+            high = middle
+        else:
+            low = middle + 1
+    return _line_at(file, low, end)[0]
+
+
+@contextmanager
+def locked_file(path: str, mode: str = 'a'):
+    """打开文件并持有排他锁（POSIX使用flock，Windows使用msvcrt.locking）"""
+    with open(path, mode, newline='', encoding='utf-8') as file:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                file.seek(0, os.SEEK_END)  # 加锁前其他进程可能已追加内容
+                yield file
+            finally:
+                file.flush()
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+        else:
+            # msvcrt 锁定的是字节区间，统一锁文件开头的第一个字节作为互斥标记
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                file.seek(0, os.SEEK_END)
+                yield file
+            finally:
+                file.flush()
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class BufferedWriter:
+    """
+    带缓冲的批量写入器基类
+    
+    write_rows 只把记录放入内存缓冲区；缓冲行数达到 flush_rows 或距上次写出超过
+    flush_interval 秒时，调用子类的 _write 一次性写出。
+    后台线程按间隔定期写出，保证低频轮询时记录也不会长时间停留在内存中
+    """
+    
+    def __init__(self, flush_rows: int = 100, flush_interval: float = 5.0):
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval
+        
+        self._buffer: List = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._last_flush = time.monotonic()
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.close)
+    
+    def write_rows(self, rows: Sequence):
+        """把记录加入缓冲区，必要时立即写出"""
+        if not rows:
+            return
+        with self._lock:
+            self._buffer.extend(rows)
+            due = (len(self._buffer) >= self.flush_rows or
+                   time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+        else:
+            self._start_timer()
+    
+    def write_row(self, row):
+        """写入一条记录"""
+        self.write_rows([row])
+    
+    def pending(self) -> int:
+        """缓冲区中尚未写出的记录数"""
+        with self._lock:
+            return len(self._buffer)
+    
+    def flush(self):
+        """把缓冲区中的记录一次性写出"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if not rows:
+                return
+            try:
+                self._write(rows)
+            except Exception:
+                # 写入失败时放回缓冲区，下次写出时重试
+                self._buffer[:0] = rows
+                raise
+    
+    def close(self):
+        """停止后台线程并写出剩余记录"""
+        self._closed.set()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("❌ 写入历史记录失败 %s: %s", self.describe(), e)
+    
+    def describe(self) -> str:
+        """写入目标的描述（用于日志）"""
+        return self.__class__.__name__
+    
+    def _write(self, rows: List):
+        """写出一批记录（子类实现，调用方持有 _lock）"""
+        raise NotImplementedError
+    
+    def _start_timer(self):
+        """启动后台定时写出线程（首次有记录进入缓冲区时）"""
+        if self._thread is not None or self.flush_interval <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name=f"history-writer:{self.describe()}",
+                                            daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        """按 flush_interval 定期写出缓冲区"""
+        while not self._closed.wait(self.flush_interval):
+            if self.pending():
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error("❌ 写入历史记录失败 %s: %s", self.describe(), e)
+
+
+class BufferedCsvWriter(BufferedWriter):
+    """带缓冲的CSV追加写入器：在文件锁内一次性追加整批行（文件为空时先写表头）"""
+    
+    def __init__(self, path: str, header: Sequence[str], flush_rows: int = 100,
+                 flush_interval: float = 5.0):
+        super().__init__(flush_rows, flush_interval)
+        self.path = path
+        self.header = list(header)
+    
+    def describe(self) -> str:
+        return self.path
+    
+    def ensure_header(self):
+        """文件不存在或为空时写入表头（在文件锁内检查，避免多个进程重复写入）"""
+        with locked_file(self.path) as file:
+            if file.tell() == 0:
+                csv.writer(file).writerow(self.header)
+    
+    def upgrade_header(self) -> bool:
+        """
+        旧版本写入的文件表头是当前表头的前缀（后来新增了列）时，在文件锁内升级表头，
+        并为已有的每一行补齐空列，避免新旧行列数不一致；返回是否进行了升级
+        
+        逐行经临时文件改写后原样写回同一个文件（不替换文件），内存占用与文件大小无关
+        """
+        if not os.path.exists(self.path):
+            return False
+        with locked_file(self.path, 'r+') as file:
+            file.seek(0)
+            header = next(csv.reader([file.readline()]), None)
+            if not header or len(header) >= len(self.header) or header != self.header[:len(header)]:
+                return False
+            width = len(self.header)
+            with tempfile.TemporaryFile('w+', newline='', encoding='utf-8') as temp:
+                writer = csv.writer(temp)
+                writer.writerow(self.header)
+                # 升级前新版本进程可能已经追加过完整的行，只补齐较短的行
+                for row in csv.reader(file):
+                    writer.writerow(row + [''] * (width - len(row)) if row else row)
+                temp.seek(0)
+                file.seek(0)
+                shutil.copyfileobj(temp, file)
+                file.truncate()
+        logger.info("📝 %s 的表头已升级为 %s 列", self.path, len(self.header))
+        return True
+    
+    def _write(self, rows: List[Sequence[str]]):
+        # 先在内存中格式化，持锁期间只做一次 write 调用
+        text = io.StringIO()
+        csv.writer(text).writerows(rows)
+        with locked_file(self.path) as file:
+            if file.tell() == 0:
+                csv.writer(file).writerow(self.header)
+            file.write(text.getvalue())
+
+
+class BufferedSqliteWriter(BufferedWriter):
+    """带缓冲的SQLite写入器：每批记录在一个事务中 executemany 插入"""
+    
+    def __init__(self, store: 'SqliteHistoryStore', table: str, fields: Sequence[str],
+                 flush_rows: int = 100, flush_interval: float = 5.0):
+        super().__init__(flush_rows, flush_interval)
+        self.store = store
+        self.table = table
+        self.fields = tuple(fields)
+        self._sql = (f"INSERT OR REPLACE INTO {table} ({', '.join(self.fields)}) "
+                     f"VALUES ({', '.join('?' for _ in self.fields)})")
+    
+    def describe(self) -> str:
+        return f"{self.store.path}:{self.table}"
+    
+    def _write(self, rows: List[Dict]):
+        params = [tuple(record.get(field) for field in self.fields) for record in rows]
+        with self.store.transaction() as conn:
+            conn.executemany(self._sql, params)
+
+
+def _line_timestamp(line: str) -> str:
+    """CSV行的排序键：时间戳是第一列，格式为 "YYYY-MM-DD HH:MM:SS"，按字符串比较即按时间排序"""
+    return line[:19]
+
+
+def _is_time_ordered(lines: Iterable[str]) -> bool:
+    """逐行检查CSV行是否已按时间戳排列"""
+    previous = ''
+    for line in lines:
+        key = _line_timestamp(line)
+        if key < previous:
+            return False
+        previous = key
+    return True
+
+
+def _in_range(row: List[str], since_text: Optional[str], until_text: Optional[str]) -> bool:
+    """CSV行的时间戳是否在 [since_text, until_text] 内（按秒比较，None表示不限）"""
+    return ((since_text is None or row[0] >= since_text)
+            and (until_text is None or row[0] <= until_text))
+
+
+@contextmanager
+def _sorted_run(lines: List[str]):
+    """把一段行排序后写入临时文件，产出从头读取的文件对象"""
+    lines.sort(key=_line_timestamp)
+    with tempfile.TemporaryFile('w+', newline='', encoding='utf-8') as run:
+        run.writelines(lines)
+        run.seek(0)
+        yield run
+
+
+class CsvHistoryStore:
+    """CSV历史后端：价格记录和比值记录各写一个CSV文件"""
+    
+    name = 'csv'
+    
+    def __init__(self, price_path: str = "token_price_history.csv",
+                 comparison_path: str = "token_price_comparison.csv",
+                 flush_rows: int = 100, flush_interval: float = 5.0):
+        self.paths = {'prices': price_path, 'comparisons': comparison_path}
+        self._writers = {
+            kind: BufferedCsvWriter(path, KINDS[kind][1], flush_rows, flush_interval)
+            for kind, path in self.paths.items()
+        }
+        for writer in self._writers.values():
+            writer.upgrade_header()
+        self._writers['prices'].ensure_header()
+    
+    def location(self, kind: str) -> str:
+        """某类记录的存储位置"""
+        return self.paths[kind]
+    
+    def append(self, kind: str, records: Sequence[Dict]):
+        """追加记录（经缓冲区批量写入）"""
+        self._writers[kind].write_rows([format_csv_row(kind, record) for record in records])
+    
+    def tail(self, kind: str, limit: int, token: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None) -> Optional[Tuple[List[str], List[List[str]]]]:
+        """
+        返回 (表头, 最近 limit 行)；文件不存在时返回None
+        
+        从文件末尾按块向前读取，内存占用与文件大小无关：
+        until 通过二分查找定位起点，since 用于向前扫描时提前停止，token 匹配代币地址列；
+        记录可能有少量乱序，两端都多扫描 ORDER_SLACK 秒的记录，再按时间戳逐行过滤
+        """
+        self._writers[kind].flush()
+        path = self.paths[kind]
+        if not os.path.exists(path):
+            return None
+        
+        address_columns = _address_columns(kind)
+        since_text = format_timestamp(since) if since is not None else None
+        until_text = format_timestamp(until) if until is not None else None
+        stop_text = format_timestamp(since - ORDER_SLACK) if since is not None else None
+        rows = []
+        with open(path, 'rb') as file:
+            header_line = file.readline()
+            if not header_line:
+                return KINDS[kind][1], []
+            header = next(csv.reader([header_line.decode('utf-8')]))
+            start = file.tell()
+            end = file.seek(0, os.SEEK_END)
+            if until is not None:
+                end = _bisect_timestamp(file, start, end, format_timestamp(until + ORDER_SLACK))
+            
+            for line in _reverse_lines(file, start, end):
+                if len(rows) >= limit:
+                    break
+                row = next(csv.reader([line.decode('utf-8')]), None)
+                if not row:
+                    continue
+                if stop_text is not None and row[0] < stop_text:
+                    break
+                if not _in_range(row, since_text, until_text):
+                    continue
+                if token is not None and not any(
+                        i < len(row) and row[i] == token for i in address_columns):
+                    continue
+                rows.append(row)
+        
+        rows.reverse()
+        return header, rows
+    
+    def iter_chunks(self, kind: str, token: Optional[str] = None, since: Optional[float] = None,
+                    until: Optional[float] = None, chunk_size: int = 100000) -> Iterator[List[List[str]]]:
+        """
+        按文件顺序（即时间顺序）分块读取记录，每块为CSV字符串行列表
+        
+        since / until 通过二分查找定位读取区间（两端各留 ORDER_SLACK 秒的余量，容忍少量乱序），
+        只读取区间内的字节；时间戳按秒比较，与 tail 的过滤规则一致
+        """
+        self._writers[kind].flush()
+        path = self.paths[kind]
+        if not os.path.exists(path):
+            return
+        
+        address_columns = _address_columns(kind)
+        since_text = format_timestamp(since) if since is not None else None
+        until_text = format_timestamp(until) if until is not None else None
+        with open(path, 'rb') as file:
+            if not file.readline():
+                return
+            start = file.tell()
+            end = file.seek(0, os.SEEK_END)
+            if since is not None:
+                start = _bisect_timestamp(file, start, end, format_timestamp(since - 1 - ORDER_SLACK))
+            if until is not None:
+                end = _bisect_timestamp(file, start, end, format_timestamp(until + ORDER_SLACK))
+            
+            # 按大块读取字节区间，在最后一个换行处切分，避免逐行 readline
+            file.seek(start)
+            position = start
+            remainder = b''
+            lines = []
+            while position < end:
+                block = file.read(min(8 * 1024 * 1024, end - position))
+                if not block:
+                    break
+                position += len(block)
+                block = remainder + block
+                cut = block.rfind(b'\n') + 1 if position < end else len(block)
+                block, remainder = block[:cut], block[cut:]
+                lines.extend(block.decode('utf-8').splitlines())
+                while len(lines) >= chunk_size:
+                    yield self._parse_chunk(lines[:chunk_size], token, address_columns, since_text, until_text)
+                    lines = lines[chunk_size:]
+            if remainder:
+                lines.append(remainder.decode('utf-8'))
+            if lines:
+                yield self._parse_chunk(lines, token, address_columns, since_text, until_text)
+    
+    def sort_by_time(self, kind: str, run_lines: int = 500000) -> bool:
+        """
+        按时间戳重新排列CSV文件中的记录，返回是否发生了重排
+        
+        tail / iter_chunks 只容忍 ORDER_SLACK 以内的乱序；回填等写入较早时间记录的操作完成后调用。
+        在文件锁内先逐行检查是否已经有序；需要重排时每 run_lines 行排序后写入一个临时文件，
+        再多路归并写回原文件（稳定排序），内存占用与文件大小无关。其他进程的追加会等待排序完成
+        """
+        self._writers[kind].flush()
+        path = self.paths[kind]
+        if not os.path.exists(path):
+            return False
+        with locked_file(path, 'r+') as file:
+            file.seek(0)
+            header = file.readline()
+            if _is_time_ordered(file):
+                return False
+            
+            file.seek(0)
+            file.readline()
+            with ExitStack() as stack:
+                runs = []
+                lines = []
+                for line in file:
+                    lines.append(line if line.endswith('\n') else line + '\r\n')
+                    if len(lines) >= run_lines:
+                        runs.append(stack.enter_context(_sorted_run(lines)))
+                        lines = []
+                if runs:
+                    if lines:
+                        runs.append(stack.enter_context(_sorted_run(lines)))
+                    # heapq.merge 在键相同时按参数顺序输出，与原文件中的先后顺序一致
+                    merged = heapq.merge(*runs, key=_line_timestamp)
+                else:
+                    merged = sorted(lines, key=_line_timestamp)
+                file.seek(0)
+                file.write(header)
+                file.writelines(merged)
+                file.truncate()
+        return True
+    
+    @staticmethod
+    def _parse_chunk(lines: List[str], token: Optional[str], address_columns: List[int],
+                     since_text: Optional[str] = None, until_text: Optional[str] = None) -> List[List[str]]:
+        """解析一块CSV行并按时间范围和代币地址过滤"""
+        rows = [row for row in csv.reader(lines) if row and _in_range(row, since_text, until_text)]
+        if token is not None:
+            rows = [row for row in rows if any(i < len(row) and row[i] == token for i in address_columns)]
+        return rows
+    
+    def flush(self):
+        """立即写出所有缓冲记录"""
+        for writer in self._writers.values():
+            writer.flush()
+    
+    def close(self):
+        """写出剩余记录"""
+        for writer in self._writers.values():
+            writer.close()
+
+
+class SqliteHistoryStore:
+    """
+    SQLite历史后端
+    
+    价格以 REAL 数值存储，时间戳为 Unix 秒；price_history 以 (token_address, ts) 为主键，
+    按代币查询时间区间直接走索引，无需重新解析文本。CSV仅作为导出格式
+    """
+    
+    name = 'sqlite'
+    
+    def __init__(self, path: str = "price_history.db", flush_rows: int = 100, flush_interval: float = 5.0):
+        self.path = path
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        # WAL模式下多个进程可以同时读，写入以事务为单位原子提交
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS price_history (
+                ts REAL NOT NULL,
+                token_address TEXT NOT NULL,
+                token_name TEXT,
+                token_symbol TEXT,
+                sol_price REAL,
+                token_price REAL NOT NULL,
+                sol_to_token REAL,
+                token_to_sol REAL,
+                source TEXT,
+                note TEXT,
+                spread REAL,
+                PRIMARY KEY (token_address, ts)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_price_history_ts ON price_history (ts)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS comparison_history (
+                ts REAL NOT NULL,
+                sol_token_address TEXT NOT NULL,
+                sol_token_name TEXT,
+                sol_token_symbol TEXT,
+                sol_token_price REAL,
+                eth_token_address TEXT NOT NULL,
+                eth_token_name TEXT,
+                eth_token_symbol TEXT,
+                eth_token_price REAL,
+                sol_to_eth_ratio REAL,
+                eth_to_sol_ratio REAL,
+                sol_source TEXT,
+                eth_source TEXT,
+                note TEXT,
+                sol_spread REAL,
+                eth_spread REAL,
+                PRIMARY KEY (sol_token_address, eth_token_address, ts)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_comparison_history_ts ON comparison_history (ts)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_comparison_history_eth "
+                           "ON comparison_history (eth_token_address, ts)")
+        
+        self.tables = {'prices': 'price_history', 'comparisons': 'comparison_history'}
+        for kind, table in self.tables.items():
+            self._add_missing_columns(kind, table)
+        self._writers = {
+            kind: BufferedSqliteWriter(self, table, KINDS[kind][0], flush_rows, flush_interval)
+            for kind, table in self.tables.items()
+        }
+    
+    def _add_missing_columns(self, kind: str, table: str):
+        """为旧版本创建的表补充新增的列（新增列都是可为空的数值列）"""
+        existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+        for field in KINDS[kind][0]:
+            if field not in existing:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {field} REAL")
+    
+    @contextmanager
+    def transaction(self):
+        """显式事务（BEGIN IMMEDIATE ... COMMIT/ROLLBACK），保证批量写入原子性"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+    
+    def location(self, kind: str) -> str:
+        """某类记录的存储位置"""
+        return f"{self.path} ({self.tables[kind]})"
+    
+    def append(self, kind: str, records: Sequence[Dict]):
+        """追加记录（经缓冲区批量写入）"""
+        self._writers[kind].write_rows(list(records))
+    
+    def query(self, kind: str, where: str = "", params: Sequence = (), order: str = "ts DESC",
+              limit: Optional[int] = None) -> List[Dict]:
+        """按条件查询记录，返回 {字段: 值} 字典列表"""
+        self._writers[kind].flush()
+        fields = KINDS[kind][0]
+        sql = f"SELECT {', '.join(fields)} FROM {self.tables[kind]}"
+        if where:
+            sql += f" WHERE {where}"
+        sql += f" ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = tuple(params) + (limit,)
+        with self._lock:
+            rows = self._conn.execute(sql, tuple(params)).fetchall()
+        return [dict(zip(fields, row)) for row in rows]
+    
+    def tail(self, kind: str, limit: int, token: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None) -> Optional[Tuple[List[str], List[List[str]]]]:
+        """返回 (表头, 最近 limit 行)，行已按CSV格式化；过滤条件走 (代币地址, 时间戳) / 时间戳索引"""
+        where, params = self._filters(kind, token, since, until)
+        records = self.query(kind, where, params, limit=max(0, limit))
+        return KINDS[kind][1], [format_csv_row(kind, record) for record in reversed(records)]
+    
+    @staticmethod
+    def _filters(kind: str, token: Optional[str], since: Optional[float],
+                 until: Optional[float]) -> Tuple[str, List]:
+        """生成代币地址 / 时间区间过滤的 WHERE 子句和参数"""
+        conditions, params = [], []
+        if token is not None:
+            conditions.append(" OR ".join(f"{KINDS[kind][0][i]} = ?" for i in _address_columns(kind)))
+            params.extend(token for _ in _address_columns(kind))
+        if since is not None:
+            conditions.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("ts <= ?")
+            params.append(until)
+        return " AND ".join(f"({condition})" for condition in conditions), params
+    
+    def iter_chunks(self, kind: str, token: Optional[str] = None, since: Optional[float] = None,
+                    until: Optional[float] = None, chunk_size: int = 100000) -> Iterator[List[tuple]]:
+        """
+        按时间顺序分块读取记录，每块为按 KINDS 字段顺序排列的元组列表
+        
+        使用独立的只读连接（WAL模式下不阻塞写入），内存占用只与 chunk_size 有关
+        """
+        self._writers[kind].flush()
+        where, params = self._filters(kind, token, since, until)
+        sql = f"SELECT {', '.join(KINDS[kind][0])} FROM {self.tables[kind]}"
+        if where:
+            sql += f" WHERE {where}"
+        sql += " ORDER BY ts ASC"
+        
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+    
+    def export_csv(self, kind: str, path: str) -> int:
+        """把某类记录按时间顺序导出为CSV（与CSV后端格式相同），返回导出的行数"""
+        fields = KINDS[kind][0]
+        count = 0
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(KINDS[kind][1])
+            for rows in self.iter_chunks(kind):
+                writer.writerows(format_csv_row(kind, dict(zip(fields, row))) for row in rows)
+                count += len(rows)
+        return count
+    
+    def import_csv(self, kind: str, path: str, chunk_size: int = 10000) -> int:
+        """
+        导入CSV后端写出的历史文件（用于迁移已有数据），返回导入的行数
+        
+        逐行读取，每 chunk_size 行在一个事务中写入并提交，内存占用与文件大小无关
+        """
+        fields, _, formats = KINDS[kind]
+        writer = self._writers[kind]
+        count = 0
+        records = []
+        with open(path, 'r', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            next(reader, None)  # 跳过表头
+            for row in reader:
+                if len(row) < 2:
+                    continue
+                # 旧版本写出的行没有后来新增的列
+                record = dict(zip(fields, row + [''] * (len(fields) - len(row))))
+                try:
+                    record['ts'] = parse_timestamp(record['ts'])
+                    for field in formats:
+                        record[field] = float(record[field]) if record[field] else None
+                except ValueError:
+                    continue
+                records.append(record)
+                if len(records) >= chunk_size:
+                    writer.write_rows(records)
+                    writer.flush()
+                    count += len(records)
+                    records = []
+        
+        writer.write_rows(records)
+        writer.flush()
+        return count + len(records)
+    
+    def sort_by_time(self, kind: str) -> bool:
+        """SQLite按时间戳索引查询，记录的写入顺序无关紧要"""
+        return False
+    
+    def flush(self):
+        """立即写出所有缓冲记录"""
+        for writer in self._writers.values():
+            writer.flush()
+    
+    def close(self):
+        """写出剩余记录并关闭数据库连接"""
+        for writer in self._writers.values():
+            writer.close()
+        with self._lock:
+            self._conn.close()
+
+
+class NullHistoryStore:
+    """不记录历史的后端：丢弃所有记录，查询返回空结果（用于回填工作进程等只需要获取价格的场景）"""
+    
+    name = 'none'
+    
+    def location(self, kind: str) -> str:
+        return '(不记录历史)'
+    
+    def append(self, kind: str, records: Sequence[Dict]):
+        pass
+    
+    def tail(self, kind: str, limit: int, token: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None) -> Optional[Tuple[List[str], List[List[str]]]]:
+        return None
+    
+    def iter_chunks(self, kind: str, token: Optional[str] = None, since: Optional[float] = None,
+                    until: Optional[float] = None, chunk_size: int = 100000) -> Iterator[List[List[str]]]:
+        return iter(())
+    
+    def sort_by_time(self, kind: str) -> bool:
+        return False
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        pass
+
+
+HISTORY_BACKENDS = ('csv', 'sqlite', 'none')
+
+
+def open_history_store(backend: str = 'csv', price_path: str = "token_price_history.csv",
+                       comparison_path: str = "token_price_comparison.csv",
+                       db_path: str = "price_history.db", flush_rows: int = 100,
+                       flush_interval: float = 5.0):
+    """按名称创建历史存储后端"""
+    backend = (backend or 'csv').strip().lower()
+    if backend == 'csv':
+        return CsvHistoryStore(price_path, comparison_path, flush_rows, flush_interval)
+    if backend == 'sqlite':
+        return SqliteHistoryStore(db_path, flush_rows, flush_interval)
+    if backend == 'none':
+        return NullHistoryStore()
+    raise ValueError(f"不支持的历史存储后端: {backend}（可选：{', '.join(HISTORY_BACKENDS)}）")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+HTTP连接池 - 每个API源一个长连接会话
+复用TCP+TLS连接（keep-alive），在连接层重试建连失败，并提供5xx重试的退避时间，
+并统计每个API源的请求数、重试数、新建连接数，便于观察连接复用节省的握手开销
+"""
+
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# 429 不自动重试：服务商要求降速时立即重试只会加重限流，改为按 Retry-After 推迟该源的令牌桶，
+# 并计入健康度（连续失败会触发熔断）
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpSessionPool:
+    """按API源划分的 requests.Session 连接池"""
+    
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 10,
+                 max_retries: int = 3, backoff_factor: float = 0.5,
+                 respect_retry_after: bool = False):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.respect_retry_after = respect_retry_after
+        
+        self._sessions: Dict[str, requests.Session] = {}
+        self._adapters: Dict[str, HTTPAdapter] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+    
+    def _create_session(self, source: str) -> requests.Session:
+        """创建带连接池和重试策略的会话"""
+        # 只在这里重试连接失败（请求没有到达服务商）；5xx由调用方逐次重试，
+        # 每次重试前重新获取限流令牌，保证发出的请求数不超过API源的限额；读取超时不重试
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=self.backoff_factor,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False  # 返回最后一个响应，由调用方 raise_for_status
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize,
+                              max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        self._adapters[source] = adapter
+        return session
+    
+    def session_for(self, source: str) -> requests.Session:
+        """获取某个API源的会话（首次使用时创建）"""
+        session = self._sessions.get(source)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(source)
+                if session is None:
+                    session = self._create_session(source)
+                    self._sessions[source] = session
+                    self._stats[source] = {'requests': 0, 'retries': 0, 'errors': 0, 'total_time': 0.0}
+        return session
+    
+    def get(self, source: str, url: str, headers: Optional[dict] = None,
+            timeout: float = 10, stream: bool = False) -> requests.Response:
+        """通过指定API源的会话发送GET请求（stream=True 时响应体按需读取，调用方负责关闭响应）"""
+        session = self.session_for(source)
+        start = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers or {}, timeout=timeout, stream=stream)
+        except Exception:
+            self._record(source, time.perf_counter() - start, retries=0, error=True)
+            raise
+        
+        retries = getattr(response.raw, 'retries', None)
+        retry_count = len(retries.history) if retries is not None else 0
+        self._record(source, time.perf_counter() - start, retries=retry_count,
+                     error=response.status_code >= 400)
+        return response
+    
+    def retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """第 attempt 次重试前的等待时间：指数退避，respect_retry_after 时取与 Retry-After 的较大值"""
+        delay = self.backoff_factor * (2 ** attempt)
+        if self.respect_retry_after:
+            delay = max(delay, retry_after_seconds(retry_after) or 0.0)
+        return delay
+    
+    def record_retry(self, source: str):
+        """记录一次由调用方发起的重试"""
+        self.session_for(source)
+        with self._lock:
+            self._stats[source]['retries'] += 1
+    
+    def _record(self, source: str, elapsed: float, retries: int, error: bool):
+        """记录一次请求的统计信息"""
+        with self._lock:
+            stats = self._stats[source]
+            stats['requests'] += 1
+            stats['retries'] += retries
+            stats['errors'] += 1 if error else 0
+            stats['total_time'] += elapsed
+    
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        返回每个API源的连接池与重试统计
+        
+        connections 为实际建立的TCP连接数，reused 为复用已有连接完成的请求数
+        （每次复用即省下一次TCP+TLS握手）
+        """
+        result = {}
+        with self._lock:
+            for source, stats in self._stats.items():
+                connections = 0
+                pool_requests = 0
+                adapter = self._adapters.get(source)
+                if adapter is not None:
+                    pools = adapter.poolmanager.pools
+                    for key in pools.keys():
+                        pool = pools.get(key)
+                        if pool is not None:
+                            connections += pool.num_connections
+                            pool_requests += pool.num_requests
+                
+                requests_made = stats['requests']
+                result[source] = {
+                    'requests': requests_made,
+                    'retries': stats['retries'],
+                    'errors': stats['errors'],
+                    'connections': connections,
+                    'reused': max(0, pool_requests - connections),
+                    'avg_latency_ms': (stats['total_time'] / requests_made * 1000) if requests_made else 0.0
+                }
+        return result
+    
+    def close(self):
+        """关闭所有会话及其连接"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._adapters.clear()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+运行指标 - 计数器和耗时直方图，按Prometheus文本格式导出
+记录每个API源的请求耗时、状态码和失败原因，缓存命中率，
+每个获取方法的耗时和结果，以及顺序回退时尝试的API源数量（回退深度）。
+指标可以通过本地HTTP端点（/metrics）提供给Prometheus抓取，也可以定期写入文件
+"""
+
+import asyncio
+import atexit
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# 默认耗时分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 回退深度分桶（尝试的API源数量）
+DEPTH_BUCKETS = (1, 2, 3, 4, 5)
+# 查询服务响应耗时分桶（秒），热点报价应在亚毫秒级
+SERVER_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.25, 1.0, 5.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    """生成 {a="x",b="y"} 形式的标签字符串"""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """按标签组合累加的计数器"""
+    
+    kind = 'counter'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+    
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in items]
+
+
+class Histogram:
+    """按标签组合统计分布的直方图（累计分桶 + 总和 + 次数）"""
+    
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List[float]] = {}  # [各分桶计数..., 总和, 次数]
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = [0] * len(self.buckets) + [0.0, 0]
+                self._values[labels] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+    
+    def summary(self, *labels: str) -> Tuple[float, int]:
+        """返回 (总和, 次数)"""
+        with self._lock:
+            state = self._values.get(labels)
+            return (state[-2], state[-1]) if state else (0.0, 0)
+    
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        lines = []
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表：统一渲染为Prometheus文本格式，并提供HTTP端点和文件导出"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._dump_timer: Optional[threading.Timer] = None
+    
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics[name] = metric
+        return metric
+    
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics[name] = metric
+        return metric
+    
+    def render(self) -> str:
+        """渲染所有指标（Prometheus文本格式 0.0.4）"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+    
+    def write(self, path: str):
+        """把当前指标原子地写入文件（可配合 node_exporter 的 textfile 采集器）"""
+        temp_path = f"{path}.tmp"
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(self.render())
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning("⚠️ 写入指标文件失败 %s: %s", path, e)
+    
+    def dump_to_file(self, path: str, interval: float = 60):
+        """每隔 interval 秒把指标写入文件，进程退出时再写一次"""
+        def tick():
+            self.write(path)
+            self._dump_timer = threading.Timer(interval, tick)
+            self._dump_timer.daemon = True
+            self._dump_timer.start()
+        
+        atexit.register(self.write, path)
+        if interval > 0:
+            self._dump_timer = threading.Timer(interval, tick)
+            self._dump_timer.daemon = True
+            self._dump_timer.start()
+    
+    def serve(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """在后台线程启动 /metrics HTTP端点"""
+        registry = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                logger.debug("metrics %s - %s", self.address_string(), format % args)
+        
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        logger.info("📈 指标端点已启动: http://%s:%d/metrics", host, self._server.server_address[1])
+        return self._server
+    
+    def close(self):
+        """停止HTTP端点和定时导出"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._dump_timer is not None:
+            self._dump_timer.cancel()
+            self._dump_timer = None
+
+
+class TrackerMetrics(MetricsRegistry):
+    """价格追踪器使用的指标集合"""
+    
+    def __init__(self):
+        super().__init__()
+        self.request_seconds = self.histogram(
+            'price_tracker_request_seconds', 'HTTP请求耗时（含重试）', ('source',))
+        self.requests = self.counter(
+            'price_tracker_requests_total', 'HTTP请求次数（按状态码）', ('source', 'status'))
+        self.request_failures = self.counter(
+            'price_tracker_request_failures_total', 'HTTP请求失败次数（按原因）', ('source', 'reason'))
+        self.cache_lookups = self.counter(
+            'price_tracker_cache_lookups_total', '缓存查询次数（memory/persistent命中、stale返回旧值或miss）', ('result',))
+        self.cache_writes = self.counter(
+            'price_tracker_cache_writes_total', '缓存写入次数')
+        self.cache_coalesced = self.counter(
+            'price_tracker_cache_coalesced_total', '合并到进行中请求的缓存未命中次数')
+        self.cache_refreshes = self.counter(
+            'price_tracker_cache_refreshes_total', '过期缓存的后台刷新次数（ok/failed）', ('result',))
+        self.cache_revalidations = self.counter(
+            'price_tracker_cache_revalidations_total', '条件请求重新验证结果（not_modified/modified）', ('result',))
+        self.fetch_seconds = self.histogram(
+            'price_tracker_fetch_seconds', '获取方法耗时', ('source', 'kind'))
+        self.fetches = self.counter(
+            'price_tracker_fetches_total', '获取方法调用次数（ok/empty/error/cancelled）', ('source', 'kind', 'result'))
+        self.fallback_depth = self.histogram(
+            'price_tracker_fallback_depth', '顺序回退时尝试的API源数量', ('kind',), buckets=DEPTH_BUCKETS)
+        self.server_seconds = self.histogram(
+            'price_tracker_server_seconds', '查询服务处理请求耗时', ('endpoint',), buckets=SERVER_BUCKETS)
+        self.server_requests = self.counter(
+            'price_tracker_server_requests_total', '查询服务请求次数（hot/loaded/not_found/bad_request/error）',
+            ('endpoint', 'result'))
+        self.alerts = self.counter(
+            'price_tracker_alerts_total', '告警次数（fired/suppressed冷却期内抑制/failed投递失败）', ('rule', 'result'))
+    
+    def observe_request(self, source: str, elapsed: float, status: Optional[int] = None,
+                        reason: Optional[str] = None):
+        """记录一次HTTP请求；status 为None表示没有收到响应（reason 说明原因）"""
+        self.request_seconds.observe(elapsed, source)
+        self.requests.inc(source, str(status) if status is not None else 'none')
+        if reason is None and status is not None and status >= 400:
+            reason = 'http_429' if status == 429 else f'http_{status // 100}xx'
+        if reason:
+            self.request_failures.inc(source, reason)
+    
+    def observe_failure(self, source: str, reason: str):
+        """记录一次没有对应完整请求的失败（熔断、限流跳过的请求，响应解析失败）"""
+        self.request_failures.inc(source, reason)
+    
+    def observe_cache(self, result: str):
+        self.cache_lookups.inc(result)
+    
+    def observe_fetch(self, source: str, kind: str, elapsed: float, result: str):
+        self.fetch_seconds.observe(elapsed, source, kind)
+        self.fetches.inc(source, kind, result)
+    
+    def observe_server(self, endpoint: str, elapsed: float, result: str):
+        self.server_seconds.observe(elapsed, endpoint)
+        self.server_requests.inc(endpoint, result)
+    
+    def cache_hit_ratio(self) -> Optional[float]:
+        """缓存命中率（内存、持久化缓存命中或返回旧值 / 全部查询）"""
+        hits = sum(self.cache_lookups.value(result) for result in ('memory', 'persistent', 'stale'))
+        total = hits + self.cache_lookups.value('miss')
+        return hits / total if total else None
+
+
+def failure_reason(error: Exception) -> str:
+    """把请求异常归类为失败原因标签"""
+    name = type(error).__name__.lower()
+    if 'timeout' in name:
+        return 'timeout'
+    if 'connect' in name or 'connection' in name:
+        return 'connection'
+    if isinstance(error, ValueError):
+        return 'invalid_json'
+    return 'error'
+
+
+def instrument_fetch(source: str, kind: str):
+    """
+    获取方法装饰器：记录耗时和结果（有数据为ok，返回空为empty，抛出异常为error）
+    
+    同时支持普通方法和协程方法，异步版本被取消时记为cancelled
+    """
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(self, *args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = await fn(self, *args, **kwargs)
+                except asyncio.CancelledError:
+                    self.metrics.observe_fetch(source, kind, time.perf_counter() - start, 'cancelled')
+                    raise
+                except Exception:
+                    self.metrics.observe_fetch(source, kind, time.perf_counter() - start, 'error')
+                    raise
+                self.metrics.observe_fetch(source, kind, time.perf_counter() - start, 'ok' if result else 'empty')
+                return result
+            return async_wrapper
+        
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = fn(self, *args, **kwargs)
+            except Exception:
+                self.metrics.observe_fetch(source, kind, time.perf_counter() - start, 'error')
+                raise
+            self.metrics.observe_fetch(source, kind, time.perf_counter() - start, 'ok' if result else 'empty')
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+价格历史分析 - 基于NumPy的向量化计算
+通过历史存储的分块读取接口把记录流式载入数组（不会一次性把整个文件读成Python对象），
+然后向量化计算每个代币的OHLC K线、收益率、滚动波动率、SOL/代币比值以及跨链比值序列
+"""
+
+import csv
+import datetime
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from history_store import format_timestamp
+
+
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_interval(text: str) -> float:
+    """解析K线周期，如 "15m"、"1h"、"1d"，返回秒数"""
+    text = str(text).strip().lower()
+    if text and text[-1] in INTERVAL_UNITS:
+        value = float(text[:-1])
+        unit = INTERVAL_UNITS[text[-1]]
+    else:
+        value, unit = float(text), 1
+    if value <= 0:
+        raise ValueError(f"周期必须大于0: {text}")
+    return value * unit
+
+
+def _to_float(column) -> np.ndarray:
+    """把一列字符串或数值转为float64数组（空值为NaN）"""
+    try:
+        return np.asarray(column, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([float(value) if value not in (None, '') else math.nan for value in column],
+                        dtype=np.float64)
+
+
+def _to_epoch(column) -> np.ndarray:
+    """
+    把时间戳列转为Unix秒数组
+    
+    SQLite后端本身存储Unix秒；CSV后端存储本地时间字符串，先由NumPy批量解析为
+    不带时区的秒数，再按日期逐日减去本地时区偏移（每个日期只计算一次偏移）
+    """
+    if len(column) == 0:
+        return np.empty(0, dtype=np.float64)
+    if not isinstance(column[0], str):
+        return np.asarray(column, dtype=np.float64)
+    
+    naive = np.asarray(column, dtype='datetime64[s]').astype(np.int64)
+    days, inverse = np.unique(naive // 86400, return_inverse=True)
+    offsets = np.empty(len(days), dtype=np.int64)
+    for i, day in enumerate(days):
+        noon = datetime.datetime(1970, 1, 1) + datetime.timedelta(days=int(day), hours=12)
+        offsets[i] = int(noon.timestamp()) - (int(day) * 86400 + 43200)
+    return (naive + offsets[inverse]).astype(np.float64)
+
+
+def _encode(column, index: Dict[str, int], names: List[str]) -> np.ndarray:
+    """把一列字符串编码为整数ID（跨分块共享同一个编码表）"""
+    values, inverse = np.unique(np.asarray(column, dtype=object).astype(str), return_inverse=True)
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values.tolist()):
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(names)
+            names.append(str(value))
+        codes[i] = code
+    return codes[inverse.reshape(-1)]
+
+
+class PriceHistory:
+    """价格历史数组：每条记录一个元素，按时间排序"""
+    
+    def __init__(self, ts: np.ndarray, token_ids: np.ndarray, tokens: List[str],
+                 symbols: Dict[str, str], sol_price: np.ndarray, token_price: np.ndarray):
+        self.ts = ts
+        self.token_ids = token_ids
+        self.tokens = tokens
+        self.symbols = symbols
+        self.sol_price = sol_price
+        self.token_price = token_price
+    
+    def __len__(self) -> int:
+        return len(self.ts)
+    
+    @property
+    def sol_to_token(self) -> np.ndarray:
+        """SOL/代币比值序列（1 SOL 可兑换的代币数量）"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.sol_price / self.token_price
+    
+    def groups(self) -> Dict[str, np.ndarray]:
+        """按代币分组，返回 {代币地址: 记录下标数组}（组内保持时间顺序）"""
+        order = np.argsort(self.token_ids, kind='stable')
+        ids = self.token_ids[order]
+        boundaries = np.flatnonzero(np.diff(ids)) + 1
+        return {self.tokens[self.token_ids[part[0]]]: part for part in np.split(order, boundaries) if len(part)}
+
+
+class ComparisonHistory:
+    """比值计算历史数组：每条记录一个元素，按时间排序"""
+    
+    def __init__(self, ts: np.ndarray, pair_ids: np.ndarray, pairs: List[Tuple[str, str]],
+                 symbols: Dict[Tuple[str, str], str], sol_token_price: np.ndarray,
+                 eth_token_price: np.ndarray):
+        self.ts = ts
+        self.pair_ids = pair_ids
+        self.pairs = pairs
+        self.symbols = symbols
+        self.sol_token_price = sol_token_price
+        self.eth_token_price = eth_token_price
+    
+    def __len__(self) -> int:
+        return len(self.ts)
+    
+    @property
+    def ratio(self) -> np.ndarray:
+        """跨链比值序列（SOL代币价格 / ETH代币价格）"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.sol_token_price / self.eth_token_price
+    
+    def groups(self) -> Dict[Tuple[str, str], np.ndarray]:
+        """按代币对分组，返回 {(SOL代币地址, ETH代币地址): 记录下标数组}"""
+        order = np.argsort(self.pair_ids, kind='stable')
+        ids = self.pair_ids[order]
+        boundaries = np.flatnonzero(np.diff(ids)) + 1
+        return {self.pairs[self.pair_ids[part[0]]]: part for part in np.split(order, boundaries) if len(part)}
+
+
+def _sorted_by_time(ts: np.ndarray, *columns: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """按时间排序（多个进程追加的文件可能有少量乱序）"""
+    if len(ts) < 2 or np.all(ts[1:] >= ts[:-1]):
+        return (ts,) + columns
+    order = np.argsort(ts, kind='stable')
+    return (ts[order],) + tuple(column[order] for column in columns)
+
+
+def load_price_history(store, token: Optional[str] = None, since: Optional[float] = None,
+                       until: Optional[float] = None, chunk_size: int = 100000) -> PriceHistory:
+    """从历史存储（CSV或SQLite）流式载入价格历史"""
+    index: Dict[str, int] = {}
+    tokens: List[str] = []
+    symbols: Dict[str, str] = {}
+    parts = {'ts': [], 'token_ids': [], 'sol_price': [], 'token_price': []}
+    
+    for rows in store.iter_chunks('prices', token=token, since=since, until=until, chunk_size=chunk_size):
+        if not rows:
+            continue
+        columns = [[row[i] for row in rows] for i in (0, 1, 3, 4, 5)]
+        parts['ts'].append(_to_epoch(columns[0]))
+        parts['token_ids'].append(_encode(columns[1], index, tokens))
+        parts['sol_price'].append(_to_float(columns[3]))
+        parts['token_price'].append(_to_float(columns[4]))
+        symbols.update(zip(columns[1], columns[2]))
+    
+    arrays = {name: np.concatenate(chunks) if chunks else np.empty(0) for name, chunks in parts.items()}
+    ts, token_ids, sol_price, token_price = _sorted_by_time(
+        arrays['ts'], arrays['token_ids'].astype(np.int32), arrays['sol_price'], arrays['token_price'])
+    return PriceHistory(ts, token_ids, tokens, symbols, sol_price, token_price)
+
+
+def load_comparison_history(store, token: Optional[str] = None, since: Optional[float] = None,
+                            until: Optional[float] = None, chunk_size: int = 100000) -> ComparisonHistory:
+    """从历史存储（CSV或SQLite）流式载入比值计算历史"""
+    index: Dict[str, int] = {}
+    keys: List[str] = []
+    symbols: Dict[Tuple[str, str], str] = {}
+    parts = {'ts': [], 'pair_ids': [], 'sol_token_price': [], 'eth_token_price': []}
+    
+    for rows in store.iter_chunks('comparisons', token=token, since=since, until=until, chunk_size=chunk_size):
+        if not rows:
+            continue
+        columns = list(zip(*rows))
+        pair_keys = [f"{sol}|{eth}" for sol, eth in zip(columns[1], columns[5])]
+        parts['ts'].append(_to_epoch(columns[0]))
+        parts['pair_ids'].append(_encode(pair_keys, index, keys))
+        parts['sol_token_price'].append(_to_float(columns[4]))
+        parts['eth_token_price'].append(_to_float(columns[8]))
+        for sol, eth, sol_symbol, eth_symbol in zip(columns[1], columns[5], columns[3], columns[7]):
+            symbols[(sol, eth)] = f"{sol_symbol}/{eth_symbol}"
+    
+    arrays = {name: np.concatenate(chunks) if chunks else np.empty(0) for name, chunks in parts.items()}
+    ts, pair_ids, sol_token_price, eth_token_price = _sorted_by_time(
+        arrays['ts'], arrays['pair_ids'].astype(np.int32), arrays['sol_token_price'], arrays['eth_token_price'])
+    pairs = [tuple(key.split('|', 1)) for key in keys]
+    return ComparisonHistory(ts, pair_ids, pairs, symbols, sol_token_price, eth_token_price)
+
+
+def resample_ohlc(ts: np.ndarray, values: np.ndarray, interval: float) -> Dict[str, np.ndarray]:
+    """
+    把按时间排序的价格序列重采样为OHLC K线
+    
+    返回 {'ts': 周期起始时间, 'open', 'high', 'low', 'close', 'count'}，没有记录的周期不输出
+    """
+    valid = np.isfinite(values)
+    ts, values = ts[valid], values[valid]
+    if len(ts) == 0:
+        empty = np.empty(0)
+        return {'ts': empty, 'open': empty, 'high': empty, 'low': empty, 'close': empty,
+                'count': np.empty(0, dtype=np.int64)}
+    
+    buckets = np.floor(ts / interval).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(values)]
+    return {
+        'ts': buckets[starts] * interval,
+        'open': values[starts],
+        'high': np.maximum.reduceat(values, starts),
+        'low': np.minimum.reduceat(values, starts),
+        'close': values[ends - 1],
+        'count': ends - starts
+    }
+
+
+def simple_returns(values: np.ndarray) -> np.ndarray:
+    """简单收益率 p[t] / p[t-1] - 1（长度比输入少1）"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return values[1:] / values[:-1] - 1.0
+
+
+def log_returns(values: np.ndarray) -> np.ndarray:
+    """对数收益率 ln(p[t] / p[t-1])（长度比输入少1）"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.diff(np.log(values))
+
+
+def rolling_volatility(returns: np.ndarray, window: int) -> np.ndarray:
+    """
+    滚动波动率（窗口内收益率的样本标准差），前 window-1 个位置为NaN
+    
+    用累加和计算每个窗口的均值和方差，整体复杂度 O(n)，与窗口大小无关
+    """
+    n = len(returns)
+    result = np.full(n, np.nan)
+    if window < 2 or n < window:
+        return result
+    values = np.nan_to_num(returns.astype(np.float64))
+    # 先减去均值再累加，减少大数相消带来的精度损失
+    values = values - values.mean()
+    cumsum = np.concatenate(([0.0], np.cumsum(values)))
+    cumsum_sq = np.concatenate(([0.0], np.cumsum(values * values)))
+    window_sum = cumsum[window:] - cumsum[:-window]
+    window_sum_sq = cumsum_sq[window:] - cumsum_sq[:-window]
+    variance = (window_sum_sq - window_sum * window_sum / window) / (window - 1)
+    result[window - 1:] = np.sqrt(np.maximum(variance, 0.0))
+    return result
+
+
+def annualize(volatility: np.ndarray, interval: float) -> np.ndarray:
+    """把每周期波动率按 sqrt(一年的周期数) 折算为年化波动率"""
+    return volatility * math.sqrt(365 * 86400 / interval)
+
+
+def analyze_series(ts: np.ndarray, values: np.ndarray, interval: float, window: int) -> Dict:
+    """对一条价格（或比值）序列做K线重采样，并基于收盘价计算收益率和滚动波动率"""
+    candles = resample_ohlc(ts, values, interval)
+    closes = candles['close']
+    returns = log_returns(closes)
+    volatility = rolling_volatility(returns, window)
+    latest_volatility = volatility[-1] if len(volatility) else math.nan
+    return {
+        'candles': candles,
+        'returns': returns,
+        'volatility': volatility,
+        'records': int(np.isfinite(values).sum()),
+        'first': closes[0] if len(closes) else math.nan,
+        'last': closes[-1] if len(closes) else math.nan,
+        'high': candles['high'].max() if len(closes) else math.nan,
+        'low': candles['low'].min() if len(closes) else math.nan,
+        'change': closes[-1] / closes[0] - 1.0 if len(closes) and closes[0] else math.nan,
+        'volatility_latest': latest_volatility,
+        'volatility_annualized': annualize(np.array([latest_volatility]), interval)[0],
+    }
+
+
+def analyze_prices(history: PriceHistory, interval: float, window: int) -> Dict[str, Dict]:
+    """对每个代币分析价格序列和SOL/代币比值序列，返回 {代币地址: 分析结果}"""
+    sol_to_token = history.sol_to_token
+    results = {}
+    for token_address, rows in history.groups().items():
+        result = analyze_series(history.ts[rows], history.token_price[rows], interval, window)
+        result['symbol'] = history.symbols.get(token_address, token_address[:8])
+        result['sol_ratio'] = analyze_series(history.ts[rows], sol_to_token[rows], interval, window)
+        results[token_address] = result
+    return results
+
+
+def analyze_comparisons(history: ComparisonHistory, interval: float, window: int) -> Dict[Tuple[str, str], Dict]:
+    """对每个SOL/ETH代币对分析跨链比值序列，返回 {(SOL代币地址, ETH代币地址): 分析结果}"""
+    ratio = history.ratio
+    results = {}
+    for pair, rows in history.groups().items():
+        result = analyze_series(history.ts[rows], ratio[rows], interval, window)
+        result['symbol'] = history.symbols.get(pair, f"{pair[0][:6]}/{pair[1][:8]}")
+        results[pair] = result
+    return results
+
+
+def write_candles_csv(path: str, price_results: Dict[str, Dict],
+                      comparison_results: Optional[Dict[Tuple[str, str], Dict]] = None) -> int:
+    """把K线写入CSV（价格K线和跨链比值K线），返回写入的行数"""
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['周期开始', '序列', '代币', '开盘', '最高', '最低', '收盘', '记录数'])
+        series = [(address, 'price', result) for address, result in price_results.items()]
+        series += [(address, 'sol_ratio', result['sol_ratio']) for address, result in price_results.items()]
+        series += [('/'.join(pair), 'cross_chain_ratio', result)
+                   for pair, result in (comparison_results or {}).items()]
+        for name, kind, result in series:
+            candles = result['candles']
+            for i in range(len(candles['ts'])):
+                writer.writerow([
+                    format_timestamp(candles['ts'][i]), kind, name,
+                    f"{candles['open'][i]:.8f}", f"{candles['high'][i]:.8f}",
+                    f"{candles['low'][i]:.8f}", f"{candles['close'][i]:.8f}", int(candles['count'][i])
+                ])
+                count += 1
+    return count
+
+
+def print_analytics_report(store, interval: str = '1h', window: int = 24, token: Optional[str] = None,
+                           since: Optional[float] = None, until: Optional[float] = None,
+                           output: Optional[str] = None):
+    """载入历史记录并打印每个代币和代币对的K线统计、收益率和波动率"""
+    seconds = parse_interval(interval)
+    start = time.perf_counter()
+    prices = load_price_history(store, token=token, since=since, until=until)
+    comparisons = load_comparison_history(store, token=token, since=since, until=until)
+    loaded = time.perf_counter() - start
+    
+    price_results = analyze_prices(prices, seconds, window)
+    comparison_results = analyze_comparisons(comparisons, seconds, window)
+    elapsed = time.perf_counter() - start
+    
+    print(f"\n📈 价格历史分析（K线周期 {interval}，波动率窗口 {window} 根K线）")
+    print(f"⏱️ 载入 {len(prices) + len(comparisons):,} 条记录 {loaded:.2f}s，分析共 {elapsed:.2f}s")
+    if not price_results and not comparison_results:
+        print("📝 没有符合条件的历史记录")
+        return
+    
+    if price_results:
+        print("="*120)
+        print(f"{'代币':<12}{'记录数':>10}{'K线数':>8}{'最新价格':>16}{'区间涨跌':>10}"
+              f"{'最高':>16}{'最低':>16}{'周期波动率':>12}{'年化波动率':>12}{'1 SOL兑换':>16}")
+        print("-"*120)
+        for result in price_results.values():
+            print(f"{result['symbol'][:11]:<12}{result['records']:>10,}{len(result['candles']['ts']):>8}"
+                  f"{result['last']:>16.8f}{result['change']:>10.2%}{result['high']:>16.8f}{result['low']:>16.8f}"
+                  f"{result['volatility_latest']:>12.4%}{result['volatility_annualized']:>12.2%}"
+                  f"{result['sol_ratio']['last']:>16.4f}")
+    
+    if comparison_results:
+        print("="*120)
+        print(f"{'代币对':<24}{'记录数':>10}{'K线数':>8}{'最新比值':>16}{'区间变化':>10}"
+              f"{'最高':>16}{'最低':>16}{'周期波动率':>12}{'年化波动率':>12}")
+        print("-"*120)
+        for result in comparison_results.values():
+            print(f"{result['symbol'][:23]:<24}{result['records']:>10,}{len(result['candles']['ts']):>8}"
+                  f"{result['last']:>16.8f}{result['change']:>10.2%}{result['high']:>16.8f}{result['low']:>16.8f}"
+                  f"{result['volatility_latest']:>12.4%}{result['volatility_annualized']:>12.2%}")
+    print("="*120)
+    
+    if output:
+        rows = write_candles_csv(output, price_results, comparison_results)
+        print(f"💾 {rows} 根K线已保存到 {output}")
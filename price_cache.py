@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+持久化缓存 - 基于SQLite的本地缓存后端
+为追踪器的 _set_cache / _get_cache 提供跨进程重启的缓存：
+每个键独立TTL、按总大小限制的LRU淘汰（读取时的访问时间先记在内存中批量写入）、事务保证的原子写入，
+并保存ETag / Last-Modified 以便对支持的API做条件请求重新验证
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class PersistentCache:
+    """基于SQLite的键值缓存（值以JSON存储）"""
+    
+    # 读取时更新的访问时间累计到这么多个键或间隔这么多秒后一次性写入（写入和淘汰前也会先写入）
+    TOUCH_BATCH = 256
+    TOUCH_INTERVAL = 30.0
+    
+    def __init__(self, path: str = "price_cache.db", max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._touches: Dict[str, float] = {}  # 键 → 尚未写入的最近访问时间
+        self._touches_flushed = time.monotonic()
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL模式下读写互不阻塞，写入以事务为单位原子提交
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache (last_access)")
+    
+    def get(self, key: str) -> Optional[Any]:
+        """获取未过期的缓存值，不存在或已过期返回None"""
+        entry = self.get_entry(key)
+        if entry and entry['expires_at'] > time.time():
+            return entry['value']
+        return None
+    
+    def get_entry(self, key: str) -> Optional[Dict]:
+        """获取缓存条目（包括已过期的），用于条件请求重新验证"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, etag, last_modified FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if not row:
+                return None
+            # 每次读取都执行UPDATE会让只读的缓存命中也变成写事务，访问时间先记在内存中
+            self._touches[key] = time.time()
+            if (len(self._touches) >= self.TOUCH_BATCH
+                    or time.monotonic() - self._touches_flushed >= self.TOUCH_INTERVAL):
+                with self._transaction():
+                    self._flush_touches()
+        
+        try:
+            value = json.loads(row[0])
+        except ValueError:
+            self.delete(key)
+            return None
+        return {
+            'value': value,
+            'expires_at': row[1],
+            'etag': row[2],
+            'last_modified': row[3]
+        }
+    
+    def set(self, key: str, value: Any, ttl: float,
+            etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """写入缓存值，超出容量时按最近访问时间淘汰旧条目"""
+        payload = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        size = len(payload.encode('utf-8'))
+        if size > self.max_bytes:
+            return  # 单个值超过总容量，不缓存
+        
+        now = time.time()
+        with self._lock:
+            with self._transaction():
+                self._flush_touches()  # 淘汰前写入最新的访问时间
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, size, expires_at, last_access, etag, last_modified) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, payload, size, now + ttl, now, etag, last_modified)
+                )
+                self._evict()
+    
+    def touch(self, key: str, ttl: float):
+        """延长缓存条目的有效期（例如服务器返回304 Not Modified时）"""
+        now = time.time()
+        with self._lock:
+            self._touches.pop(key, None)
+            self._conn.execute(
+                "UPDATE cache SET expires_at = ?, last_access = ? WHERE key = ?", (now + ttl, now, key)
+            )
+    
+    def delete(self, key: str):
+        """删除缓存条目"""
+        with self._lock:
+            self._touches.pop(key, None)
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._touches.clear()
+            self._conn.execute("DELETE FROM cache")
+    
+    def total_size(self) -> int:
+        """缓存值的总字节数"""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+    
+    def close(self):
+        """写入尚未保存的访问时间并关闭数据库连接"""
+        with self._lock:
+            if self._touches:
+                with self._transaction():
+                    self._flush_touches()
+            self._conn.close()
+    
+    @contextmanager
+    def _transaction(self):
+        """显式事务（BEGIN IMMEDIATE ... COMMIT/ROLLBACK），保证写入原子性"""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+    
+    def _flush_touches(self):
+        """把内存中的访问时间批量写入数据库（调用方持有锁并处于事务中）"""
+        if self._touches:
+            self._conn.executemany("UPDATE cache SET last_access = ? WHERE key = ?",
+                                   [(ts, key) for key, ts in self._touches.items()])
+            self._touches.clear()
+        self._touches_flushed = time.monotonic()
+    
+    def _evict(self):
+        """淘汰最久未访问的条目直到总大小不超过上限（调用方持有锁并处于事务中）"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        
+        # 过期条目优先淘汰，其次按最近访问时间
+        rows = self._conn.execute(
+            "SELECT key, size FROM cache ORDER BY (expires_at > ?) ASC, last_access ASC", (time.time(),)
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            total -= size
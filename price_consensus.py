@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+多源价格共识 - 用加权中位数代替"第一个返回的源"
+每个API源的报价按置信度（可选再乘以流动性系数）加权，先用全部报价的加权中位数剔除
+偏离超过阈值的异常报价，再对剩余报价取加权中位数，并给出各源之间的价差
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+
+def weighted_median(values: List[float], weights: List[float]) -> float:
+    """加权中位数：累计权重首次达到总权重一半的值（两侧恰好各一半时取平均）"""
+    pairs = sorted(zip(values, weights))
+    total = sum(weight for _, weight in pairs)
+    if total <= 0:
+        pairs = [(value, 1.0) for value, _ in pairs]
+        total = float(len(pairs))
+
+    half = total / 2
+    cumulative = 0.0
+    for i, (value, weight) in enumerate(pairs):
+        cumulative += weight
+        if math.isclose(cumulative, half) and i + 1 < len(pairs):
+            return (value + pairs[i + 1][0]) / 2
+        if cumulative > half:
+            return value
+    return pairs[-1][0]
+
+
+def liquidity_factor(liquidity_usd: Optional[float], full_weight_liquidity: float = 1_000_000) -> float:
+    """
+    流动性系数（0.1 ~ 1）：按流动性的对数缩放，达到 full_weight_liquidity 时为1
+
+    没有流动性信息的报价（聚合器、CoinGecko）不做调整
+    """
+    if liquidity_usd is None:
+        return 1.0
+    if liquidity_usd <= 0:
+        return 0.1
+    scale = math.log10(1 + liquidity_usd) / math.log10(1 + full_weight_liquidity)
+    return min(1.0, max(0.1, scale))
+
+
+def build_consensus(quotes: Dict[str, Tuple[float, float]], max_deviation: float = 0.05,
+                    min_sources: int = 2) -> Optional[Dict]:
+    """
+    根据各源报价计算共识价格
+
+    quotes 为 {数据源: (价格, 权重)}；返回
+    {'price', 'sources', 'rejected', 'quotes', 'spread', 'spread_accepted', 'confident'}：
+    spread 为全部报价的 (最高-最低)/共识价格，spread_accepted 为剔除异常后的价差，
+    confident 表示参与共识的源数量不少于 min_sources
+    """
+    quotes = {source: (price, weight) for source, (price, weight) in quotes.items()
+              if price is not None and price > 0 and math.isfinite(price)}
+    if not quotes:
+        return None
+
+    sources = list(quotes)
+    prices = [quotes[source][0] for source in sources]
+    weights = [quotes[source][1] for source in sources]
+    reference = weighted_median(prices, weights)
+
+    accepted = [source for source in sources if abs(quotes[source][0] / reference - 1) <= max_deviation]
+    if not accepted:
+        accepted = sources  # 所有报价互相偏离，无法判断哪个异常
+    rejected = [source for source in sources if source not in accepted]
+
+    price = weighted_median([quotes[source][0] for source in accepted],
+                            [quotes[source][1] for source in accepted])
+    accepted_prices = [quotes[source][0] for source in accepted]
+    return {
+        'price': price,
+        'sources': accepted,
+        'rejected': rejected,
+        'quotes': {source: quotes[source][0] for source in sources},
+        'spread': (max(prices) - min(prices)) / price,
+        'spread_accepted': (max(accepted_prices) - min(accepted_prices)) / price,
+        'confident': len(accepted) >= min_sources
+    }
+
+
+def describe_consensus(consensus: Dict) -> str:
+    """生成一行共识说明，如 "共识 2/3源 价差0.42% 剔除DexScreener" """
+    total = len(consensus['quotes'])
+    text = f"共识 {len(consensus['sources'])}/{total}源 价差{consensus['spread']:.2%}"
+    if consensus['rejected']:
+        text += f" 剔除{'、'.join(consensus['rejected'])}"
+    if not consensus['confident']:
+        text += " 低置信"
+    return text
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+价格查询服务 - 常驻的本地HTTP/JSON报价接口
+内部服务不必每次启动一个追踪器进程：服务进程常驻一个追踪器实例，把被查询过的代币和代币对
+放进内存中的热点报价表，由后台轮询线程按间隔批量刷新；报价在写入时就编码成JSON，
+命中热点表的请求只需一次字典查找和一次写出，处理耗时在亚毫秒级
+
+接口：
+    GET /price/<SOL代币地址>                   代币价格与SOL兑换比率
+    GET /ratio/<SOL代币地址>/<ETH代币地址>[/<链>]  跨链代币价格比值（链默认为 COMPARE_CHAIN）
+    GET /history?kind=prices&token=&since=&until=&limit=   历史记录
+    GET /health                                服务状态
+"""
+
+import json
+import logging
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from history_store import KINDS, parse_time_arg
+from quotes import Quote
+from source_registry import chain_config
+
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteUnavailable(Exception):
+    """无法获取报价（所有API源都失败或代币不存在）"""
+
+
+def _encode(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class PriceServer:
+    """
+    热点报价表 + HTTP查询端点 + 后台轮询
+    
+    热点表的键为 ('price', 代币地址) 或 ('ratio', SOL代币地址, 对比代币地址, 链)，值为
+    (编码好的JSON响应, 更新时间)。未命中或超过 max_age 的报价在请求线程中同步获取
+    （相同键的并发请求合并为一次获取），之后由轮询线程刷新；超过 idle_ttl 没有被查询的键
+    从热点表中移除，pinned 中的键（启动时预加载的监控列表）常驻
+    """
+    
+    def __init__(self, tracker, host: str = '127.0.0.1', port: int = 8787, poll_interval: float = 10,
+                 max_age: Optional[float] = None, idle_ttl: float = 600, record_history: bool = False,
+                 history_limit: int = 1000):
+        self.tracker = tracker
+        self.host = host
+        self.port = port
+        self.poll_interval = poll_interval
+        self.max_age = max_age if max_age is not None else poll_interval * 3
+        self.idle_ttl = idle_ttl
+        self.record_history = record_history
+        self.history_limit = history_limit
+        
+        self._bodies: Dict[tuple, Tuple[bytes, float]] = {}
+        self._tokens: Dict[str, Dict] = {}      # SOL代币地址 → 最新报价
+        self._eth_tokens: Dict[Tuple[str, str], Dict] = {}  # (链, 对比代币地址) → 最新报价
+        self._access: Dict[tuple, float] = {}   # 键 → 最后一次被查询的时间
+        self._pinned = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._poller: Optional[threading.Thread] = None
+        self.started_at = time.time()
+        self.last_poll: Optional[float] = None
+        self.polls = 0
+    
+    # ---------- 热点报价表 ----------
+    
+    def pin(self, tokens: Iterable[str] = (), pairs: Iterable[Tuple[str, str, Optional[str]]] = ()):
+        """预加载代币和代币对 (SOL代币, 对比代币, 链)：第一次轮询即获取报价，且不会因空闲被移除"""
+        keys = [('price', token) for token in tokens] + [self.ratio_key(*pair) for pair in pairs]
+        with self._lock:
+            for key in keys:
+                self._pinned.add(key)
+                self._access[key] = time.monotonic()
+    
+    def ratio_key(self, sol_mint: str, eth_token: str, chain: Optional[str] = None) -> tuple:
+        """代币对在热点表中的键，未指定链时使用追踪器的 COMPARE_CHAIN；链未注册时抛出 ValueError"""
+        chain = (chain or self.tracker.compare_chain).lower()
+        chain_config(chain)
+        return 'ratio', sol_mint, eth_token, chain
+    
+    def lookup(self, key: tuple) -> Tuple[bytes, bool]:
+        """
+        返回 (JSON响应, 是否命中热点表)
+        
+        热点表中的报价在 max_age 内直接返回；否则同步获取，失败时抛出 QuoteUnavailable。
+        只有成功返回报价的键才记录访问时间（进入后台轮询），查询不到的地址不会被反复轮询
+        """
+        now = time.monotonic()
+        entry = self._bodies.get(key)
+        if entry is not None and now - entry[1] <= self.max_age:
+            self._access[key] = now
+            return entry[0], True
+        
+        body = self.tracker._coalesce(f"server:{':'.join(key)}", lambda: self._load(key))
+        if body is None:
+            raise QuoteUnavailable(key[1] if key[0] == 'price' else f"{key[1]}/{key[2]}")
+        self._access[key] = now
+        return body, False
+    
+    def _load(self, key: tuple) -> Optional[bytes]:
+        """同步获取一个键的报价并写入热点表"""
+        if key[0] == 'price':
+            sol_price, token_info, source = self.tracker.get_multi_api_prices(key[1])
+            if not (sol_price and token_info):
+                return None
+            self._store_token(key[1], sol_price, token_info, source)
+            return self._bodies[key][0]
+        
+        _, sol_mint, eth_token, chain = key
+        if not self._is_fresh(('price', sol_mint)):
+            sol_price, token_info, source = self.tracker.get_multi_api_prices(sol_mint)
+            if not (sol_price and token_info):
+                return None
+            self._store_token(sol_mint, sol_price, token_info, source)
+        if not self._is_fresh_eth(chain, eth_token):
+            eth_info, eth_source = self.tracker.get_chain_token_price(eth_token, chain)
+            if not eth_info:
+                return None
+            self._store_eth_token(chain, eth_token, eth_info, eth_source)
+        return self._render_ratio(sol_mint, eth_token, chain)
+    
+    def _is_fresh(self, key: tuple) -> bool:
+        entry = self._bodies.get(key)
+        return entry is not None and time.monotonic() - entry[1] <= self.max_age
+    
+    def _is_fresh_eth(self, chain: str, eth_token: str) -> bool:
+        quote = self._eth_tokens.get((chain, eth_token))
+        return quote is not None and time.monotonic() - quote['_updated'] <= self.max_age
+    
+    def _store_token(self, mint: str, sol_price: float, token_info: Quote, source: str):
+        sol_to_token, token_to_sol = self.tracker.calculate_exchange_rates(sol_price, token_info.price)
+        quote = {
+            'mint': mint,
+            'name': token_info.name,
+            'symbol': token_info.symbol,
+            'price': token_info.price,
+            'sol_price': sol_price,
+            'sol_to_token': sol_to_token,
+            'token_to_sol': token_to_sol,
+            'source': source,
+            'updated_at': token_info.timestamp,
+        }
+        body = _encode(quote)
+        with self._lock:
+            self._tokens[mint] = quote
+            self._bodies[('price', mint)] = (body, time.monotonic())
+    
+    def _store_eth_token(self, chain: str, eth_token: str, token_info: Quote, source: str):
+        quote = {
+            'address': eth_token,
+            'chain': chain,
+            'name': token_info.name,
+            'symbol': token_info.symbol,
+            'price': token_info.price,
+            'source': source,
+            '_updated': time.monotonic(),
+        }
+        with self._lock:
+            self._eth_tokens[(chain, eth_token)] = quote
+    
+    def _render_ratio(self, sol_mint: str, eth_token: str, chain: str) -> Optional[bytes]:
+        """用两侧的最新报价生成代币对的响应并写入热点表"""
+        sol_quote = self._tokens.get(sol_mint)
+        eth_quote = self._eth_tokens.get((chain, eth_token))
+        if sol_quote is None or eth_quote is None:
+            return None
+        sol_to_eth, eth_to_sol = self.tracker.calculate_token_ratio(sol_quote['price'], eth_quote['price'])
+        body = _encode({
+            'sol_token': {field: sol_quote[field] for field in ('mint', 'name', 'symbol', 'price', 'source')},
+            'eth_token': {field: value for field, value in eth_quote.items() if not field.startswith('_')},
+            'sol_to_eth_ratio': sol_to_eth,
+            'eth_to_sol_ratio': eth_to_sol,
+            'updated_at': time.time(),
+        })
+        with self._lock:
+            self._bodies[('ratio', sol_mint, eth_token, chain)] = (body, time.monotonic())
+        return body
+    
+    # ---------- 后台轮询 ----------
+    
+    def _evict_idle(self, now: float):
+        """移除空闲超过 idle_ttl 的键，以及不再被任何键引用的代币报价"""
+        with self._lock:
+            for key, last in list(self._access.items()):
+                if key not in self._pinned and now - last > self.idle_ttl:
+                    self._access.pop(key, None)
+                    self._bodies.pop(key, None)
+            mints, eth_tokens = map(set, self._watched())
+            for mint in [mint for mint in self._tokens if mint not in mints]:
+                self._tokens.pop(mint)
+                self._bodies.pop(('price', mint), None)
+            for eth_token in [eth for eth in self._eth_tokens if eth not in eth_tokens]:
+                self._eth_tokens.pop(eth_token)
+    
+    def _watched(self) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """需要轮询的SOL代币和 (链, 对比代币)（保持首次查询的顺序）"""
+        mints, eth_tokens = {}, {}
+        for key in list(self._access):
+            mints[key[1]] = None
+            if key[0] == 'ratio':
+                eth_tokens[(key[3], key[2])] = None
+        return list(mints), list(eth_tokens)
+    
+    def poll_once(self):
+        """刷新热点表中的所有报价：SOL代币和各条链上的对比代币分别按批量大小分组批量获取"""
+        self._evict_idle(time.monotonic())
+        with self._lock:
+            mints, eth_tokens = self._watched()
+            pairs = [key[1:] for key in self._access if key[0] == 'ratio']
+        
+        timestamp = time.time()
+        # 不记录历史时仍生成记录交给告警评估
+        alerts = self.tracker.alerts
+        emit = self.record_history or alerts is not None
+        rows = []
+        for chunk in self.tracker._chunks(mints, self.tracker.track_batch_size):
+            sol_price, found = self.tracker.get_multi_api_prices_batch(chunk)
+            if not sol_price:
+                logger.warning("⚠️ 无法获取SOL价格，本轮跳过 %s 个代币", len(chunk))
+                continue
+            for mint, (token_info, source) in found.items():
+                self._store_token(mint, sol_price, token_info, source)
+                if emit:
+                    quote = self._tokens[mint]
+                    rows.append(self.tracker._history_record(mint, token_info, sol_price, token_info.price,
+                                                             quote['sol_to_token'], quote['token_to_sol'],
+                                                             source, timestamp))
+        
+        by_chain: Dict[str, List[str]] = {}
+        for chain, eth_token in eth_tokens:
+            by_chain.setdefault(chain, []).append(eth_token)
+        eth_sources = {}
+        for chain, addresses in by_chain.items():
+            for chunk in self.tracker._chunks(addresses, self.tracker.track_batch_size):
+                for eth_token, (eth_info, eth_source) in self.tracker.get_chain_token_prices(chunk, chain).items():
+                    self._store_eth_token(chain, eth_token, eth_info, eth_source)
+                    eth_sources[(chain, eth_token)] = (eth_info, eth_source)
+        
+        for sol_mint, eth_token, chain in pairs:
+            self._render_ratio(sol_mint, eth_token, chain)
+            if emit and sol_mint in self._tokens and (chain, eth_token) in eth_sources:
+                self._record_pair(sol_mint, eth_token, *eth_sources[(chain, eth_token)])
+        
+        if rows and self.record_history:
+            self.tracker.save_rows_to_file(rows)
+        elif rows:
+            alerts.observe('prices', rows)
+        self.polls += 1
+        self.last_poll = time.time()
+    
+    def _record_pair(self, sol_mint: str, eth_token: str, eth_info: Quote, eth_source: str):
+        quote = self._tokens[sol_mint]
+        sol_info = Quote(quote['price'], quote['name'], quote['symbol'], quote['source'], quote['updated_at'])
+        sol_to_eth, eth_to_sol = self.tracker.calculate_token_ratio(quote['price'], eth_info.price)
+        if not self.record_history:
+            self.tracker.alerts.observe('comparisons', [self.tracker._comparison_record(
+                sol_mint, sol_info, eth_token, eth_info, quote['price'], eth_info.price,
+                sol_to_eth, eth_to_sol, quote['source'], eth_source)])
+            return
+        self.tracker.save_comparison_to_file(sol_mint, sol_info, eth_token, eth_info, quote['price'],
+                                             eth_info.price, sol_to_eth, eth_to_sol, quote['source'], eth_source)
+    
+    def _poll_loop(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.error("❌ 热点报价刷新失败: %s", e)
+            elapsed = time.monotonic() - start
+            if elapsed > self.poll_interval:
+                logger.warning("⚠️ 热点报价刷新耗时 %.1fs，超出间隔 %.0fs", elapsed, self.poll_interval)
+            self._stop.wait(max(0.0, self.poll_interval - elapsed))
+    
+    # ---------- 历史记录 ----------
+    
+    def history(self, query: Dict[str, List[str]]) -> bytes:
+        """按查询参数读取历史记录，数值列转换为数字；参数不合法时抛出 ValueError"""
+        kind = query.get('kind', ['prices'])[0]
+        if kind not in KINDS:
+            raise ValueError(f"kind 只能是 {', '.join(KINDS)}")
+        limit = min(int(query.get('limit', ['100'])[0]), self.history_limit)
+        token = query.get('token', [None])[0]
+        since = parse_time_arg(query['since'][0]) if 'since' in query else None
+        until = parse_time_arg(query['until'][0]) if 'until' in query else None
+        
+        history = self.tracker.history_store.tail(kind, limit, token=token, since=since, until=until)
+        fields, _, formats = KINDS[kind]
+        records = []
+        for row in (history[1] if history else []):
+            record = dict(zip(fields, row))
+            for field in formats:
+                value = record.get(field)
+                record[field] = float(value) if value else None
+            records.append(record)
+        return _encode({'kind': kind, 'count': len(records), 'records': records})
+    
+    def health(self) -> bytes:
+        return _encode({
+            'status': 'ok',
+            'quotes': len(self._bodies),
+            'tokens': len(self._tokens),
+            'eth_tokens': len(self._eth_tokens),
+            'polls': self.polls,
+            'last_poll': self.last_poll,
+            'poll_interval': self.poll_interval,
+            'uptime': time.time() - self.started_at,
+        })
+    
+    # ---------- HTTP ----------
+    
+    def _make_handler(self):
+        server = self
+        metrics = self.tracker.metrics
+        
+        class QuoteHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # 保持连接，客户端可复用TCP连接
+            disable_nagle_algorithm = True  # 响应头和响应体分两次写出，避免Nagle算法带来的延迟
+            
+            def _send(self, status: int, body: bytes):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def _error(self, status: int, message: str):
+                self._send(status, _encode({'error': message}))
+            
+            def do_GET(self):
+                start = time.perf_counter()
+                url = urlparse(self.path)
+                parts = [part for part in url.path.split('/') if part]
+                endpoint = parts[0] if parts else ''
+                result = 'hot'
+                try:
+                    if endpoint == 'price' and len(parts) == 2:
+                        body, hot = server.lookup(('price', parts[1]))
+                        result = 'hot' if hot else 'loaded'
+                    elif endpoint == 'ratio' and len(parts) in (3, 4):
+                        body, hot = server.lookup(server.ratio_key(*parts[1:]))
+                        result = 'hot' if hot else 'loaded'
+                    elif endpoint == 'history' and len(parts) == 1:
+                        body = server.history(parse_qs(url.query))
+                        result = 'ok'
+                    elif endpoint == 'health' and len(parts) == 1:
+                        body = server.health()
+                        result = 'ok'
+                    else:
+                        endpoint, result = 'unknown', 'not_found'
+                        self._error(404, f"未知路径: {url.path}")
+                        return
+                    self._send(200, body)
+                except QuoteUnavailable as e:
+                    result = 'not_found'
+                    self._error(404, f"无法获取报价: {e}")
+                except ValueError as e:
+                    result = 'bad_request'
+                    self._error(400, str(e))
+                except Exception as e:
+                    result = 'error'
+                    logger.error("❌ 查询 %s 失败: %s", self.path, e)
+                    self._error(500, str(e))
+                finally:
+                    metrics.observe_server(endpoint, time.perf_counter() - start, result)
+            
+            def log_message(self, format, *args):
+                logger.debug("server %s - %s", self.address_string(), format % args)
+        
+        return QuoteHandler
+    
+    def start(self) -> 'PriceServer':
+        """在后台线程启动HTTP端点和轮询线程"""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='price-server', daemon=True).start()
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._poll_loop, name='price-server-poll', daemon=True)
+        self._poller.start()
+        logger.info("🛰️ 价格查询服务已启动: http://%s:%d（每 %.0fs 刷新热点报价）",
+                    self.host, self.port, self.poll_interval)
+        return self
+    
+    def stop(self):
+        """停止HTTP端点和轮询线程"""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._poller is not None:
+            self._poller.join(timeout=self.poll_interval)
+            self._poller = None
+    
+    def wait(self):
+        """阻塞直到 stop() 被调用（或收到退出信号）"""
+        self._stop.wait()
+
+
+def run_server(tracker, host: str = '127.0.0.1', port: int = 8787, poll_interval: float = 10,
+               watchlist: Optional[Dict] = None, **options):
+    """以服务模式运行，watchlist 中的代币和代币对预加载到热点表；收到 SIGINT/SIGTERM 后退出"""
+    server = PriceServer(tracker, host, port, poll_interval, **options)
+    watchlist = watchlist or {}
+    server.pin(
+        [entry['address'] if isinstance(entry, dict) else entry for entry in watchlist.get('tokens', [])],
+        [(pair['sol'], pair['eth'], pair.get('chain')) for pair in watchlist.get('pairs', [])]
+    )
+    
+    def handle_signal(signum, frame):
+        logger.info("\n🛑 收到退出信号，正在停止查询服务...")
+        server._stop.set()
+    
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGINT, handle_signal)
+        signal.signal(signal.SIGTERM, handle_signal)
+    
+    server.start()
+    server.wait()
+    server.stop()
+    logger.info("👋 查询服务已停止")
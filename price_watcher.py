@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+价格监控守护进程 - 常驻运行的轮询调度器
+保持一个追踪器实例常驻（缓存、连接池、限流器都跨轮次复用），
+按配置的间隔轮询代币列表和SOL/ETH代币对；同一间隔内的任务均匀错开并加入随机抖动，
+避免所有请求在同一时刻发出
+"""
+
+import heapq
+import json
+import logging
+import random
+import signal
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class WatchJob:
+    """一个周期性执行的轮询任务"""
+    
+    def __init__(self, name: str, func: Callable[[], object], interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.runs = 0
+        self.failures = 0
+        self.last_duration = 0.0
+
+
+class WatchScheduler:
+    """
+    基于最小堆的抖动调度器
+    
+    相同间隔的任务在第一个周期内均匀错开，此后每次执行完按
+    "上次计划时间 + 间隔 ± 抖动" 重新排期；任务按顺序在调度线程中执行，
+    请求速率由追踪器的令牌桶限流器统一控制
+    """
+    
+    def __init__(self, jitter: float = 0.1):
+        self.jitter = jitter  # 抖动幅度，占间隔的比例
+        self._jobs: List[WatchJob] = []
+        self._heap = []
+        self._seq = 0
+        self._stop = threading.Event()
+    
+    @property
+    def jobs(self) -> List[WatchJob]:
+        """已添加的任务"""
+        return list(self._jobs)
+    
+    def add_job(self, job: WatchJob):
+        """添加任务（在 run 之前调用）"""
+        self._jobs.append(job)
+    
+    def _jittered(self, interval: float) -> float:
+        """返回带随机抖动的时间偏移"""
+        return random.uniform(-self.jitter, self.jitter) * interval
+    
+    def _push(self, due: float, job: WatchJob):
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, job))
+    
+    def _schedule_initial(self, now: float):
+        """把相同间隔的任务均匀分布到第一个周期内"""
+        groups: Dict[float, List[WatchJob]] = {}
+        for job in self._jobs:
+            groups.setdefault(job.interval, []).append(job)
+        
+        for interval, jobs in groups.items():
+            slot = interval / len(jobs)
+            for i, job in enumerate(jobs):
+                offset = i * slot + abs(self._jittered(slot))
+                self._push(now + offset, job)
+    
+    def stop(self):
+        """请求停止调度（当前任务执行完后退出）"""
+        self._stop.set()
+    
+    def run(self, max_runs: Optional[int] = None):
+        """运行调度循环，直到 stop() 被调用或执行次数达到 max_runs"""
+        self._heap = []
+        self._schedule_initial(time.monotonic())
+        total_runs = 0
+        
+        while self._heap and not self._stop.is_set():
+            due, _, job = heapq.heappop(self._heap)
+            delay = due - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            
+            start = time.monotonic()
+            try:
+                job.func()
+            except Exception as e:
+                job.failures += 1
+                logger.error("❌ 监控任务 %s 执行失败: %s", job.name, e)
+            job.runs += 1
+            job.last_duration = time.monotonic() - start
+            total_runs += 1
+            if max_runs is not None and total_runs >= max_runs:
+                break
+            
+            next_due = due + job.interval + self._jittered(job.interval)
+            now = time.monotonic()
+            if next_due < now:
+                # 任务执行超时导致错过计划时间，从当前时间重新排期
+                logger.warning("⚠️ 监控任务 %s 耗时 %.1fs，超出间隔 %.0fs",
+                               job.name, job.last_duration, job.interval)
+                next_due = now
+            self._push(next_due, job)
+
+
+def load_watchlist(path: str) -> Dict:
+    """
+    读取监控列表（JSON格式）：
+    {
+        "interval": 60,
+        "tokens": ["<SOL代币地址>", ...],
+        "pairs": [{"sol": "<SOL代币地址>", "eth": "<ETH代币地址>", "interval": 300}, ...]
+    }
+    tokens 也可以写成 {"address": ..., "interval": ...} 以单独设置间隔；
+    pairs 可以用 "chain" 指定另一侧代币所在的链（如 base、bsc，默认 COMPARE_CHAIN）
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def build_scheduler(tracker, watchlist: Dict, default_interval: float = 60,
+                    jitter: float = 0.1) -> WatchScheduler:
+    """根据监控列表创建调度器：同一间隔的代币按批量大小分组，每组一个批量任务"""
+    scheduler = WatchScheduler(jitter=watchlist.get('jitter', jitter))
+    base_interval = float(watchlist.get('interval', default_interval))
+    
+    tokens_by_interval: Dict[float, List[str]] = {}
+    for entry in watchlist.get('tokens', []):
+        if isinstance(entry, dict):
+            address, interval = entry['address'], float(entry.get('interval', base_interval))
+        else:
+            address, interval = entry, base_interval
+        tokens_by_interval.setdefault(interval, []).append(address)
+    
+    for interval, addresses in tokens_by_interval.items():
+        addresses = list(dict.fromkeys(addresses))
+        for i, chunk in enumerate(tracker._chunks(addresses, tracker.track_batch_size)):
+            scheduler.add_job(WatchJob(
+                f"tokens[{interval:.0f}s#{i + 1}]",
+                lambda chunk=chunk: tracker.track_tokens(chunk),
+                interval
+            ))
+    
+    for pair in watchlist.get('pairs', []):
+        interval = float(pair.get('interval', base_interval))
+        scheduler.add_job(WatchJob(
+            f"pair[{pair['sol'][:6]}/{pair['eth'][:8]}]",
+            lambda pair=pair: tracker.compare_sol_eth_tokens(pair['sol'], pair['eth'], pair.get('chain')),
+            interval
+        ))
+    
+    return scheduler
+
+
+def run_watch(tracker, watchlist: Dict, default_interval: float = 60,
+              jitter: float = 0.1, max_runs: Optional[int] = None):
+    """以守护模式运行监控，收到 SIGINT/SIGTERM 后在当前任务结束时退出"""
+    scheduler = build_scheduler(tracker, watchlist, default_interval, jitter)
+    if not scheduler.jobs:
+        logger.error("❌ 监控列表为空，请提供代币地址或代币对")
+        return
+    
+    def handle_signal(signum, frame):
+        logger.info("\n🛑 收到退出信号，正在停止监控...")
+        scheduler.stop()
+    
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGINT, handle_signal)
+        signal.signal(signal.SIGTERM, handle_signal)
+    
+    logger.info("👀 开始监控：%s 个轮询任务（Ctrl+C 退出）", len(scheduler.jobs))
+    for job in scheduler.jobs:
+        logger.info("   - %s 每 %.0fs", job.name, job.interval)
+    scheduler.run(max_runs=max_runs)
+    logger.info("👋 监控已停止")
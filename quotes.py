@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+代币报价记录 - 取代在获取、共识、保存流程中层层传递的临时字典
+每条报价使用 __slots__ 固定字段（没有实例字典），价格和时间戳是数值；
+符号在构造时统一转为大写并驻留（sys.intern），同一代币的大量报价共享同一个字符串对象，
+输出时不再反复 .upper()；数值格式化推迟到写入历史记录或打印日志时进行
+"""
+
+import copy
+import sys
+import time
+from typing import Dict, Optional
+
+
+UNKNOWN_NAME = 'Unknown'
+UNKNOWN_SYMBOL = 'UNK'
+
+
+def intern_symbol(symbol: Optional[str]) -> str:
+    """大写并驻留代币符号，为空时返回 UNK"""
+    return sys.intern(symbol.upper()) if symbol else UNKNOWN_SYMBOL
+
+
+class Quote:
+    """
+    一条代币报价
+    
+    price 为美元价格，timestamp 为获取时间（Unix秒），source 为数据源名称；
+    liquidity 只有DexScreener报价带有，platform 标记以太坊报价，consensus 记录共识模式下的各源报价和价差
+    """
+    
+    __slots__ = ('price', 'name', 'symbol', 'source', 'timestamp', 'liquidity', 'platform', 'consensus')
+    
+    def __init__(self, price: float, name: Optional[str] = None, symbol: Optional[str] = None,
+                 source: str = '', timestamp: Optional[float] = None, liquidity: Optional[float] = None,
+                 platform: Optional[str] = None, consensus: Optional[Dict] = None):
+        self.price = price
+        self.name = name or UNKNOWN_NAME
+        self.symbol = intern_symbol(symbol)
+        self.source = source
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.liquidity = liquidity
+        self.platform = platform
+        self.consensus = consensus
+    
+    def replace(self, **changes) -> 'Quote':
+        """返回修改了部分字段的副本（符号同样会被规范化）"""
+        quote = copy.copy(self)
+        for field, value in changes.items():
+            setattr(quote, field, intern_symbol(value) if field == 'symbol' else value)
+        return quote
+    
+    @property
+    def has_name(self) -> bool:
+        """是否带有代币名称（1inch只返回价格）"""
+        return self.name != UNKNOWN_NAME
+    
+    @property
+    def spread(self) -> Optional[float]:
+        """共识报价的源间价差，非共识报价为None"""
+        return self.consensus['spread'] if self.consensus else None
+    
+    def __repr__(self) -> str:
+        return f"Quote({self.symbol} ${self.price} from {self.source})"
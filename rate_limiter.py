@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+令牌桶限流器 - 按API源执行 api_sources 中声明的 rate_limit（每分钟请求数）
+线程安全，同时提供异步等待接口，供同步请求层和asyncio任务共享同一组令牌桶
+"""
+
+import asyncio
+import math
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """
+    令牌桶：以 rate_per_minute * headroom 的速率补充令牌
+    
+    桶容量取限额中留出的余量部分，保证任意一分钟内的请求数
+    （突发容量 + 持续速率）都不超过服务商的限额。
+    令牌可以被预约成负数，多个等待者按预约顺序依次放行。
+    """
+    
+    def __init__(self, rate_per_minute: float, headroom: float = 0.9, capacity: Optional[float] = None):
+        self.rate_per_minute = rate_per_minute
+        self.rate = rate_per_minute * headroom / 60.0  # 每秒补充的令牌数
+        if capacity is None:
+            capacity = max(1.0, math.floor(rate_per_minute * (1 - headroom)))
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self, now: float):
+        """按经过的时间补充令牌（调用方持有锁）"""
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+    
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        预约一个令牌，返回需要等待的秒数
+        
+        如果需要等待的时间超过 max_wait，则不预约并返回None
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+    
+    def acquire(self, max_wait: Optional[float] = None) -> bool:
+        """阻塞直到获得令牌；等待时间超过 max_wait 时返回False"""
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+    
+    async def acquire_async(self, max_wait: Optional[float] = None) -> bool:
+        """异步等待令牌（不阻塞事件循环）"""
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+
+class RateLimiter:
+    """按API源管理令牌桶，未配置限额的源不限流"""
+    
+    def __init__(self, headroom: float = 0.9):
+        self.headroom = headroom
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._deferred_until: Dict[str, float] = {}  # API源 → 服务商要求暂停到的时间（monotonic）
+        self._lock = threading.Lock()
+    
+    def configure(self, source: str, rate_per_minute: Optional[float]):
+        """设置某个API源的每分钟请求数限额"""
+        with self._lock:
+            if rate_per_minute:
+                self._buckets[source] = TokenBucket(rate_per_minute, self.headroom)
+                self._stats.setdefault(source, {'acquired': 0, 'throttled': 0, 'rejected': 0, 'wait_time': 0.0})
+            else:
+                self._buckets.pop(source, None)
+    
+    def bucket(self, source: str) -> Optional[TokenBucket]:
+        """获取某个API源的令牌桶"""
+        return self._buckets.get(source)
+    
+    def defer(self, source: str, seconds: float):
+        """
+        服务商要求等待（429 + Retry-After）：seconds 秒内暂停该API源（无论是否配置了限额）
+        
+        暂停期间 deferred() 返回剩余秒数，请求层直接跳过该源、回退到下一个源，而不是排队等待
+        """
+        if seconds <= 0:
+            return
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._deferred_until[source] = max(until, self._deferred_until.get(source, 0.0))
+    
+    def deferred(self, source: str) -> float:
+        """某个API源剩余的暂停秒数，未暂停时为0"""
+        until = self._deferred_until.get(source)
+        if until is None:
+            return 0.0
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            with self._lock:
+                if self._deferred_until.get(source) == until:
+                    del self._deferred_until[source]
+            return 0.0
+        return remaining
+    
+    def _record(self, source: str, wait: Optional[float]):
+        """记录一次限流结果"""
+        with self._lock:
+            stats = self._stats[source]
+            if wait is None:
+                stats['rejected'] += 1
+                return
+            stats['acquired'] += 1
+            if wait > 0:
+                stats['throttled'] += 1
+                stats['wait_time'] += wait
+    
+    def acquire(self, source: str, max_wait: Optional[float] = None) -> bool:
+        """请求前调用：等待该API源的令牌，超过 max_wait 返回False"""
+        bucket = self._buckets.get(source)
+        if bucket is None:
+            return True
+        wait = bucket.reserve(max_wait)
+        self._record(source, wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+    
+    async def acquire_async(self, source: str, max_wait: Optional[float] = None) -> bool:
+        """acquire 的异步版本"""
+        bucket = self._buckets.get(source)
+        if bucket is None:
+            return True
+        wait = bucket.reserve(max_wait)
+        self._record(source, wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+    
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """返回每个API源的限流统计"""
+        with self._lock:
+            return {source: dict(stats) for source, stats in self._stats.items()}
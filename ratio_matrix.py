@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+跨代币比值矩阵 - 一次批量获取一篮子代币（Solana和其他链）的价格，计算所有两两比值
+每条链的代币只发一轮批量请求（每个API源按批量大小分块），价格向量的外除
+ratios[i, j] = price[i] / price[j] 即 "1 个代币i = ratios[i, j] 个代币j"，
+整个矩阵作为一个快照写入文件，而不是逐对写入 N² 条比值记录；
+可选地与上一个快照比较，只输出比值变化超过阈值的代币对
+"""
+
+import asyncio
+import csv
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from history_store import format_timestamp
+from source_registry import CHAINS, SOLANA
+
+
+logger = logging.getLogger(__name__)
+
+SOL_MINT = 'So11111111111111111111111111111111111111112'
+
+BasketEntry = Tuple[str, str]  # (链, 代币地址)
+
+
+def parse_basket_entry(entry, default_chain: str = 'ethereum') -> BasketEntry:
+    """
+    解析一篮子代币中的一项，返回 (链, 代币地址)
+    
+    可以写成 "<链>:<地址>"（如 base:0x...）或 {"address": ..., "chain": ...}；
+    没有指定链时0x开头的地址属于 default_chain，其余为Solana代币
+    """
+    if isinstance(entry, dict):
+        address, chain = entry['address'].strip(), entry.get('chain')
+    else:
+        entry = entry.strip()
+        prefix, _, rest = entry.partition(':')
+        address, chain = (rest.strip(), prefix) if rest and prefix.lower() in CHAINS else (entry, None)
+    if not chain:
+        chain = default_chain if address.lower().startswith('0x') else SOLANA
+    return chain.lower(), address
+
+
+def basket_from_watchlist(watchlist: Dict, default_chain: str = 'ethereum') -> List[BasketEntry]:
+    """
+    监控列表中的一篮子代币：优先使用 "matrix" 列表，
+    否则由 tokens（Solana代币）和 pairs 两侧的代币组成（去重并保持顺序）
+    """
+    entries = watchlist.get('matrix')
+    if entries is None:
+        entries = [entry['address'] if isinstance(entry, dict) else entry for entry in watchlist.get('tokens', [])]
+        for pair in watchlist.get('pairs', []):
+            entries.append({'address': pair['sol'], 'chain': SOLANA})
+            entries.append({'address': pair['eth'], 'chain': pair.get('chain') or default_chain})
+    return list(dict.fromkeys(parse_basket_entry(entry, default_chain) for entry in entries))
+
+
+class RatioMatrix:
+    """一个比值矩阵快照：每个代币一行/一列，缺少价格的代币所在行列为NaN"""
+    
+    def __init__(self, ts: float, chains: List[str], addresses: List[str], symbols: List[str],
+                 sources: List[str], prices: np.ndarray, ratios: Optional[np.ndarray] = None):
+        self.ts = ts
+        self.chains = chains
+        self.addresses = addresses
+        self.symbols = symbols
+        self.sources = sources
+        self.prices = prices
+        self.ratios = outer_ratios(prices) if ratios is None else ratios
+    
+    def __len__(self) -> int:
+        return len(self.addresses)
+    
+    @property
+    def priced(self) -> int:
+        """获取到价格的代币数"""
+        return int(np.isfinite(self.prices).sum())
+    
+    @property
+    def keys(self) -> List[str]:
+        """每个代币的唯一标识 "<链>:<地址>" """
+        return [f"{chain}:{address}" for chain, address in zip(self.chains, self.addresses)]
+    
+    def save(self, path: str):
+        """把快照写入 .npz 文件（先写临时文件再替换，读取方不会看到写了一半的快照）"""
+        temp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            temp_path, ts=np.float64(self.ts), chains=np.array(self.chains, dtype=str),
+            addresses=np.array(self.addresses, dtype=str), symbols=np.array(self.symbols, dtype=str),
+            sources=np.array(self.sources, dtype=str), prices=self.prices, ratios=self.ratios
+        )
+        os.replace(temp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> Optional['RatioMatrix']:
+        """读取快照文件，文件不存在或无法解析时返回None"""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return cls(float(data['ts']), data['chains'].tolist(), data['addresses'].tolist(),
+                           data['symbols'].tolist(), data['sources'].tolist(), data['prices'], data['ratios'])
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("⚠️ 无法读取比值矩阵快照 %s: %s", path, e)
+            return None
+
+
+def outer_ratios(prices: np.ndarray) -> np.ndarray:
+    """价格向量的外除：ratios[i, j] = prices[i] / prices[j]，无效价格（缺失、非正数）所在行列为NaN"""
+    prices = np.where(np.isfinite(prices) & (prices > 0), prices, np.nan)
+    with np.errstate(invalid='ignore'):
+        return np.divide.outer(prices, prices)
+
+
+def moved_pairs(current: RatioMatrix, previous: RatioMatrix, threshold: float) -> List[Dict]:
+    """
+    比较两个快照中都存在的代币，返回比值相对变化超过阈值的代币对（每对只返回一次，按变化幅度降序）
+    
+    变化为 当前比值 / 上次比值 - 1；任一快照中缺少价格的代币对不参与比较
+    """
+    previous_index = {key: i for i, key in enumerate(previous.keys)}
+    current_rows = [i for i, key in enumerate(current.keys) if key in previous_index]
+    previous_rows = [previous_index[current.keys[i]] for i in current_rows]
+    if len(current_rows) < 2:
+        return []
+    
+    new = current.ratios[np.ix_(current_rows, current_rows)]
+    old = previous.ratios[np.ix_(previous_rows, previous_rows)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = new / old - 1
+    # 比值 j/i 的变化由 i/j 决定，只看上三角；NaN 的比较结果为False
+    rows, cols = np.nonzero(np.triu(np.abs(change) > threshold, k=1))
+    order = np.argsort(-np.abs(change[rows, cols]), kind='stable')
+    
+    moves = []
+    for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+        i, j = current_rows[row], current_rows[col]
+        moves.append({'base': i, 'quote': j, 'previous': float(old[row, col]),
+                      'ratio': float(new[row, col]), 'change': float(change[row, col])})
+    return moves
+
+
+def _group_by_chain(basket: List[BasketEntry]) -> Dict[str, List[str]]:
+    by_chain: Dict[str, List[str]] = {}
+    for chain, address in basket:
+        by_chain.setdefault(chain, []).append(address)
+    return by_chain
+
+
+def fetch_ratio_matrix(tracker, basket: List[BasketEntry]) -> RatioMatrix:
+    """
+    批量获取一篮子代币的价格并计算比值矩阵
+    
+    每条链只调用一次批量接口（每个API源按其批量大小分块请求）；篮子中有Solana代币时
+    同时得到的SOL价格作为矩阵的第一项
+    """
+    quotes = {}
+    sol_price = None
+    for chain, addresses in _group_by_chain(basket).items():
+        logger.info("📊 批量获取 %s 个%s代币价格...", len(addresses), CHAINS[chain]['name'])
+        if chain == SOLANA:
+            sol_price, found = tracker.get_multi_api_prices_batch(addresses)
+        else:
+            found = tracker.get_chain_token_prices(addresses, chain)
+        for address, (token_info, source) in found.items():
+            quotes[(chain, address)] = (token_info, source)
+    return build_ratio_matrix(basket, quotes, sol_price)
+
+
+async def fetch_ratio_matrix_async(tracker, basket: List[BasketEntry]) -> RatioMatrix:
+    """fetch_ratio_matrix 的异步版本（用于 AsyncMultiApiSolTokenTracker），各条链的批量请求并发执行"""
+    by_chain = _group_by_chain(basket)
+    for chain, addresses in by_chain.items():
+        logger.info("📊 批量获取 %s 个%s代币价格...", len(addresses), CHAINS[chain]['name'])
+    results = await asyncio.gather(*(
+        tracker.get_multi_api_prices_batch(addresses) if chain == SOLANA
+        else tracker.get_chain_token_prices(addresses, chain)
+        for chain, addresses in by_chain.items()
+    ))
+    
+    quotes = {}
+    sol_price = None
+    for chain, result in zip(by_chain, results):
+        if chain == SOLANA:
+            sol_price, result = result
+        for address, (token_info, source) in result.items():
+            quotes[(chain, address)] = (token_info, source)
+    return build_ratio_matrix(basket, quotes, sol_price)
+
+
+def build_ratio_matrix(basket: List[BasketEntry], quotes: Dict[BasketEntry, Tuple],
+                       sol_price: Optional[float]) -> RatioMatrix:
+    """由 {(链, 地址): (报价, 数据源)} 组装比值矩阵；有SOL价格且篮子中没有SOL时把SOL作为第一项"""
+    entries = list(basket)
+    if sol_price and (SOLANA, SOL_MINT) not in quotes:
+        entries.insert(0, (SOLANA, SOL_MINT))
+    
+    chains, addresses, symbols, sources = [], [], [], []
+    prices = np.full(len(entries), np.nan)
+    for i, (chain, address) in enumerate(entries):
+        chains.append(chain)
+        addresses.append(address)
+        if (chain, address) in quotes:
+            token_info, source = quotes[(chain, address)]
+            symbols.append(token_info.symbol or address[:8])
+            sources.append(source)
+            prices[i] = token_info.price
+        elif address == SOL_MINT and sol_price:
+            symbols.append('SOL')
+            sources.append('SOL')
+            prices[i] = sol_price
+        else:
+            logger.error("❌ %s: 无法获取代币价格", address)
+            symbols.append(address[:8])
+            sources.append('')
+    return RatioMatrix(time.time(), chains, addresses, symbols, sources, prices)
+
+
+def append_moves_csv(path: str, matrix: RatioMatrix, moves: List[Dict], previous_ts: float) -> int:
+    """把变化超过阈值的代币对追加到CSV文件，返回写入的行数"""
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        if new_file:
+            writer.writerow(['时间', '上次快照时间', '代币A链', '代币A地址', '代币A符号',
+                             '代币B链', '代币B地址', '代币B符号', '上次比值', '当前比值', '变化'])
+        for move in moves:
+            i, j = move['base'], move['quote']
+            writer.writerow([
+                format_timestamp(matrix.ts), format_timestamp(previous_ts),
+                matrix.chains[i], matrix.addresses[i], matrix.symbols[i],
+                matrix.chains[j], matrix.addresses[j], matrix.symbols[j],
+                f"{move['previous']:.8f}", f"{move['ratio']:.8f}", f"{move['change']:+.4%}"
+            ])
+    return len(moves)
+
+
+def run_ratio_matrix(tracker, basket: List[BasketEntry], path: str = 'ratio_matrix.npz',
+                     threshold: Optional[float] = None,
+                     moves_path: Optional[str] = None) -> Tuple[RatioMatrix, List[Dict]]:
+    """
+    计算一篮子代币的比值矩阵并写入快照文件
+    
+    指定 threshold 时先读取上一个快照，只报告（并追加到 moves_path）比值变化超过阈值的代币对
+    """
+    previous = RatioMatrix.load(path) if threshold is not None else None
+    matrix = fetch_ratio_matrix(tracker, basket)
+    return matrix, save_ratio_matrix(matrix, previous, path, threshold, moves_path)
+
+
+async def run_ratio_matrix_async(tracker, basket: List[BasketEntry], path: str = 'ratio_matrix.npz',
+                                 threshold: Optional[float] = None,
+                                 moves_path: Optional[str] = None) -> Tuple[RatioMatrix, List[Dict]]:
+    """run_ratio_matrix 的异步版本"""
+    previous = RatioMatrix.load(path) if threshold is not None else None
+    matrix = await fetch_ratio_matrix_async(tracker, basket)
+    return matrix, save_ratio_matrix(matrix, previous, path, threshold, moves_path)
+
+
+def save_ratio_matrix(matrix: RatioMatrix, previous: Optional[RatioMatrix], path: str,
+                      threshold: Optional[float], moves_path: Optional[str]) -> List[Dict]:
+    """保存快照，与上一个快照比较并返回比值变化超过阈值的代币对"""
+    logger.info("✅ 获取到 %s/%s 个代币的价格，比值矩阵 %sx%s", matrix.priced, len(matrix), len(matrix), len(matrix))
+    
+    matrix.save(path)
+    logger.info("💾 比值矩阵快照已保存到 %s", path)
+    
+    moves = []
+    if previous is not None:
+        moves = moved_pairs(matrix, previous, threshold)
+        logger.info("📈 与 %s 的快照相比，%s 个代币对的比值变化超过 %.2f%%",
+                    format_timestamp(previous.ts), len(moves), threshold * 100)
+        for move in moves:
+            logger.info("   1 %-10s = %-18s %-10s (%+.2f%%)", matrix.symbols[move['base']],
+                        format(move['ratio'], ',.8f'), matrix.symbols[move['quote']], move['change'] * 100)
+        if moves and moves_path:
+            append_moves_csv(moves_path, matrix, moves, previous.ts)
+            logger.info("💾 变化的代币对已追加到 %s", moves_path)
+    elif threshold is not None:
+        logger.info("📝 没有上一个快照，本次快照将作为下次比较的基准")
+    return moves
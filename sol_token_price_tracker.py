@@ -7,414 +7,1273 @@ Solana代币价格追踪器 - 多API源版本
 
 import requests
 import json
-import datetime
-import csv
+import logging
 import os
+import threading
 import time
-from typing import Dict, Optional, Tuple, List
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Optional, Tuple, List
 import argparse
+import atexit
 from dotenv import load_dotenv
 
+from alerts import AlertEngine, load_alert_config
+from backfill import run_backfill
+from coin_list import CoinListIndexBuilder, parse_platforms
+from history_store import HISTORY_BACKENDS, open_history_store, parse_time_arg
+from http_client import RETRY_STATUS_CODES, HttpSessionPool, retry_after_seconds
+from metrics import TrackerMetrics, failure_reason, instrument_fetch
+from price_cache import PersistentCache
+from price_consensus import build_consensus, describe_consensus, liquidity_factor
+from price_server import run_server
+from price_watcher import load_watchlist, run_watch
+from quotes import UNKNOWN_NAME, Quote
+from rate_limiter import RateLimiter
+from source_health import SourceHealth
+from source_registry import (CHAINS, SOLANA, chain_config, chain_name, coingecko_platforms,
+                             default_chain_apis, default_sources, dexscreener_tokens_url, jupiter_price_url,
+                             source_chain_id, supports_chain)
+
+
+logger = logging.getLogger(__name__)
+
+# 流式读取响应体时每次读取的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+# 所有代币共用的SOL报价缓存键，以及按mint保存代币名称/符号的元数据缓存键前缀
+SOL_QUOTE_KEY = 'sol_quote'
+TOKEN_METADATA_PREFIX = 'token_metadata:'
+
 
 class MultiApiSolTokenTracker:
-    def __init__(self):
+    def __init__(self, history_backend: Optional[str] = None):
         # 加载.env文件
         load_dotenv()
         
-        # 多API源配置
-        self.api_sources = {
-            'coingecko': {
-                'name': 'CoinGecko',
-                'base_url': 'https://api.coingecko.com/api/v3',
-                'headers': {},
-                'sol_mint': 'solana',
-                'rate_limit': 10  # 每分钟请求数
-            },
-            'jupiter': {
-                'name': 'Jupiter',
-                'base_url': 'https://price.jup.ag',
-                'headers': {},
-                'sol_mint': 'So11111111111111111111111111111111111111112',
-                'rate_limit': 100
-            },
-            'solscan': {
-                'name': 'Solscan',
-                'base_url': 'https://api.solscan.io',
-                'headers': {'User-Agent': 'Mozilla/5.0'},
-                'sol_mint': 'So11111111111111111111111111111111111111112',
-                'rate_limit': 20
-            },
-            'dexscreener': {
-                'name': 'DexScreener',
-                'base_url': 'https://api.dexscreener.com',
-                'headers': {},
-                'sol_mint': 'So11111111111111111111111111111111111111112',
-                'rate_limit': 300
-            }
-        }
-        
-        # 以太坊代币价格API配置
-        self.eth_api_sources = {
-            'coingecko_eth': {
-                'name': 'CoinGecko',
-                'base_url': 'https://api.coingecko.com/api/v3',
-                'headers': {},
-                'platform': 'ethereum'
-            },
-            'oneinch': {
-                'name': '1inch',
-                'base_url': 'https://api.1inch.dev',
-                'headers': {},
-                'platform': 'ethereum'
-            }
-        }
+        # 多API源配置：每个源的连接参数、批量大小、限流额度、支持的链和解析器见 source_registry
+        self.sources = default_sources()
         
         self.data_file = "token_price_history.csv"
+        self.comparison_file = "token_price_comparison.csv"
         
         # 从.env文件获取配置
         self.default_token_address = os.getenv('DEFAULT_TOKEN_ADDRESS')
         self.default_eth_token_address = os.getenv('DEFAULT_ETH_TOKEN_ADDRESS')
         self.preferred_apis = os.getenv('PREFERRED_APIS', 'jupiter,dexscreener,coingecko,solscan').split(',')
+        # 比值计算时另一侧代币所在的链（ethereum、base、bsc 等已注册的链）
+        self.compare_chain = os.getenv('COMPARE_CHAIN', 'ethereum').strip().lower()
+        
+        # 并发获取配置：同时向所有API源发请求，在总延迟预算内按优先级取结果
+        self.concurrent_fetch = os.getenv('CONCURRENT_FETCH', 'false').strip().lower() in ('1', 'true', 'yes')
+        self.fetch_budget = float(os.getenv('FETCH_BUDGET', '8'))  # 秒
+        self.fetch_workers = int(os.getenv('FETCH_WORKERS', '8'))
+        self._executor = None
+        self._request_deadline = threading.local()  # 并发任务所在线程的请求截止时间（monotonic）
+        
+        # 共识模式：并发查询所有源，按置信度/流动性加权取中位数，剔除偏离超过阈值的报价
+        self.consensus_mode = os.getenv('CONSENSUS_MODE', 'false').strip().lower() in ('1', 'true', 'yes')
+        self.consensus_max_deviation = float(os.getenv('CONSENSUS_MAX_DEVIATION', '0.05'))
+        self.consensus_min_sources = int(os.getenv('CONSENSUS_MIN_SOURCES', '2'))
         
-        # 缓存机制
+        # 批量追踪时每批处理的代币数（每批只获取一次SOL价格、写一次文件）
+        self.track_batch_size = int(os.getenv('TRACK_BATCH_SIZE', '30'))
+        
+        # 比值矩阵快照文件；设置阈值时只报告比值变化超过阈值的代币对，并追加到变化记录文件
+        self.ratio_matrix_file = os.getenv('RATIO_MATRIX_FILE', 'ratio_matrix.npz')
+        threshold = os.getenv('RATIO_MATRIX_THRESHOLD')
+        self.ratio_matrix_threshold = float(threshold) if threshold else None
+        self.ratio_matrix_moves_file = os.getenv('RATIO_MATRIX_MOVES_FILE', 'ratio_matrix_moves.csv')
+        
+        # HTTP连接池：每个API源一个长连接会话，429/5xx自动指数退避重试
+        self.http_pool = HttpSessionPool(
+            pool_connections=int(os.getenv('HTTP_POOL_CONNECTIONS', '4')),
+            pool_maxsize=int(os.getenv('HTTP_POOL_SIZE', '10')),
+            max_retries=int(os.getenv('HTTP_MAX_RETRIES', '3')),
+            backoff_factor=float(os.getenv('HTTP_BACKOFF', '0.5')),
+            respect_retry_after=os.getenv('HTTP_RESPECT_RETRY_AFTER', 'false').strip().lower() in ('1', 'true', 'yes')
+        )
+        
+        # 令牌桶限流：按 rate_limit 控制每个API源的请求速率（留出 RATE_LIMIT_HEADROOM 余量）
+        self.rate_limiter = RateLimiter(headroom=float(os.getenv('RATE_LIMIT_HEADROOM', '0.9')))
+        self.rate_limit_max_wait = float(os.getenv('RATE_LIMIT_MAX_WAIT', '30'))  # 单次请求最长排队时间（秒）
+        self.rate_limit_default_backoff = float(os.getenv('RATE_LIMIT_DEFAULT_BACKOFF', '30'))  # 429没有Retry-After时的暂停时间
+        for name, config in self.sources.items():
+            self.rate_limiter.configure(name, config.get('rate_limit'))
+        
+        # API源健康度：按延迟/成功率EWMA自适应排序回退顺序，连续失败的源熔断一段时间后再探测
+        self.adaptive_ranking = os.getenv('ADAPTIVE_RANKING', 'true').strip().lower() in ('1', 'true', 'yes')
+        self.source_health = SourceHealth(
+            alpha=float(os.getenv('HEALTH_EWMA_ALPHA', '0.2')),
+            failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3')),
+            cooldown=float(os.getenv('CIRCUIT_COOLDOWN', '60')),
+            max_cooldown=float(os.getenv('CIRCUIT_MAX_COOLDOWN', '600')),
+            path=os.getenv('SOURCE_HEALTH_PATH', 'source_health.json') or None
+        )
+        
+        # 运行指标：请求耗时、失败原因、缓存命中率、获取方法耗时和回退深度（Prometheus文本格式）
+        self.metrics = TrackerMetrics()
+        
+        # CoinGecko代币列表只为这些平台建立地址索引，默认为所有已注册链的平台（缓存键包含平台列表，修改配置后会重新下载）
+        self.coingecko_platforms = parse_platforms(os.getenv('COINGECKO_PLATFORMS'), default=coingecko_platforms())
+        self._missing_platforms = set()
+        self._coingecko_index_key = f"coingecko_platform_index:{','.join(sorted(self.coingecko_platforms))}"
+        
+        # 缓存机制：进程内字典作为一级缓存，持久化缓存（SQLite）作为二级缓存
         self._cache = {}
         self._cache_expiry = {}
-        self._cache_duration = 300  # 5分钟缓存
-        
-        # 初始化CSV文件
-        self._init_csv_file()
-    
-    def _init_csv_file(self):
-        """初始化CSV文件，如果不存在则创建表头"""
-        if not os.path.exists(self.data_file):
-            with open(self.data_file, 'w', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                writer.writerow([
-                    '时间戳', '代币地址', '代币名称', '代币符号', 
-                    'SOL价格(USD)', '代币价格(USD)', 'SOL/代币比值', 
-                    '代币/SOL比值', '数据源', '备注'
-                ])
-    
-    def _make_request(self, url: str, headers: dict = None, timeout: int = 10) -> Optional[requests.Response]:
-        """发送HTTP请求"""
+        self._cache_duration = 300  # 未归类的键使用5分钟缓存
+        # 缓存时长按键的类型设置（键中冒号前的部分，如 coingecko_price:solana 的类型为 coingecko_price），
+        # 每种类型归入价格类或元数据类。过期后在 stale 窗口内先返回旧值，同时在后台刷新一次
+        self._cache_policies = {
+            'sol': (int(os.getenv('SOL_QUOTE_TTL', '10')), int(os.getenv('SOL_QUOTE_STALE_TTL', '5'))),
+            'price': (int(os.getenv('PRICE_CACHE_TTL', '60')), int(os.getenv('PRICE_STALE_TTL', '30'))),
+            'metadata': (int(os.getenv('METADATA_CACHE_TTL', os.getenv('COIN_LIST_CACHE_TTL', '86400'))),
+                         int(os.getenv('METADATA_STALE_TTL', '604800'))),
+        }
+        self._cache_kinds = {
+            SOL_QUOTE_KEY: 'sol',
+            'coingecko_price': 'price',
+            'coingecko_platform_index': 'metadata',
+            TOKEN_METADATA_PREFIX.rstrip(':'): 'metadata',
+        }
+        # 进行中的请求（按缓存键合并相同请求）和后台刷新线程池
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._refresh_executor = None
+        self._persistent_cache = None
+        if os.getenv('CACHE_BACKEND', 'sqlite').strip().lower() == 'sqlite':
+            try:
+                self._persistent_cache = PersistentCache(
+                    os.getenv('CACHE_PATH', 'price_cache.db'),
+                    max_bytes=int(os.getenv('CACHE_MAX_MB', '64')) * 1024 * 1024
+                )
+            except Exception as e:
+                logger.warning("⚠️ 持久化缓存不可用，仅使用内存缓存: %s", e)
+        
+        # 历史记录存储：csv（默认）或 sqlite；记录先在内存中缓冲，按行数或时间间隔批量写出
+        self.history_store = open_history_store(
+            history_backend or os.getenv('HISTORY_BACKEND', 'csv'),
+            price_path=self.data_file,
+            comparison_path=self.comparison_file,
+            db_path=os.getenv('HISTORY_DB_PATH', 'price_history.db'),
+            flush_rows=int(os.getenv('HISTORY_FLUSH_ROWS', '100')),
+            flush_interval=float(os.getenv('HISTORY_FLUSH_INTERVAL', '5'))
+        )
+        
+        # 告警：新的价格和比值记录写入历史时按 ALERT_RULES 配置文件中的规则评估
+        self.alerts: Optional[AlertEngine] = None
+        alert_rules = os.getenv('ALERT_RULES')
+        if alert_rules:
+            self.enable_alerts(alert_rules)
+    
+    def enable_alerts(self, path: str):
+        """从配置文件加载告警规则，之后每条新的价格和比值记录都会经过告警评估"""
+        self.alerts = AlertEngine.from_config(load_alert_config(path), metrics=self.metrics,
+                                              cooldown=float(os.getenv('ALERT_COOLDOWN', '300')))
+        logger.info("🔔 已加载 %s 条告警规则，%s 个投递目标", len(self.alerts.rules), len(self.alerts.sinks))
+    
+    def flush_history(self):
+        """立即写出缓冲区中的历史记录"""
+        self.history_store.flush()
+    
+    def _source_for_url(self, url: str) -> str:
+        """根据URL匹配所属的API源（按base_url最长前缀匹配）"""
+        best_name, best_len = 'default', 0
+        for name, config in self.sources.items():
+            base_url = config['base_url']
+            if url.startswith(base_url) and len(base_url) > best_len:
+                best_name, best_len = name, len(base_url)
+        return best_name
+    
+    def _make_request(self, url: str, headers: dict = None, timeout: Optional[float] = None,
+                      source: Optional[str] = None, stream: bool = False) -> Optional[requests.Response]:
+        """
+        发送HTTP请求（通过该API源的连接池会话，超时默认取 sources 中的配置）
+        
+        5xx按指数退避重试（退避不超过剩余的延迟预算和 RATE_LIMIT_MAX_WAIT），每次重试前重新获取限流令牌；
+        连接失败由连接池重试，读取超时不重试；
+        stream=True 时不预先读取响应体，调用方用 iter_content 逐块读取并负责关闭响应
+        """
+        if source is None:
+            source = self._source_for_url(url)
+        if timeout is None:
+            timeout = self.sources.get(source, {}).get('timeout', 10)
+        if self._skip_source(source, url):
+            return None
+        max_retries = self.http_pool.max_retries
+        deadline = getattr(self._request_deadline, 'value', None)
+        start = time.perf_counter()
+        for attempt in range(max_retries + 1):
+            # 在并发任务中执行时，等待令牌和请求超时都不超过剩余的延迟预算
+            max_wait = self.rate_limit_max_wait
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.debug("⏱️ 已超出延迟预算，放弃请求 %s", url)
+                    return None
+                timeout = min(timeout, remaining)
+                max_wait = remaining if max_wait is None else min(max_wait, remaining)
+            # 每次尝试（包括重试）都要先获得令牌
+            if not self.rate_limiter.acquire(source, max_wait=max_wait):
+                self.metrics.observe_failure(source, 'rate_limited')
+                logger.warning("⏳ %s 已达到请求频率限制，跳过请求 %s", source, url)
+                return None
+            try:
+                # 连接失败由连接池重试；读取超时不重试（挂起的源重试只会成倍增加等待时间）
+                response = self.http_pool.get(source, url, headers=headers, timeout=timeout, stream=stream)
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                self.source_health.record(source, elapsed, ok=False)
+                self.metrics.observe_request(source, elapsed, reason=failure_reason(e))
+                logger.warning("请求失败 %s: %s", url, e)
+                return None
+            if response.status_code in RETRY_STATUS_CODES and attempt < max_retries:
+                delay = self._retry_backoff(attempt, response.headers.get('Retry-After'), deadline)
+                if delay is not None:
+                    response.close()
+                    self.http_pool.record_retry(source)
+                    time.sleep(delay)
+                    continue
+            break
+        elapsed = time.perf_counter() - start
+        self.source_health.record(source, elapsed, ok=not self._is_source_failure(response.status_code))
+        self.metrics.observe_request(source, elapsed, response.status_code)
+        if response.status_code == 429:
+            self._defer_source(source, response.headers.get('Retry-After'))
         try:
-            response = requests.get(url, headers=headers or {}, timeout=timeout)
             response.raise_for_status()
             return response
         except Exception as e:
-            print(f"请求失败 {url}: {e}")
+            response.close()
+            logger.warning("请求失败 %s: %s", url, e)
             return None
     
-    def _is_cache_valid(self, key: str) -> bool:
-        """检查缓存是否有效"""
-        return key in self._cache_expiry and time.time() < self._cache_expiry[key]
+    def _retry_backoff(self, attempt: int, retry_after: Optional[str] = None,
+                       deadline: Optional[float] = None) -> Optional[float]:
+        """
+        第 attempt 次重试前的退避秒数；超过 RATE_LIMIT_MAX_WAIT 或剩余的延迟预算（deadline）时
+        返回None，表示不再重试（Retry-After 可能要求等待很久）
+        """
+        delay = self.http_pool.retry_delay(attempt, retry_after)
+        limit = self.rate_limit_max_wait
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            limit = remaining if limit is None else min(limit, remaining)
+        if limit is not None and delay >= limit:
+            return None
+        return delay
+    
+    def _skip_source(self, source: str, url: str) -> bool:
+        """请求前检查：API源熔断中或因429暂停时直接跳过（调用方回退到下一个源）"""
+        if not self.source_health.allow(source):
+            self.metrics.observe_failure(source, 'circuit_open')
+            logger.warning("⛔ %s 熔断中，跳过请求 %s", source, url)
+            return True
+        deferred = self.rate_limiter.deferred(source)
+        if deferred > 0:
+            self.metrics.observe_failure(source, 'deferred')
+            logger.warning("⏳ %s 按 Retry-After 暂停中（剩余 %.0f 秒），跳过请求 %s", source, deferred, url)
+            return True
+        return False
+    
+    def _defer_source(self, source: str, retry_after: Optional[str]):
+        """收到429时按 Retry-After（默认 RATE_LIMIT_DEFAULT_BACKOFF 秒）推迟该源的后续请求"""
+        seconds = retry_after_seconds(retry_after)
+        if seconds is None:
+            seconds = self.rate_limit_default_backoff
+        self.rate_limiter.defer(source, seconds)
+        logger.warning("⏳ %s 返回429，%.0f 秒内暂停请求", source, seconds)
     
-    def _set_cache(self, key: str, value):
-        """设置缓存"""
+    @staticmethod
+    def _is_source_failure(status: int) -> bool:
+        """429和5xx说明API源本身异常；其他4xx（如代币不存在）不计入健康度失败"""
+        return status == 429 or status >= 500
+    
+    def print_http_stats(self):
+        """打印各API源的连接池与重试统计"""
+        stats = self.http_pool.stats()
+        if not stats:
+            print("📝 尚未发出HTTP请求")
+            return
+        
+        print("\n" + "="*80)
+        print("🔌 HTTP连接池统计")
+        print("="*80)
+        print(f"{'API源':<14}{'请求数':>8}{'重试':>8}{'失败':>8}{'新建连接':>10}{'复用连接':>10}{'平均耗时(ms)':>14}")
+        for source, item in stats.items():
+            print(f"{source:<14}{item['requests']:>8}{item['retries']:>8}{item['errors']:>8}"
+                  f"{item['connections']:>10}{item['reused']:>10}{item['avg_latency_ms']:>14.1f}")
+        
+        limiter_stats = self.rate_limiter.stats()
+        if any(item['acquired'] or item['rejected'] for item in limiter_stats.values()):
+            print(f"{'限流':<14}{'放行':>8}{'排队':>8}{'拒绝':>8}{'排队总时长(s)':>16}")
+            for source, item in limiter_stats.items():
+                if item['acquired'] or item['rejected']:
+                    print(f"{source:<14}{item['acquired']:>8}{item['throttled']:>8}"
+                          f"{item['rejected']:>8}{item['wait_time']:>16.2f}")
+            print("="*80)
+        
+        hit_ratio = self.metrics.cache_hit_ratio()
+        if hit_ratio is not None:
+            print(f"📦 缓存命中率: {hit_ratio:.1%}")
+        
+        health_stats = self.source_health.stats()
+        if health_stats:
+            print(f"{'健康度':<14}{'请求数':>8}{'失败':>8}{'成功率':>8}{'延迟(ms)':>10}{'熔断次数':>10}{'状态':>8}")
+            for source, item in health_stats.items():
+                latency = item['latency'] * 1000 if item['latency'] is not None else 0.0
+                state = '熔断' if item['open'] else '正常'
+                print(f"{source:<14}{item['requests']:>8}{item['errors']:>8}{item['success_rate']:>8.0%}"
+                      f"{latency:>10.1f}{item['trips']:>10}{state:>8}")
+            print("="*80)
+    
+    def _cache_policy(self, key: str) -> Tuple[float, float]:
+        """获取某个缓存键的 (有效期, 过期后可继续返回旧值的时长)"""
+        kind = self._cache_kinds.get(key.split(':', 1)[0])
+        if kind is None:
+            return self._cache_duration, 0
+        return self._cache_policies[kind]
+    
+    def _cache_ttl(self, key: str) -> float:
+        """获取某个缓存键的有效期"""
+        return self._cache_policy(key)[0]
+    
+    def _set_cache(self, key: str, value, ttl: Optional[float] = None,
+                   etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """设置缓存（同时写入持久化缓存）"""
+        if ttl is None:
+            ttl = self._cache_ttl(key)
         self._cache[key] = value
-        self._cache_expiry[key] = time.time() + self._cache_duration
+        self._cache_expiry[key] = time.time() + ttl
+        self.metrics.cache_writes.inc()
+        if self._persistent_cache:
+            try:
+                self._persistent_cache.set(key, value, ttl, etag=etag, last_modified=last_modified)
+            except Exception as e:
+                logger.warning("⚠️ 写入持久化缓存失败 %s: %s", key, e)
+    
+    def _lookup_cache(self, key: str) -> Tuple[Optional[object], bool]:
+        """
+        查询缓存，返回 (值, 是否新鲜)
+        
+        过期但仍在 stale 窗口内的值也会返回（是否新鲜为False），由调用方决定是否后台刷新
+        """
+        now = time.time()
+        stale_ttl = self._cache_policy(key)[1]
+        expires_at = self._cache_expiry.get(key)
+        if expires_at is not None and now < expires_at + stale_ttl:
+            fresh = now < expires_at
+            self.metrics.observe_cache('memory' if fresh else 'stale')
+            return self._cache[key], fresh
+        if self._persistent_cache:
+            try:
+                entry = self._persistent_cache.get_entry(key)
+            except Exception as e:
+                logger.warning("⚠️ 读取持久化缓存失败 %s: %s", key, e)
+                entry = None
+            if entry and now < entry['expires_at'] + stale_ttl:
+                self._cache[key] = entry['value']
+                self._cache_expiry[key] = entry['expires_at']
+                fresh = now < entry['expires_at']
+                self.metrics.observe_cache('persistent' if fresh else 'stale')
+                return entry['value'], fresh
+        self.metrics.observe_cache('miss')
+        return None, False
     
     def _get_cache(self, key: str):
-        """获取缓存"""
-        if self._is_cache_valid(key):
-            return self._cache[key]
-        return None
+        """获取未过期的缓存（内存未命中时读取持久化缓存）"""
+        value, fresh = self._lookup_cache(key)
+        return value if fresh else None
     
-    def get_sol_price_jupiter(self) -> Optional[float]:
-        """通过Jupiter API获取SOL价格"""
+    def _coalesce(self, key: str, fn: Callable):
+        """
+        合并相同缓存键的并发请求：同一时刻只有一个线程执行 fn，其余线程等待并共享其结果
+        """
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            self.metrics.cache_coalesced.inc()
+            return future.result()
+        
         try:
-            sol_mint = self.api_sources['jupiter']['sol_mint']
-            url = f"{self.api_sources['jupiter']['base_url']}/v4/price?ids={sol_mint}"
-            
-            response = self._make_request(url, self.api_sources['jupiter']['headers'])
-            if not response:
-                return None
-            
-            data = response.json()
-            if 'data' in data and sol_mint in data['data']:
-                return float(data['data'][sol_mint]['price'])
-            return None
-        except Exception as e:
-            print(f"Jupiter API获取SOL价格失败: {e}")
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+    
+    def _refresh_in_background(self, key: str, fn: Callable):
+        """在后台线程刷新过期的缓存值（该键已有请求进行中时不再重复发起）"""
+        with self._inflight_lock:
+            if key in self._inflight:
+                return
+            # 多个线程可能同时发现过期缓存，在锁内创建线程池，保证只创建一个
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(max_workers=int(os.getenv('CACHE_REFRESH_WORKERS', '2')),
+                                                            thread_name_prefix='cache-refresh')
+        
+        def refresh():
+            try:
+                value = self._coalesce(key, fn)
+            except Exception as e:
+                value = None
+                logger.warning("⚠️ 后台刷新缓存失败 %s: %s", key, e)
+            self.metrics.cache_refreshes.inc('ok' if value is not None else 'failed')
+        
+        logger.debug("📦 使用过期缓存 %s，后台刷新", key)
+        self._refresh_executor.submit(refresh)
+    
+    def _cached(self, key: str, fetch: Callable):
+        """
+        stale-while-revalidate：缓存新鲜时直接返回；过期但在 stale 窗口内时返回旧值并在后台刷新；
+        否则调用 fetch（由它负责写入缓存），同一缓存键的并发调用合并为一次
+        """
+        value, fresh = self._lookup_cache(key)
+        if value is not None:
+            if not fresh:
+                self._refresh_in_background(key, fetch)
+            return value
+        return self._coalesce(key, fetch)
+    
+    def _fetch_json_cached(self, url: str, cache_key: str, headers: dict = None,
+                           timeout: int = 10, transform: Optional[Callable] = None,
+                           stream_parser: Optional[Callable] = None):
+        """获取JSON数据并缓存（stale-while-revalidate，参数含义见 _request_json_cached）"""
+        return self._cached(cache_key, lambda: self._request_json_cached(url, cache_key, headers, timeout,
+                                                                         transform, stream_parser))
+    
+    def _request_json_cached(self, url: str, cache_key: str, headers: dict = None,
+                             timeout: int = 10, transform: Optional[Callable] = None,
+                             stream_parser: Optional[Callable] = None):
+        """
+        请求JSON数据并写入缓存，已有缓存条目时用 ETag / Last-Modified 做条件请求重新验证
+        
+        服务器返回304时直接延长旧值的有效期，不再下载和解析响应体。
+        transform 用于在缓存前把原始JSON转换为需要保存的结构；
+        stream_parser 为增量解析器工厂（返回带 feed(chunk) / close() 的对象），
+        指定时边下载边解析，不在内存中保留完整的响应文本和JSON结构。
+        """
+        ttl = self._cache_ttl(cache_key)
+        entry = None
+        request_headers = dict(headers or {})
+        if self._persistent_cache:
+            try:
+                entry = self._persistent_cache.get_entry(cache_key)
+            except Exception:
+                entry = None
+            if entry:
+                if entry['etag']:
+                    request_headers['If-None-Match'] = entry['etag']
+                if entry['last_modified']:
+                    request_headers['If-Modified-Since'] = entry['last_modified']
+        
+        response = self._make_request(url, request_headers, timeout=timeout, stream=stream_parser is not None)
+        if not response:
             return None
+        
+        if response.status_code == 304 and entry:
+            response.close()
+            self.metrics.cache_revalidations.inc('not_modified')
+            self._cache[cache_key] = entry['value']
+            self._cache_expiry[cache_key] = time.time() + ttl
+            self._persistent_cache.touch(cache_key, ttl)
+            return entry['value']
+        
+        if entry and (entry['etag'] or entry['last_modified']):
+            self.metrics.cache_revalidations.inc('modified')
+        if stream_parser:
+            parser = stream_parser()
+            with response:
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    parser.feed(chunk)
+            value = parser.close()
+        else:
+            value = response.json()
+        if transform:
+            value = transform(value)
+        self._set_cache(cache_key, value, ttl=ttl,
+                        etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified'))
+        return value
     
-    def get_sol_price_dexscreener(self) -> Optional[float]:
-        """通过DexScreener API获取SOL价格"""
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取并发请求使用的线程池（惰性创建，多次调用共享；多个线程同时首次调用时只创建一个）"""
+        with self._inflight_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.fetch_workers,
+                                                    thread_name_prefix='price-fetch')
+            return self._executor
+    
+    def _sol_price_fetchers(self) -> Dict[str, Callable[[], Optional[float]]]:
+        """各API源获取SOL价格的方法"""
+        return {
+            'jupiter': self.get_sol_price_jupiter,
+            'dexscreener': self.get_sol_price_dexscreener,
+            'coingecko': self.get_sol_price_coingecko,
+        }
+    
+    def _token_price_fetchers(self, chain: str = SOLANA) -> Dict[str, Callable[[str], Optional[Quote]]]:
+        """支持该链的各API源获取单个代币价格的方法"""
+        return {
+            api_name: (lambda token_address, api_name=api_name: self.get_token_price(api_name, token_address, chain))
+            for api_name, config in self.sources.items() if supports_chain(config, chain)
+        }
+    
+    def _token_price_batch_fetchers(self, chain: str = SOLANA) -> Dict[str, Callable[[List[str]], Dict[str, Quote]]]:
+        """支持该链的各API源批量获取代币价格的方法"""
+        return {
+            api_name: (lambda token_addresses, api_name=api_name: self.get_token_prices(api_name, token_addresses, chain))
+            for api_name, config in self.sources.items() if supports_chain(config, chain)
+        }
+    
+    def _race_fetchers(self, jobs: List[Tuple[str, str, Callable]], orders: Dict[str, List[str]],
+                       budget: float, wait_all: bool = False) -> Dict[str, Dict[str, object]]:
+        """
+        并发执行一组获取任务，返回 {类别: {API源: 结果}}
+        
+        jobs 为 (类别, API源, 无参可调用对象) 列表，orders 为每个类别的优先级顺序。
+        wait_all 为 False 时，一旦每个类别都有"优先级更高的源均已失败"的成功结果就提前返回；
+        否则等待所有任务完成。无论哪种方式都不会超过 budget 秒。
+        返回时尚未开始的任务被取消；已开始的任务中的请求以 budget 为截止时间
+        （超时时间不超过剩余预算，截止后不再重试），不会长时间占用线程池，其结果被丢弃。
+        """
+        results = {kind: {} for kind in orders}
+        futures = {}
+        executor = self._get_executor()
+        deadline = time.monotonic() + budget
+        for kind, api_name, fn in jobs:
+            futures[executor.submit(self._run_before_deadline, deadline, fn)] = (kind, api_name)
+        
+        def resolved(kind: str) -> bool:
+            for api_name in orders[kind]:
+                if api_name not in results[kind]:
+                    return False  # 更高优先级的源还没有返回
+                if results[kind][api_name]:
+                    return True
+            return True  # 所有源都已返回（均失败）
+        
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, api_name = futures[future]
+                try:
+                    results[kind][api_name] = future.result()
+                except Exception as e:
+                    logger.warning("❌ %s API失败: %s", api_name, e)
+                    results[kind][api_name] = None
+            if not wait_all and all(resolved(kind) for kind in orders):
+                break
+        
+        for future in pending:
+            future.cancel()
+        if pending and time.monotonic() >= deadline:
+            logger.warning("⏱️ 超出延迟预算 %.1fs，忽略 %s 个未完成的请求", budget, len(pending))
+        return results
+    
+    def _run_before_deadline(self, deadline: float, fn: Callable):
+        """在线程池中执行任务，任务内的请求以 deadline 为截止时间（见 _make_request）"""
+        self._request_deadline.value = deadline
         try:
-            sol_mint = self.api_sources['dexscreener']['sol_mint']
-            url = f"{self.api_sources['dexscreener']['base_url']}/latest/dex/tokens/{sol_mint}"
-            
-            response = self._make_request(url, self.api_sources['dexscreener']['headers'])
-            if not response:
-                return None
-            
-            data = response.json()
-            if 'pairs' in data and len(data['pairs']) > 0:
-                # 取第一个交易对的价格
-                return float(data['pairs'][0]['priceUsd'])
+            return fn()
+        finally:
+            self._request_deadline.value = None
+    
+    @staticmethod
+    def _pick_by_priority(results: Dict[str, object], order: List[str]) -> Tuple[Optional[str], object]:
+        """按优先级顺序选出第一个成功的结果"""
+        for api_name in order:
+            value = results.get(api_name)
+            if value:
+                return api_name, value
+        return None, None
+    
+    def _active_apis(self, chain: str = SOLANA) -> List[str]:
+        """
+        返回已配置且支持该链的API源（开启 ADAPTIVE_RANKING 时按健康度排序）
+        
+        Solana 按 PREFERRED_APIS（或 --apis）排序，其他链按 PREFERRED_APIS_<链> 或注册表中该链的默认顺序
+        """
+        preferred = self.preferred_apis
+        if chain != SOLANA:
+            configured = os.getenv(f'PREFERRED_APIS_{chain.upper()}')
+            preferred = configured.split(',') if configured else default_chain_apis(chain)
+        apis = []
+        for api_name in preferred:
+            api_name = api_name.strip().lower()
+            if api_name in self.sources and supports_chain(self.sources[api_name], chain) and api_name not in apis:
+                apis.append(api_name)
+        return self._rank_apis(apis)
+    
+    def _rank_apis(self, apis: List[str]) -> List[str]:
+        """按观测到的延迟和成功率重新排列API源，熔断中的源排在最后"""
+        if not self.adaptive_ranking:
+            return apis
+        return self.source_health.rank(apis)
+    
+    @staticmethod
+    def _fetch_kind(chain: str, batch: bool = False) -> str:
+        """指标中的获取类别：Solana代币为 token / token_batch，其他链加上链名前缀（如 base_token）"""
+        kind = 'token' if chain == SOLANA else f'{chain}_token'
+        return f'{kind}_batch' if batch else kind
+    
+    def get_all_api_prices(self, token_address: str, budget: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        并发向所有已配置的API源查询SOL价格和代币价格，在延迟预算内返回所有结果
+        
+        返回 {API源: {'sol_price': float或None, 'token_info': Quote或None}}，按优先级顺序排列
+        """
+        apis = self._active_apis()
+        results = self._race_fetchers(self._price_jobs(token_address, apis), {'sol': apis, 'token': apis},
+                                      self.fetch_budget if budget is None else budget, wait_all=True)
+        return self._collect_all_prices(results, apis)
+    
+    def _price_jobs(self, token_address: str, apis: List[str],
+                    include_sol: bool = True) -> List[Tuple[str, str, Callable]]:
+        """为每个API源生成SOL价格和代币价格两个获取任务（include_sol 为False时只生成代币价格任务）"""
+        sol_fetchers = self._sol_price_fetchers()
+        token_fetchers = self._token_price_fetchers()
+        jobs = []
+        for api_name in apis:
+            if include_sol and api_name in sol_fetchers:
+                jobs.append(('sol', api_name, sol_fetchers[api_name]))
+            jobs.append(('token', api_name, lambda f=token_fetchers[api_name]: f(token_address)))
+        return jobs
+    
+    @staticmethod
+    def _collect_all_prices(results: Dict[str, Dict[str, object]], apis: List[str]) -> Dict[str, Dict]:
+        return {
+            api_name: {
+                'sol_price': results['sol'].get(api_name),
+                'token_info': results['token'].get(api_name)
+            }
+            for api_name in apis
+        }
+    
+    def _pick_prices(self, results: Dict[str, Dict[str, object]], apis: List[str],
+                     sol_quote: Optional[Dict] = None) -> Tuple[Optional[float], Optional[Quote], str]:
+        """
+        按优先级从并发结果中选出SOL价格和代币价格，并生成数据源说明
+        
+        sol_quote 为已缓存的SOL报价（此时并发任务中没有SOL价格）；否则把选出的SOL价格写入共享报价缓存
+        """
+        if sol_quote is None:
+            sol_api, sol_price = self._pick_by_priority(results['sol'], apis)
+            if sol_api:
+                sol_quote = self._store_sol_quote(sol_price, self.sources[sol_api]['name'])
+        token_api, token_info = self._pick_by_priority(results['token'], apis)
+        
+        sol_price, sol_source = (sol_quote['price'], sol_quote['source']) if sol_quote else (None, None)
+        used_source = self._source_label(self.sources[token_api]['name'] if token_api else None, sol_source)
+        if sol_price and token_info:
+            logger.info("✅ 成功使用 %s 获取价格数据", used_source)
+        return sol_price, token_info, used_source
+    
+    @staticmethod
+    def _source_label(token_source: Optional[str], sol_source: Optional[str]) -> str:
+        """数据源说明：代币价格来源，SOL价格来自其他源时附加在括号中"""
+        if token_source:
+            if sol_source and sol_source != token_source:
+                return f"{token_source}(SOL: {sol_source})"
+            return token_source
+        return sol_source or "未知"
+    
+    def _quote_weight(self, config: Dict, token_info: Optional[Quote] = None) -> float:
+        """报价权重：API源置信度 × 交易对流动性系数（仅对带流动性信息的报价）"""
+        weight = config.get('confidence', 1.0)
+        if token_info:
+            weight *= liquidity_factor(token_info.liquidity)
+        return weight
+    
+    def _consensus(self, quotes: Dict[str, Tuple[float, float]]) -> Optional[Dict]:
+        """按当前配置计算共识（quotes 为 {数据源名称: (价格, 权重)}）"""
+        return build_consensus(quotes, self.consensus_max_deviation, self.consensus_min_sources)
+    
+    def _consensus_sol_price(self, sol_prices: Dict[str, Optional[float]]) -> Optional[float]:
+        """对各源的SOL价格取共识"""
+        consensus = self._consensus({
+            self.sources[api_name]['name']: (price, self._quote_weight(self.sources[api_name]))
+            for api_name, price in sol_prices.items() if price
+        })
+        if not consensus:
             return None
-        except Exception as e:
-            print(f"DexScreener API获取SOL价格失败: {e}")
+        if consensus['rejected']:
+            logger.warning("⚠️ SOL价格%s", describe_consensus(consensus))
+        return consensus['price']
+    
+    def _consensus_token_info(self, token_infos: Dict[str, Optional[Quote]],
+                              chain: str = SOLANA) -> Optional[Quote]:
+        """
+        对各源的代币报价取共识，返回代币信息（价格为共识价格）
+        
+        名称和符号取自参与共识的权重最高的源，consensus 字段记录各源报价、剔除的源和价差
+        """
+        # 按优先级排列，使共识说明中的源顺序与完成先后无关
+        order = {api_name: i for i, api_name in enumerate(self._active_apis(chain))}
+        infos = {api_name: info for api_name, info in sorted(token_infos.items(), key=lambda item: order.get(item[0], len(order)))
+                 if info and info.price}
+        if not infos:
             return None
+        weights = {api_name: self._quote_weight(self.sources[api_name], info) for api_name, info in infos.items()}
+        consensus = self._consensus({
+            self.sources[api_name]['name']: (info.price, weights[api_name]) for api_name, info in infos.items()
+        })
+        if not consensus:
+            return None
+        
+        accepted = [api_name for api_name in infos if self.sources[api_name]['name'] in consensus['sources']]
+        # 优先选用带有真实名称的报价（1inch只返回价格）
+        best = max(accepted, key=lambda api_name: (infos[api_name].has_name, weights[api_name]))
+        return infos[best].replace(price=consensus['price'], source='共识(' + ', '.join(consensus['sources']) + ')',
+                                   consensus=consensus)
     
-    def get_sol_price_coingecko(self) -> Optional[float]:
-        """通过CoinGecko API获取SOL价格"""
+    def _consensus_prices(self, results: Dict[str, Dict[str, object]],
+                          apis: List[str]) -> Tuple[Optional[float], Optional[Quote], str]:
+        """从并发结果中计算SOL价格和代币价格的共识"""
+        sol_price = self._consensus_sol_price(results['sol'])
+        token_info = self._consensus_token_info(results['token'])
+        if not token_info:
+            return sol_price, None, "未知"
+        
+        consensus = token_info.consensus
+        for source, price in consensus['quotes'].items():
+            mark = "❌" if source in consensus['rejected'] else "✅"
+            logger.info("   %s %-12s $%.8f", mark, source, price)
+        logger.info("🤝 %s → $%.8f", describe_consensus(consensus), token_info.price)
+        return sol_price, token_info, token_info.source
+    
+    def get_consensus_prices(self, token_address: str,
+                             budget: Optional[float] = None) -> Tuple[Optional[float], Optional[Quote], str]:
+        """共识模式：在延迟预算内并发查询所有API源，返回加权中位数价格（剔除异常报价）"""
+        apis = self._active_apis()
+        budget = self.fetch_budget if budget is None else budget
+        logger.info("🤝 共识模式：并发查询 %s 个API源（预算 %.1fs）...", len(apis), budget)
+        results = self._race_fetchers(self._price_jobs(token_address, apis),
+                                      {'sol': apis, 'token': apis}, budget, wait_all=True)
+        return self._consensus_prices(results, apis)
+    
+    def _get_multi_api_prices_concurrent(self, token_address: str,
+                                         budget: float) -> Tuple[Optional[float], Optional[Quote], str]:
+        """并发模式：同时查询所有源，按优先级选出SOL价格和代币价格（SOL报价已缓存时只查询代币价格）"""
+        apis = self._active_apis()
+        logger.info("⚡ 并发查询 %s 个API源（预算 %.1fs）...", len(apis), budget)
+        
+        sol_quote = self._cached_sol_quote()
+        orders = {'token': apis} if sol_quote else {'sol': apis, 'token': apis}
+        results = self._race_fetchers(self._price_jobs(token_address, apis, include_sol=sol_quote is None),
+                                      orders, budget)
+        return self._pick_prices(results, apis, sol_quote)
+    
+    # ---------- CoinGecko的URL与SOL价格解析（各链的批量价格URL和解析器见 source_registry） ----------
+    
+    def _coingecko_list_url(self) -> str:
+        return f"{self.sources['coingecko']['base_url']}/coins/list?include_platform=true"
+    
+    def _coingecko_price_url(self, coin_ids: List[str]) -> str:
+        return f"{self.sources['coingecko']['base_url']}/simple/price?ids={','.join(coin_ids)}&vs_currencies=usd"
+    
+    def _coingecko_market_chart_url(self, coin_id: str, start: float, end: float) -> str:
+        return (f"{self.sources['coingecko']['base_url']}/coins/{coin_id}/market_chart/range"
+                f"?vs_currency=usd&from={int(start)}&to={int(end)}")
+    
+    def _sol_price_url(self, api_name: str) -> str:
+        """Jupiter / DexScreener 查询SOL价格的URL（即wSOL的单个代币请求）"""
+        source = self.sources[api_name]
+        build = jupiter_price_url if api_name == 'jupiter' else dexscreener_tokens_url
+        return build(source, source_chain_id(source, SOLANA), [source['sol_mint']])
+    
+    def _parse_sol_price_jupiter(self, data: Dict) -> Optional[float]:
+        sol_mint = self.sources['jupiter']['sol_mint']
+        if 'data' in data and sol_mint in data['data']:
+            return float(data['data'][sol_mint]['price'])
+        return None
+    
+    @staticmethod
+    def _parse_sol_price_dexscreener(data: Dict) -> Optional[float]:
+        if 'pairs' in data and data['pairs']:
+            # 取第一个交易对的价格
+            return float(data['pairs'][0]['priceUsd'])
+        return None
+    
+    @staticmethod
+    def _parse_sol_price_coingecko(data: Dict) -> Optional[float]:
+        if 'solana' in data and 'usd' in data['solana']:
+            return float(data['solana']['usd'])
+        return None
+    
+    @staticmethod
+    def _parse_market_chart(data: Dict, start: float, end: float) -> List[Tuple[float, float]]:
+        """解析market_chart响应，返回时间区间 [start, end) 内按时间排序的 [(时间戳, 价格)]"""
+        series = []
+        for ms, price in data.get('prices') or []:
+            ts = ms / 1000
+            if price is not None and start <= ts < end:
+                series.append((ts, float(price)))
+        series.sort()
+        return series
+    
+    def _tag_chain(self, quotes: Dict[str, Quote], chain: str) -> Dict[str, Quote]:
+        """非Solana链的报价标记所在的链（platform 字段）"""
+        if chain != SOLANA:
+            for quote in quotes.values():
+                quote.platform = chain
+        return quotes
+    
+    def _coingecko_platform_index(self, index: Dict, chain: str) -> Dict[str, Dict]:
+        """取出某条链在CoinGecko地址索引中的部分（平台不在 COINGECKO_PLATFORMS 中时提示一次）"""
+        platform = source_chain_id(self.sources['coingecko'], chain)
+        if platform not in index and platform not in self._missing_platforms:
+            self._missing_platforms.add(platform)
+            logger.warning("⚠️ CoinGecko地址索引不包含平台 %s，请把它加入 COINGECKO_PLATFORMS", platform)
+        return index.get(platform, {})
+    
+    # ---------- 同步获取方法 ----------
+    
+    @instrument_fetch('coingecko', 'history')
+    def get_market_chart_coingecko(self, coin_id: str, start: float, end: float) -> Optional[List[Tuple[float, float]]]:
+        """
+        通过CoinGecko获取币种在时间区间内的历史价格（区间不超过90天时为小时级数据）
+        
+        返回 [(时间戳, 价格)]，请求失败时返回None（与没有数据的空列表区分）
+        """
         try:
-            url = f"{self.api_sources['coingecko']['base_url']}/simple/price?ids=solana&vs_currencies=usd"
-            
-            response = self._make_request(url, self.api_sources['coingecko']['headers'])
+            response = self._make_request(self._coingecko_market_chart_url(coin_id, start, end),
+                                          self.sources['coingecko']['headers'])
             if not response:
                 return None
-            
-            data = response.json()
-            if 'solana' in data and 'usd' in data['solana']:
-                return float(data['solana']['usd'])
-            return None
+            return self._parse_market_chart(response.json(), start, end)
         except Exception as e:
-            print(f"CoinGecko API获取SOL价格失败: {e}")
+            logger.warning("CoinGecko API获取历史价格失败 %s: %s", coin_id, e)
             return None
     
-    def get_token_price_jupiter(self, token_address: str) -> Optional[Dict]:
-        """通过Jupiter API获取代币价格"""
+    @instrument_fetch('jupiter', 'sol')
+    def get_sol_price_jupiter(self) -> Optional[float]:
+        """通过Jupiter API获取SOL价格"""
         try:
-            url = f"{self.api_sources['jupiter']['base_url']}/v4/price?ids={token_address}"
-            
-            response = self._make_request(url, self.api_sources['jupiter']['headers'])
+            response = self._make_request(self._sol_price_url('jupiter'), self.sources['jupiter']['headers'])
             if not response:
                 return None
-            
-            data = response.json()
-            if 'data' in data and token_address in data['data']:
-                token_data = data['data'][token_address]
-                return {
-                    'price': float(token_data['price']),
-                    'name': token_data.get('symbol', 'Unknown'),
-                    'symbol': token_data.get('symbol', 'UNK'),
-                    'source': 'Jupiter'
-                }
-            return None
+            return self._parse_sol_price_jupiter(response.json())
         except Exception as e:
-            print(f"Jupiter API获取代币价格失败: {e}")
+            logger.warning("Jupiter API获取SOL价格失败: %s", e)
             return None
     
-    def get_token_price_dexscreener(self, token_address: str) -> Optional[Dict]:
-        """通过DexScreener API获取代币价格"""
+    @instrument_fetch('dexscreener', 'sol')
+    def get_sol_price_dexscreener(self) -> Optional[float]:
+        """通过DexScreener API获取SOL价格"""
         try:
-            url = f"{self.api_sources['dexscreener']['base_url']}/latest/dex/tokens/{token_address}"
-            
-            response = self._make_request(url, self.api_sources['dexscreener']['headers'])
+            response = self._make_request(self._sol_price_url('dexscreener'), self.sources['dexscreener']['headers'])
             if not response:
                 return None
-            
-            data = response.json()
-            if 'pairs' in data and len(data['pairs']) > 0:
-                # 选择流动性最高的交易对
-                best_pair = max(data['pairs'], key=lambda x: float(x.get('liquidity', {}).get('usd', 0)))
-                
-                return {
-                    'price': float(best_pair['priceUsd']),
-                    'name': best_pair['baseToken']['name'],
-                    'symbol': best_pair['baseToken']['symbol'],
-                    'source': 'DexScreener'
-                }
-            return None
+            return self._parse_sol_price_dexscreener(response.json())
         except Exception as e:
-            print(f"DexScreener API获取代币价格失败: {e}")
+            logger.warning("DexScreener API获取SOL价格失败: %s", e)
             return None
     
-    def get_token_info_coingecko(self, token_address: str) -> Optional[Dict]:
-        """通过CoinGecko API获取代币信息"""
+    @instrument_fetch('coingecko', 'sol')
+    def get_sol_price_coingecko(self) -> Optional[float]:
+        """通过CoinGecko API获取SOL价格"""
         try:
-            # 先尝试从缓存获取完整的代币列表
-            cache_key = "coingecko_token_list"
-            coins = self._get_cache(cache_key)
-            
-            if not coins:
-                url = f"{self.api_sources['coingecko']['base_url']}/coins/list?include_platform=true"
-                response = self._make_request(url, self.api_sources['coingecko']['headers'], timeout=20)
-                if not response:
-                    return None
-                
-                coins = response.json()
-                self._set_cache(cache_key, coins)
-                print("✅ 获取CoinGecko代币列表并缓存")
-            else:
-                print("📦 使用缓存的CoinGecko代币列表")
-            
-            # 查找匹配的Solana代币
-            for coin in coins:
-                if 'platforms' in coin and coin['platforms']:
-                    solana_address = coin['platforms'].get('solana')
-                    if solana_address and solana_address.lower() == token_address.lower():
-                        # 获取价格
-                        price_url = f"{self.api_sources['coingecko']['base_url']}/simple/price?ids={coin['id']}&vs_currencies=usd"
-                        price_response = self._make_request(price_url, self.api_sources['coingecko']['headers'])
-                        
-                        if price_response:
-                            price_data = price_response.json()
-                            if coin['id'] in price_data:
-                                return {
-                                    'price': float(price_data[coin['id']]['usd']),
-                                    'name': coin['name'],
-                                    'symbol': coin['symbol'],
-                                    'source': 'CoinGecko'
-                                }
-            return None
+            data = self._get_coingecko_simple_prices(['solana'])
+            if not data:
+                return None
+            return self._parse_sol_price_coingecko(data)
         except Exception as e:
-            print(f"CoinGecko API获取代币信息失败: {e}")
+            logger.warning("CoinGecko API获取SOL价格失败: %s", e)
             return None
     
-    def get_eth_token_price_coingecko(self, eth_token_address: str) -> Optional[Dict]:
-        """通过CoinGecko API获取以太坊代币价格"""
+    def _coingecko_index_parser(self) -> CoinListIndexBuilder:
+        """
+        为 /coins/list?include_platform=true 创建增量解析器
+        
+        只保留 COINGECKO_PLATFORMS 中的平台，得到 {平台: {小写合约地址: {'id', 'name', 'symbol'}}}
+        """
+        return CoinListIndexBuilder(self.coingecko_platforms)
+    
+    def _get_coingecko_index(self) -> Optional[Dict[str, Dict[str, Dict]]]:
+        """获取CoinGecko平台地址索引（元数据类缓存，所有链共享同一份索引）"""
+        return self._fetch_json_cached(self._coingecko_list_url(), self._coingecko_index_key,
+                                       self.sources['coingecko']['headers'],
+                                       timeout=20, stream_parser=self._coingecko_index_parser)
+    
+    def _get_coingecko_simple_prices(self, coin_ids: List[str]) -> Optional[Dict]:
+        """查询CoinGecko simple/price（价格类缓存，按 PRICE_CACHE_TTL 减少对限频接口的请求）"""
+        return self._fetch_json_cached(self._coingecko_price_url(coin_ids), f"coingecko_price:{','.join(coin_ids)}",
+                                       self.sources['coingecko']['headers'])
+    
+    @staticmethod
+    def _chunks(items: List[str], size: int) -> List[List[str]]:
+        """按指定大小切分列表"""
+        size = max(1, size)
+        return [items[i:i + size] for i in range(0, len(items), size)]
+    
+    def _match_coingecko_coins(self, index: Dict, chain: str, token_addresses: List[str]) -> Dict[str, Dict]:
+        """在索引中匹配某条链上的一组合约地址，返回 {代币地址: 币种信息}"""
+        platform_index = self._coingecko_platform_index(index, chain)
+        matched = {}
+        for token_address in token_addresses:
+            coin = platform_index.get(token_address.lower())
+            if coin:
+                matched[token_address] = coin
+        return matched
+    
+    def get_token_prices(self, api_name: str, token_addresses: List[str], chain: str = SOLANA) -> Dict[str, Quote]:
+        """
+        通过指定API源批量获取某条链上的代币价格，返回 {代币地址: 报价}
+        
+        地址按该源的 batch_size 分块请求；CoinGecko先在代币列表索引中把地址映射为币种ID
+        """
+        start = time.perf_counter()
+        kind = self._fetch_kind(chain, batch=len(token_addresses) > 1)
         try:
-            # 先尝试从缓存获取完整的代币列表
-            cache_key = "coingecko_token_list"
-            coins = self._get_cache(cache_key)
-            
-            if not coins:
-                url = f"{self.api_sources['coingecko']['base_url']}/coins/list?include_platform=true"
-                response = self._make_request(url, self.api_sources['coingecko']['headers'], timeout=20)
-                if not response:
-                    return None
-                
-                coins = response.json()
-                self._set_cache(cache_key, coins)
-                print("✅ 获取CoinGecko代币列表并缓存")
+            if self.sources[api_name].get('coin_index'):
+                results = self._get_coingecko_prices(token_addresses, chain)
             else:
-                print("📦 使用缓存的CoinGecko代币列表")
-            
-            # 查找匹配的以太坊代币
-            for coin in coins:
-                if 'platforms' in coin and coin['platforms']:
-                    ethereum_address = coin['platforms'].get('ethereum')
-                    if ethereum_address and ethereum_address.lower() == eth_token_address.lower():
-                        # 获取价格
-                        price_url = f"{self.api_sources['coingecko']['base_url']}/simple/price?ids={coin['id']}&vs_currencies=usd"
-                        price_response = self._make_request(price_url, self.api_sources['coingecko']['headers'])
-                        
-                        if price_response:
-                            price_data = price_response.json()
-                            if coin['id'] in price_data:
-                                return {
-                                    'price': float(price_data[coin['id']]['usd']),
-                                    'name': coin['name'],
-                                    'symbol': coin['symbol'],
-                                    'source': 'CoinGecko',
-                                    'platform': 'ethereum'
-                                }
-            return None
-        except Exception as e:
-            print(f"CoinGecko API获取以太坊代币信息失败: {e}")
-            return None
+                results = self._get_source_prices(api_name, token_addresses, chain)
+        except Exception:
+            self.metrics.observe_fetch(api_name, kind, time.perf_counter() - start, 'error')
+            raise
+        self.metrics.observe_fetch(api_name, kind, time.perf_counter() - start, 'ok' if results else 'empty')
+        return self._tag_chain(results, chain)
+    
+    def get_token_price(self, api_name: str, token_address: str, chain: str = SOLANA) -> Optional[Quote]:
+        """通过指定API源获取单个代币的价格"""
+        return self.get_token_prices(api_name, [token_address], chain).get(token_address)
+    
+    # 按API源命名的旧接口，保留给已有调用方；异步追踪器上返回可 await 的协程
     
-    def get_eth_token_price_1inch(self, eth_token_address: str) -> Optional[Dict]:
+    def get_token_price_jupiter(self, token_address: str) -> Optional[Quote]:
+        """通过Jupiter API获取代币价格"""
+        return self.get_token_price('jupiter', token_address)
+    
+    def get_token_price_dexscreener(self, token_address: str) -> Optional[Quote]:
+        """通过DexScreener API获取代币价格"""
+        return self.get_token_price('dexscreener', token_address)
+    
+    def get_token_info_coingecko(self, token_address: str) -> Optional[Quote]:
+        """通过CoinGecko API获取代币价格"""
+        return self.get_token_price('coingecko', token_address)
+    
+    def get_eth_token_price_coingecko(self, eth_token_address: str) -> Optional[Quote]:
+        """通过CoinGecko API获取以太坊代币价格"""
+        return self.get_token_price('coingecko', eth_token_address, 'ethereum')
+    
+    def get_eth_token_price_1inch(self, eth_token_address: str) -> Optional[Quote]:
         """通过1inch API获取以太坊代币价格"""
+        return self.get_token_price('oneinch', eth_token_address, 'ethereum')
+    
+    def _get_source_prices(self, api_name: str, token_addresses: List[str], chain: str) -> Dict[str, Quote]:
+        """按API源声明的批量URL和解析器逐块请求"""
+        source = self.sources[api_name]
+        chain_id = source_chain_id(source, chain)
+        results = {}
+        for chunk in self._chunks(token_addresses, source.get('batch_size', 1)):
+            try:
+                response = self._make_request(source['price_url'](source, chain_id, chunk), source['headers'])
+                if response:
+                    results.update(source['parser'](response.json(), chain_id, chunk))
+            except Exception as e:
+                logger.warning("%s API获取%s代币价格失败: %s", source['name'], chain_name(chain), e)
+        return results
+    
+    def _get_coingecko_prices(self, token_addresses: List[str], chain: str) -> Dict[str, Quote]:
+        """通过CoinGecko批量获取代币价格（simple/price的ids逗号分隔）"""
+        source = self.sources['coingecko']
+        results = {}
         try:
-            # 1inch聚合器价格API
-            url = f"https://api.1inch.dev/price/v1.1/1/{eth_token_address}"
-            headers = {'Accept': 'application/json'}
-            
-            response = self._make_request(url, headers)
-            if not response:
-                return None
+            index = self._get_coingecko_index()
+            if not index:
+                return results
             
-            data = response.json()
-            if eth_token_address in data:
-                token_data = data[eth_token_address]
-                return {
-                    'price': float(token_data),
-                    'name': 'Unknown',
-                    'symbol': 'UNK',
-                    'source': '1inch',
-                    'platform': 'ethereum'
-                }
-            return None
+            matched = self._match_coingecko_coins(index, chain, token_addresses)
+            for chunk in self._chunks(list(matched), source['batch_size']):
+                price_data = self._get_coingecko_simple_prices([matched[address]['id'] for address in chunk])
+                if price_data:
+                    results.update(source['parser'](price_data, {address: matched[address] for address in chunk}))
         except Exception as e:
-            print(f"1inch API获取以太坊代币价格失败: {e}")
-            return None
+            logger.warning("CoinGecko API获取%s代币价格失败: %s", chain_name(chain), e)
+        return results
     
-    def get_multi_api_prices(self, token_address: str) -> Tuple[Optional[float], Optional[Dict], str]:
-        """使用多个API源获取价格数据"""
-        print("🌐 使用多API源获取价格数据...")
+    def get_sol_price(self) -> Tuple[Optional[float], str]:
+        """
+        获取SOL价格，返回 (价格, 数据源)
         
-        sol_price = None
+        SOL报价所有代币共用，按 SOL_QUOTE_TTL 短时缓存，并发调用只发起一次请求
+        """
+        quote = self._cached(SOL_QUOTE_KEY, self._fetch_sol_quote)
+        if not quote:
+            return None, "未知"
+        return quote['price'], quote['source']
+    
+    def _fetch_sol_quote(self) -> Optional[Dict]:
+        """按优先级从各API源获取SOL价格并写入共享报价缓存"""
+        sol_fetchers = self._sol_price_fetchers()
+        apis = [api_name for api_name in self._active_apis() if api_name in sol_fetchers]
+        for depth, api_name in enumerate(apis, 1):
+            sol_price = sol_fetchers[api_name]()
+            if sol_price:
+                self.metrics.fallback_depth.observe(depth, 'sol')
+                return self._store_sol_quote(sol_price, self.sources[api_name]['name'])
+        self.metrics.fallback_depth.observe(len(apis), 'sol')
+        return None
+    
+    def _store_sol_quote(self, sol_price: float, source: str) -> Dict:
+        quote = {'price': sol_price, 'source': source}
+        self._set_cache(SOL_QUOTE_KEY, quote)
+        return quote
+    
+    def _cached_sol_quote(self) -> Optional[Dict]:
+        """只查询缓存中的SOL报价（不发请求），过期但在 stale 窗口内时返回旧值并在后台刷新"""
+        quote, fresh = self._lookup_cache(SOL_QUOTE_KEY)
+        if quote is not None and not fresh:
+            self._refresh_in_background(SOL_QUOTE_KEY, self._fetch_sol_quote)
+        return quote
+    
+    @staticmethod
+    def _metadata_rank(name: Optional[str], symbol: Optional[str]) -> int:
+        """名称/符号的完整程度：0 没有名称（如1inch），1 名称只是符号（如Jupiter），2 完整名称"""
+        if not name or name == UNKNOWN_NAME:
+            return 0
+        return 1 if name.upper() == (symbol or '').upper() else 2
+    
+    def _apply_token_metadata(self, token_address: str, token_info: Optional[Quote]) -> Optional[Quote]:
+        """
+        按mint缓存代币名称和符号（元数据类长期缓存）
+        
+        报价的名称不比缓存的差时写入（或续期）元数据缓存；否则用缓存的名称和符号补全报价
+        """
+        if not token_info:
+            return token_info
+        key = TOKEN_METADATA_PREFIX + token_address
+        metadata, fresh = self._lookup_cache(key)
+        rank = self._metadata_rank(token_info.name, token_info.symbol)
+        if metadata and rank < self._metadata_rank(metadata['name'], metadata['symbol']):
+            return token_info.replace(name=metadata['name'], symbol=metadata['symbol'])
+        if rank:
+            current = {'name': token_info.name, 'symbol': token_info.symbol}
+            if current != metadata or not fresh:
+                self._set_cache(key, current)
+        return token_info
+    
+    def _apply_batch_metadata(self, found: Dict[str, Tuple[Quote, str]]) -> Dict[str, Tuple[Quote, str]]:
+        return {token_address: (self._apply_token_metadata(token_address, token_info), source)
+                for token_address, (token_info, source) in found.items()}
+    
+    def get_multi_api_prices_batch(self, token_addresses: List[str]) -> Tuple[Optional[float], Dict[str, Tuple[Quote, str]]]:
+        """
+        批量获取一组代币价格：SOL价格只获取一次，每个API源对剩余代币发一次批量请求
+        
+        返回 (SOL价格, {代币地址: (代币信息, 数据源)})
+        """
+        if self.consensus_mode:
+            sol_price, found = self._get_consensus_prices_batch(token_addresses)
+            return sol_price, self._apply_batch_metadata(found)
+        
+        sol_price, _ = self.get_sol_price()
+        return sol_price, self._apply_batch_metadata(self._fetch_token_batch(token_addresses))
+    
+    def _fetch_token_batch(self, token_addresses: List[str], chain: str = SOLANA) -> Dict[str, Tuple[Quote, str]]:
+        """按优先级依次用各API源批量查询仍缺少报价的代币，返回 {代币地址: (代币信息, 数据源)}"""
+        found = {}
+        depth = 0
+        batch_fetchers = self._token_price_batch_fetchers(chain)
+        for api_name in self._active_apis(chain):
+            missing = [address for address in token_addresses if address not in found]
+            if not missing:
+                break
+            
+            depth += 1
+            logger.info("🔄 使用 %s 批量查询 %s 个代币...", self.sources[api_name]['name'], len(missing))
+            for token_address, token_info in batch_fetchers[api_name](missing).items():
+                found[token_address] = (token_info, self.sources[api_name]['name'])
+        
+        self.metrics.fallback_depth.observe(depth, self._fetch_kind(chain, batch=True))
+        return found
+    
+    def _batch_consensus_jobs(self, token_addresses: List[str], apis: List[str],
+                              chain: str = SOLANA) -> List[Tuple[str, str, Callable]]:
+        """共识模式的批量任务：每个源一个批量代币价格任务，Solana代币再加上每个源的SOL价格任务"""
+        sol_fetchers = self._sol_price_fetchers() if chain == SOLANA else {}
+        batch_fetchers = self._token_price_batch_fetchers(chain)
+        jobs = []
+        for api_name in apis:
+            if api_name in sol_fetchers:
+                jobs.append(('sol', api_name, sol_fetchers[api_name]))
+            jobs.append(('token', api_name, lambda f=batch_fetchers[api_name]: f(token_addresses)))
+        return jobs
+    
+    def _batch_token_consensus(self, token_results: Dict[str, object], token_addresses: List[str],
+                               apis: List[str], chain: str = SOLANA) -> Dict[str, Tuple[Quote, str]]:
+        """把各源的批量结果按代币合并后逐个取共识"""
+        found = {}
+        for token_address in token_addresses:
+            token_info = self._consensus_token_info(
+                {api_name: (token_results.get(api_name) or {}).get(token_address) for api_name in apis}, chain
+            )
+            if token_info:
+                found[token_address] = (token_info, token_info.source)
+        return found
+    
+    def _batch_consensus(self, results: Dict[str, Dict[str, object]], token_addresses: List[str],
+                         apis: List[str]) -> Tuple[Optional[float], Dict[str, Tuple[Quote, str]]]:
+        """Solana代币的批量共识：SOL价格和每个代币分别取共识"""
+        sol_price = self._consensus_sol_price(results['sol'])
+        return sol_price, self._batch_token_consensus(results['token'], token_addresses, apis)
+    
+    def _get_consensus_prices_batch(self, token_addresses: List[str]) -> Tuple[Optional[float], Dict[str, Tuple[Quote, str]]]:
+        """共识模式的批量获取：所有源的批量请求并发进行，每个代币单独取共识"""
+        apis = self._active_apis()
+        logger.info("🤝 共识模式：%s 个API源并发批量查询 %s 个代币...", len(apis), len(token_addresses))
+        results = self._race_fetchers(self._batch_consensus_jobs(token_addresses, apis),
+                                      {'sol': apis, 'token': apis}, self.fetch_budget, wait_all=True)
+        return self._batch_consensus(results, token_addresses, apis)
+    
+    def get_multi_api_prices(self, token_address: str, concurrent: Optional[bool] = None,
+                             budget: Optional[float] = None) -> Tuple[Optional[float], Optional[Quote], str]:
+        """
+        使用多个API源获取价格数据（concurrent 为 None 时使用 CONCURRENT_FETCH 配置）
+        
+        开启共识模式（CONSENSUS_MODE）时改为查询所有源并取共识价格
+        """
+        logger.info("🌐 使用多API源获取价格数据...")
+        
+        if concurrent is None:
+            concurrent = self.concurrent_fetch
+        if self.consensus_mode:
+            sol_price, token_info, used_source = self.get_consensus_prices(token_address, budget)
+        elif concurrent:
+            sol_price, token_info, used_source = self._get_multi_api_prices_concurrent(
+                token_address, self.fetch_budget if budget is None else budget)
+        else:
+            sol_price, token_info, used_source = self._get_multi_api_prices_sequential(token_address)
+        return sol_price, self._apply_token_metadata(token_address, token_info), used_source
+    
+    def _get_multi_api_prices_sequential(self, token_address: str) -> Tuple[Optional[float], Optional[Quote], str]:
+        """顺序模式：SOL价格取共享报价，代币价格按优先级逐个尝试API源"""
+        sol_price, sol_source = self.get_sol_price()
         token_info = None
-        used_source = "未知"
+        token_source = None
+        token_fetchers = self._token_price_fetchers()
+        depth = 0
         
         # 按优先级尝试不同的API源
-        for api_name in self.preferred_apis:
-            api_name = api_name.strip().lower()
-            if api_name not in self.api_sources:
-                continue
-            
-            print(f"🔄 尝试使用 {self.api_sources[api_name]['name']} API...")
-            
+        for api_name in self._active_apis():
+            logger.info("🔄 尝试使用 %s API...", self.sources[api_name]['name'])
+            depth += 1
             try:
-                if api_name == 'jupiter':
-                    if not sol_price:
-                        sol_price = self.get_sol_price_jupiter()
-                    if not token_info:
-                        token_info = self.get_token_price_jupiter(token_address)
-                
-                elif api_name == 'dexscreener':
-                    if not sol_price:
-                        sol_price = self.get_sol_price_dexscreener()
-                    if not token_info:
-                        token_info = self.get_token_price_dexscreener(token_address)
-                
-                elif api_name == 'coingecko':
-                    if not sol_price:
-                        sol_price = self.get_sol_price_coingecko()
-                    if not token_info:
-                        token_info = self.get_token_info_coingecko(token_address)
-                
-                # 如果获取到了所需数据，记录数据源
-                if sol_price and token_info:
-                    used_source = self.api_sources[api_name]['name']
-                    print(f"✅ 成功使用 {used_source} 获取价格数据")
-                    break
-                elif sol_price or token_info:
-                    used_source = self.api_sources[api_name]['name']
-                    print(f"⚠️ {used_source} 部分成功，继续尝试其他API...")
-                
-                # 添加延迟避免过快请求
-                time.sleep(0.5)
-                
+                token_info = token_fetchers[api_name](token_address)
             except Exception as e:
-                print(f"❌ {self.api_sources[api_name]['name']} API失败: {e}")
+                logger.warning("❌ %s API失败: %s", self.sources[api_name]['name'], e)
                 continue
+            if token_info:
+                token_source = self.sources[api_name]['name']
+                break
         
+        self.metrics.fallback_depth.observe(depth, 'token')
+        used_source = self._source_label(token_source, sol_source if sol_price else None)
+        if sol_price and token_info:
+            logger.info("✅ 成功使用 %s 获取价格数据", used_source)
         return sol_price, token_info, used_source
     
-    def get_eth_token_price(self, eth_token_address: str) -> Tuple[Optional[Dict], str]:
-        """获取以太坊代币价格"""
-        print(f"🔍 正在获取以太坊代币价格: {eth_token_address}")
+    # ---------- 任意链上的代币（比值计算的另一侧） ----------
+    
+    def get_all_chain_token_prices(self, token_address: str, chain: str = 'ethereum',
+                                   budget: Optional[float] = None) -> Dict[str, Optional[Quote]]:
+        """并发向支持该链的所有API源查询代币价格，在延迟预算内返回 {API源: 结果}"""
+        apis, jobs = self._chain_price_jobs(token_address, chain)
+        results = self._race_fetchers(jobs, {'token': apis},
+                                      self.fetch_budget if budget is None else budget, wait_all=True)
+        return {api_name: results['token'].get(api_name) for api_name in apis}
+    
+    def _chain_price_jobs(self, token_address: str, chain: str) -> Tuple[List[str], List[Tuple[str, str, Callable]]]:
+        """为支持该链的每个API源生成代币价格获取任务"""
+        chain_config(chain)
+        fetchers = self._token_price_fetchers(chain)
+        apis = self._active_apis(chain)
+        jobs = [('token', api_name, lambda f=fetchers[api_name]: f(token_address)) for api_name in apis]
+        return apis, jobs
+    
+    def _chain_consensus(self, token_infos: Dict[str, Optional[Quote]], chain: str) -> Tuple[Optional[Quote], str]:
+        """对支持该链的各API源的报价取共识"""
+        token_info = self._consensus_token_info(token_infos, chain)
+        if not token_info:
+            return None, "未知"
+        logger.info("🤝 %s代币%s → $%.8f", chain_name(chain), describe_consensus(token_info.consensus), token_info.price)
+        return token_info, token_info.source
+    
+    def get_chain_token_price(self, token_address: str, chain: str = 'ethereum', concurrent: Optional[bool] = None,
+                              budget: Optional[float] = None) -> Tuple[Optional[Quote], str]:
+        """
+        获取任意已注册链上的代币价格，返回 (代币信息, 数据源)
+        
+        concurrent 为 None 时使用 CONCURRENT_FETCH 配置；开启共识模式时查询所有支持该链的源并取共识
+        """
+        logger.info("🔍 正在获取%s代币价格: %s", chain_name(chain), token_address)
+        
+        apis, jobs = self._chain_price_jobs(token_address, chain)
+        if self.consensus_mode:
+            results = self._race_fetchers(jobs, {'token': apis}, self.fetch_budget if budget is None else budget,
+                                          wait_all=True)
+            return self._chain_consensus(results['token'], chain)
+        if concurrent is None:
+            concurrent = self.concurrent_fetch
+        if concurrent:
+            results = self._race_fetchers(jobs, {'token': apis}, self.fetch_budget if budget is None else budget)
+            _, token_info = self._pick_by_priority(results['token'], apis)
+            if token_info:
+                logger.info("✅ 成功使用 %s 获取%s代币价格", token_info.source, chain_name(chain))
+                return token_info, token_info.source
+            return None, "未知"
         
         # 按优先级尝试不同的API源
-        for api_name in ['coingecko_eth', 'oneinch']:
-            print(f"🔄 尝试使用 {api_name} API...")
-            
+        depth = 0
+        for _, api_name, fn in jobs:
+            logger.info("🔄 尝试使用 %s API...", self.sources[api_name]['name'])
+            depth += 1
             try:
-                if api_name == 'coingecko_eth':
-                    token_info = self.get_eth_token_price_coingecko(eth_token_address)
-                elif api_name == 'oneinch':
-                    token_info = self.get_eth_token_price_1inch(eth_token_address)
-                else:
-                    continue
-                
-                if token_info:
-                    print(f"✅ 成功使用 {token_info['source']} 获取以太坊代币价格")
-                    return token_info, token_info['source']
-                
-                # 添加延迟避免过快请求
-                time.sleep(0.5)
-                
+                token_info = fn()
             except Exception as e:
-                print(f"❌ {api_name} API失败: {e}")
+                logger.warning("❌ %s API失败: %s", self.sources[api_name]['name'], e)
                 continue
+            if token_info:
+                logger.info("✅ 成功使用 %s 获取%s代币价格", token_info.source, chain_name(chain))
+                self.metrics.fallback_depth.observe(depth, self._fetch_kind(chain))
+                return token_info, token_info.source
         
+        self.metrics.fallback_depth.observe(depth, self._fetch_kind(chain))
         return None, "未知"
     
+    def get_eth_token_price(self, eth_token_address: str, concurrent: Optional[bool] = None,
+                            budget: Optional[float] = None) -> Tuple[Optional[Quote], str]:
+        """获取以太坊代币价格（get_chain_token_price 在以太坊上的简写）"""
+        return self.get_chain_token_price(eth_token_address, 'ethereum', concurrent, budget)
+    
+    def get_chain_token_prices(self, token_addresses: List[str],
+                               chain: str = 'ethereum') -> Dict[str, Tuple[Quote, str]]:
+        """
+        批量获取某条链上一组代币的价格，返回 {代币地址: (代币信息, 数据源)}
+        
+        与Solana代币的批量获取相同：每个API源对剩余代币发一次批量请求，共识模式下所有源并发后逐个取共识
+        """
+        chain_config(chain)
+        if not self.consensus_mode:
+            return self._fetch_token_batch(token_addresses, chain)
+        apis = self._active_apis(chain)
+        results = self._race_fetchers(self._batch_consensus_jobs(token_addresses, apis, chain),
+                                      {'token': apis}, self.fetch_budget, wait_all=True)
+        return self._batch_token_consensus(results['token'], token_addresses, apis, chain)
+    
     def calculate_exchange_rates(self, sol_price: float, token_price: float) -> Tuple[float, float]:
         """计算SOL和代币之间的兑换比率"""
         sol_to_token = sol_price / token_price  # 1 SOL = ? Token
@@ -427,168 +1286,257 @@ class MultiApiSolTokenTracker:
         eth_to_sol_ratio = eth_token_price / sol_token_price  # ETH代币/SOL代币
         return sol_to_eth_ratio, eth_to_sol_ratio
     
-    def save_to_file(self, token_address: str, token_info: Dict, 
+    def save_to_file(self, token_address: str, token_info: Quote, 
                      sol_price: float, token_price: float, 
                      sol_to_token: float, token_to_sol: float, source: str):
-        """保存数据到CSV文件"""
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        with open(self.data_file, 'a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow([
-                timestamp,
-                token_address,
-                token_info.get('name', 'Unknown'),
-                token_info.get('symbol', 'UNK').upper(),
-                f"{sol_price:.6f}",
-                f"{token_price:.8f}",
-                f"{sol_to_token:.8f}",
-                f"{token_to_sol:.8f}",
-                source,
-                "自动记录"
-            ])
-    
-    def save_comparison_to_file(self, sol_token_address: str, sol_token_info: Dict,
-                               eth_token_address: str, eth_token_info: Dict,
+        """保存数据到历史存储"""
+        self.save_rows_to_file([
+            self._history_record(token_address, token_info, sol_price, token_price,
+                                 sol_to_token, token_to_sol, source)
+        ])
+    
+    def _history_record(self, token_address: str, token_info: Quote,
+                        sol_price: float, token_price: float,
+                        sol_to_token: float, token_to_sol: float, source: str,
+                        timestamp: Optional[float] = None) -> Dict:
+        """生成一条价格历史记录（数值字段保持float，由存储后端决定格式）"""
+        consensus = token_info.consensus
+        return {
+            'ts': time.time() if timestamp is None else timestamp,
+            'token_address': token_address,
+            'token_name': token_info.name,
+            'token_symbol': token_info.symbol,
+            'sol_price': sol_price,
+            'token_price': token_price,
+            'sol_to_token': sol_to_token,
+            'token_to_sol': token_to_sol,
+            'source': source,
+            'note': describe_consensus(consensus) if consensus else "自动记录",
+            'spread': consensus['spread'] if consensus else None
+        }
+    
+    def save_rows_to_file(self, rows: List[Dict]):
+        """追加多条价格历史记录（经缓冲区批量写入）"""
+        self.history_store.append('prices', rows)
+        if self.alerts is not None:
+            self.alerts.observe('prices', rows)
+    
+    def save_comparison_to_file(self, sol_token_address: str, sol_token_info: Quote,
+                               eth_token_address: str, eth_token_info: Quote,
                                sol_token_price: float, eth_token_price: float,
                                sol_to_eth_ratio: float, eth_to_sol_ratio: float,
                                sol_source: str, eth_source: str):
-        """保存比值计算结果到专门的CSV文件"""
-        comparison_file = "token_price_comparison.csv"
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # 初始化比较文件
-        if not os.path.exists(comparison_file):
-            with open(comparison_file, 'w', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                writer.writerow([
-                    '时间戳', 'SOL代币地址', 'SOL代币名称', 'SOL代币符号', 'SOL代币价格(USD)',
-                    'ETH代币地址', 'ETH代币名称', 'ETH代币符号', 'ETH代币价格(USD)',
-                    'SOL代币/ETH代币比值', 'ETH代币/SOL代币比值',
-                    'SOL数据源', 'ETH数据源', '备注'
-                ])
-        
-        # 保存比较数据
-        with open(comparison_file, 'a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow([
-                timestamp,
-                sol_token_address,
-                sol_token_info.get('name', 'Unknown'),
-                sol_token_info.get('symbol', 'UNK').upper(),
-                f"{sol_token_price:.8f}",
-                eth_token_address,
-                eth_token_info.get('name', 'Unknown'),
-                eth_token_info.get('symbol', 'UNK').upper(),
-                f"{eth_token_price:.8f}",
-                f"{sol_to_eth_ratio:.8f}",
-                f"{eth_to_sol_ratio:.8f}",
-                sol_source,
-                eth_source,
-                "比值计算"
-            ])
+        """保存比值计算结果到历史存储（经缓冲区批量写入）"""
+        rows = [self._comparison_record(
+            sol_token_address, sol_token_info, eth_token_address, eth_token_info,
+            sol_token_price, eth_token_price, sol_to_eth_ratio, eth_to_sol_ratio, sol_source, eth_source
+        )]
+        self.history_store.append('comparisons', rows)
+        if self.alerts is not None:
+            self.alerts.observe('comparisons', rows)
+    
+    def _comparison_record(self, sol_token_address: str, sol_token_info: Quote,
+                           eth_token_address: str, eth_token_info: Quote,
+                           sol_token_price: float, eth_token_price: float,
+                           sol_to_eth_ratio: float, eth_to_sol_ratio: float,
+                           sol_source: str, eth_source: str, timestamp: Optional[float] = None,
+                           note: str = "比值计算") -> Dict:
+        """生成一条比值历史记录"""
+        return {
+            'ts': time.time() if timestamp is None else timestamp,
+            'sol_token_address': sol_token_address,
+            'sol_token_name': sol_token_info.name,
+            'sol_token_symbol': sol_token_info.symbol,
+            'sol_token_price': sol_token_price,
+            'eth_token_address': eth_token_address,
+            'eth_token_name': eth_token_info.name,
+            'eth_token_symbol': eth_token_info.symbol,
+            'eth_token_price': eth_token_price,
+            'sol_to_eth_ratio': sol_to_eth_ratio,
+            'eth_to_sol_ratio': eth_to_sol_ratio,
+            'sol_source': sol_source,
+            'eth_source': eth_source,
+            'note': note,
+            'sol_spread': sol_token_info.spread,
+            'eth_spread': eth_token_info.spread
+        }
     
     def track_token_price(self, token_address: str) -> bool:
         """主要功能：追踪指定代币价格并记录"""
-        print(f"🔍 正在处理代币地址: {token_address}")
-        print(f"📋 API优先级: {' → '.join(self.preferred_apis)}")
+        logger.info("🔍 正在处理代币地址: %s", token_address)
+        logger.info("📋 API优先级: %s", ' → '.join(self._active_apis()))
         
         # 获取价格数据
         sol_price, token_info, source = self.get_multi_api_prices(token_address)
-        
+        return self._record_token_price(token_address, sol_price, token_info, source)
+    
+    def _record_token_price(self, token_address: str, sol_price: Optional[float],
+                            token_info: Optional[Quote], source: str) -> bool:
+        """显示单个代币的价格与兑换比率并保存（同步和异步追踪器共用）"""
         if not sol_price:
-            print("❌ 无法获取SOL价格")
-            print("💡 建议：")
-            print("   - 检查网络连接")
-            print("   - 稍后重试（可能是API限制）")
+            logger.error("❌ 无法获取SOL价格")
+            logger.info("💡 建议：")
+            logger.info("   - 检查网络连接")
+            logger.info("   - 稍后重试（可能是API限制）")
             return False
         
         if not token_info:
-            print("❌ 无法获取代币信息")
-            print("💡 建议：")
-            print("   - 确认代币地址是否正确")
-            print("   - 该代币可能未在主要DEX上交易")
+            logger.error("❌ 无法获取代币信息")
+            logger.info("💡 建议：")
+            logger.info("   - 确认代币地址是否正确")
+            logger.info("   - 该代币可能未在主要DEX上交易")
             return False
         
-        token_price = token_info['price']
+        token_price = token_info.price
         
-        print(f"✅ SOL当前价格: ${sol_price:.6f}")
-        print(f"✅ 代币信息: {token_info['name']} ({token_info['symbol'].upper()})")
-        print(f"✅ 代币当前价格: ${token_price:.8f}")
-        print(f"📊 数据源: {source}")
+        logger.info("✅ SOL当前价格: $%.6f", sol_price)
+        logger.info("✅ 代币信息: %s (%s)", token_info.name, token_info.symbol)
+        logger.info("✅ 代币当前价格: $%.8f", token_price)
+        logger.info("📊 数据源: %s", source)
         
         # 计算兑换比率
         sol_to_token, token_to_sol = self.calculate_exchange_rates(sol_price, token_price)
         
-        print("\n" + "="*50)
-        print("📈 兑换比率")
-        print("="*50)
-        print(f"1 SOL = {sol_to_token:,.8f} {token_info['symbol'].upper()}")
-        print(f"1 {token_info['symbol'].upper()} = {token_to_sol:.8f} SOL")
-        print("="*50)
+        logger.info("\n" + "="*50)
+        logger.info("📈 兑换比率")
+        logger.info("="*50)
+        logger.info("1 SOL = %s %s", format(sol_to_token, ',.8f'), token_info.symbol)
+        logger.info("1 %s = %.8f SOL", token_info.symbol, token_to_sol)
+        logger.info("="*50)
         
         # 保存到文件
         self.save_to_file(token_address, token_info, sol_price, token_price, 
                          sol_to_token, token_to_sol, source)
-        print(f"💾 数据已保存到 {self.data_file}")
+        logger.info("💾 数据已保存到 %s", self.history_store.location('prices'))
         
         return True
     
-    def compare_sol_eth_tokens(self, sol_token_address: str, eth_token_address: str) -> bool:
-        """比较SOL代币和ETH代币的价格比值"""
-        print(f"🔍 正在比较代币价格:")
-        print(f"   SOL代币: {sol_token_address}")
-        print(f"   ETH代币: {eth_token_address}")
-        print("="*60)
+    def track_tokens(self, token_addresses: List[str]) -> Dict[str, bool]:
+        """
+        批量追踪多个代币价格并记录
+        
+        代币按 track_batch_size 分批：每批只获取一次SOL价格，每个API源发一次批量请求，
+        所有记录一次性追加写入文件。返回 {代币地址: 是否成功}。
+        """
+        # 去重并保持输入顺序
+        token_addresses = list(dict.fromkeys(a.strip() for a in token_addresses if a and a.strip()))
+        logger.info("🔍 正在批量处理 %s 个代币", len(token_addresses))
+        logger.info("📋 API优先级: %s", ' → '.join(self._active_apis()))
+        
+        status = {}
+        for chunk in self._chunks(token_addresses, self.track_batch_size):
+            sol_price, found = self.get_multi_api_prices_batch(chunk)
+            status.update(self._record_token_batch(chunk, sol_price, found))
+        return status
+    
+    def _record_token_batch(self, chunk: List[str], sol_price: Optional[float],
+                            found: Dict[str, Tuple[Quote, str]]) -> Dict[str, bool]:
+        """显示一批代币的价格并一次性保存（同步和异步追踪器共用），返回 {代币地址: 是否成功}"""
+        if not sol_price:
+            logger.error("❌ 无法获取SOL价格，跳过本批代币")
+            return {address: False for address in chunk}
+        
+        logger.info("✅ SOL当前价格: $%.6f", sol_price)
+        # 大批量轮询时日志级别高于INFO，跳过每个代币的格式化
+        verbose = logger.isEnabledFor(logging.INFO)
+        timestamp = time.time()
+        status = {}
+        rows = []
+        logger.info("\n" + "="*80)
+        for token_address in chunk:
+            if token_address not in found:
+                logger.error("❌ %s: 无法获取代币信息", token_address)
+                status[token_address] = False
+                continue
+            
+            token_info, source = found[token_address]
+            token_price = token_info.price
+            sol_to_token, token_to_sol = self.calculate_exchange_rates(sol_price, token_price)
+            if verbose:
+                logger.info("✅ %-10s $%-16.8f 1 SOL = %s %s  [%s]",
+                            token_info.symbol, token_price, format(sol_to_token, ',.8f'), token_info.symbol, source)
+            rows.append(self._history_record(token_address, token_info, sol_price, token_price,
+                                             sol_to_token, token_to_sol, source, timestamp))
+            status[token_address] = True
+        logger.info("="*80)
+        
+        self.save_rows_to_file(rows)
+        if rows:
+            logger.info("💾 %s 条数据已保存到 %s", len(rows), self.history_store.location('prices'))
+        return status
+    
+    def compare_sol_eth_tokens(self, sol_token_address: str, eth_token_address: str,
+                               chain: Optional[str] = None) -> bool:
+        """
+        比较SOL代币和另一条链上代币的价格比值
+        
+        chain 为另一侧代币所在的链（默认 COMPARE_CHAIN，即以太坊），可以是 base、bsc 等任意已注册的链
+        """
+        chain = (chain or self.compare_chain).lower()
+        logger.info("🔍 正在比较代币价格:")
+        logger.info("   SOL代币: %s", sol_token_address)
+        logger.info("   %s代币: %s", chain_name(chain), eth_token_address)
+        logger.info("="*60)
         
         # 获取SOL代币价格
-        print("📊 获取SOL代币价格...")
+        logger.info("📊 获取SOL代币价格...")
         sol_price, sol_token_info, sol_source = self.get_multi_api_prices(sol_token_address)
         
         if not sol_token_info:
-            print("❌ 无法获取SOL代币信息")
+            logger.error("❌ 无法获取SOL代币信息")
             return False
         
-        sol_token_price = sol_token_info['price']
+        # 获取另一条链上的代币价格
+        logger.info("\n📊 获取%s代币价格...", chain_name(chain))
+        eth_token_info, eth_source = self.get_chain_token_price(eth_token_address, chain)
+        return self._record_comparison(sol_token_address, sol_token_info, sol_source,
+                                       eth_token_address, eth_token_info, eth_source)
+    
+    def _record_comparison(self, sol_token_address: str, sol_token_info: Optional[Quote], sol_source: str,
+                           eth_token_address: str, eth_token_info: Optional[Quote], eth_source: str) -> bool:
+        """显示SOL代币与ETH代币的价格比值并保存（同步和异步追踪器共用）"""
+        if not sol_token_info:
+            logger.error("❌ 无法获取SOL代币信息")
+            return False
         
-        # 获取ETH代币价格
-        print("\n📊 获取ETH代币价格...")
-        eth_token_info, eth_source = self.get_eth_token_price(eth_token_address)
+        sol_token_price = sol_token_info.price
         
         if not eth_token_info:
-            print("❌ 无法获取ETH代币信息")
+            logger.error("❌ 无法获取ETH代币信息")
             return False
         
-        eth_token_price = eth_token_info['price']
+        eth_token_price = eth_token_info.price
         
         # 显示获取到的价格信息
-        print("\n" + "="*60)
-        print("💰 获取到的价格信息")
-        print("="*60)
-        print(f"SOL代币: {sol_token_info['name']} ({sol_token_info['symbol'].upper()})")
-        print(f"  价格: ${sol_token_price:.8f}")
-        print(f"  数据源: {sol_source}")
-        print()
-        print(f"ETH代币: {eth_token_info['name']} ({eth_token_info['symbol'].upper()})")
-        print(f"  价格: ${eth_token_price:.8f}")
-        print(f"  数据源: {eth_source}")
+        logger.info("\n" + "="*60)
+        logger.info("💰 获取到的价格信息")
+        logger.info("="*60)
+        logger.info("SOL代币: %s (%s)", sol_token_info.name, sol_token_info.symbol)
+        logger.info("  价格: $%.8f", sol_token_price)
+        logger.info("  数据源: %s", sol_source)
+        logger.info("")
+        logger.info("ETH代币: %s (%s)", eth_token_info.name, eth_token_info.symbol)
+        logger.info("  价格: $%.8f", eth_token_price)
+        logger.info("  数据源: %s", eth_source)
         
         # 计算比值
         sol_to_eth_ratio, eth_to_sol_ratio = self.calculate_token_ratio(sol_token_price, eth_token_price)
         
-        print("\n" + "="*60)
-        print("📈 代币价格比值分析")
-        print("="*60)
-        print(f"1 {sol_token_info['symbol'].upper()} = {sol_to_eth_ratio:.8f} {eth_token_info['symbol'].upper()}")
-        print(f"1 {eth_token_info['symbol'].upper()} = {eth_to_sol_ratio:.8f} {sol_token_info['symbol'].upper()}")
+        logger.info("\n" + "="*60)
+        logger.info("📈 代币价格比值分析")
+        logger.info("="*60)
+        logger.info("1 %s = %.8f %s", sol_token_info.symbol, sol_to_eth_ratio, eth_token_info.symbol)
+        logger.info("1 %s = %.8f %s", eth_token_info.symbol, eth_to_sol_ratio, sol_token_info.symbol)
         
         # 显示相对价值分析
         if sol_to_eth_ratio > 1:
-            print(f"\n💡 {sol_token_info['symbol'].upper()} 比 {eth_token_info['symbol'].upper()} 贵 {sol_to_eth_ratio:.2f} 倍")
+            logger.info("\n💡 %s 比 %s 贵 %.2f 倍",
+                        sol_token_info.symbol, eth_token_info.symbol, sol_to_eth_ratio)
         else:
-            print(f"\n💡 {eth_token_info['symbol'].upper()} 比 {sol_token_info['symbol'].upper()} 贵 {eth_to_sol_ratio:.2f} 倍")
+            logger.info("\n💡 %s 比 %s 贵 %.2f 倍",
+                        eth_token_info.symbol, sol_token_info.symbol, eth_to_sol_ratio)
         
-        print("="*60)
+        logger.info("="*60)
         
         # 保存比较结果
         self.save_comparison_to_file(
@@ -599,63 +1547,163 @@ class MultiApiSolTokenTracker:
             sol_source, eth_source
         )
         
-        print(f"💾 比较结果已保存到 token_price_comparison.csv")
+        logger.info("💾 比较结果已保存到 %s", self.history_store.location('comparisons'))
         return True
     
-    def show_history(self, limit: int = 10):
-        """显示历史记录"""
-        if not os.path.exists(self.data_file):
+    def show_history(self, limit: int = 10, token: Optional[str] = None,
+                     since: Optional[float] = None, until: Optional[float] = None):
+        """显示历史记录（只读取最近的 limit 条，可按代币地址和时间区间过滤）"""
+        history = self.history_store.tail('prices', limit, token=token, since=since, until=until)
+        if history is None:
             print("❌ 没有历史记录文件")
             return
         
         print(f"\n📊 最近 {limit} 条记录")
         print("="*100)
         
-        with open(self.data_file, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            rows = list(reader)
-            
-            if len(rows) <= 1:
-                print("📝 没有历史记录")
-                return
-            
-            # 显示表头
-            headers = rows[0]
-            print(" | ".join(f"{h:^12}" for h in headers[:6]))
-            print("-" * 100)
-            
-            # 显示最近的记录
-            for row in rows[-limit:]:
-                if row != rows[0]:  # 跳过表头
-                    print(" | ".join(f"{cell:^12}" for cell in row[:6]))
-    
-    def show_comparison_history(self, limit: int = 10):
-        """显示比值计算历史记录"""
-        comparison_file = "token_price_comparison.csv"
-        if not os.path.exists(comparison_file):
+        headers, rows = history
+        if not rows:
+            print("📝 没有历史记录")
+            return
+        
+        # 显示表头
+        print(" | ".join(f"{h:^12}" for h in headers[:6]))
+        print("-" * 100)
+        
+        # 显示最近的记录
+        for row in rows:
+            print(" | ".join(f"{cell:^12}" for cell in row[:6]))
+    
+    def show_comparison_history(self, limit: int = 10, token: Optional[str] = None,
+                                since: Optional[float] = None, until: Optional[float] = None):
+        """显示比值计算历史记录（token 匹配SOL或ETH代币地址）"""
+        history = self.history_store.tail('comparisons', limit, token=token, since=since, until=until)
+        if history is None:
             print("❌ 没有比值计算历史记录文件")
             return
         
         print(f"\n📊 最近 {limit} 条比值计算记录")
         print("="*120)
         
-        with open(comparison_file, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            rows = list(reader)
-            
-            if len(rows) <= 1:
-                print("📝 没有比值计算历史记录")
-                return
-            
-            # 显示表头
-            headers = rows[0]
-            print(" | ".join(f"{h:^15}" for h in headers[:6]))
-            print("-" * 120)
-            
-            # 显示最近的记录
-            for row in rows[-limit:]:
-                if row != rows[0]:  # 跳过表头
-                    print(" | ".join(f"{cell:^15}" for cell in row[:6]))
+        headers, rows = history
+        if not rows:
+            print("📝 没有比值计算历史记录")
+            return
+        
+        # 显示表头
+        print(" | ".join(f"{h:^15}" for h in headers[:6]))
+        print("-" * 120)
+        
+        # 显示最近的记录
+        for row in rows:
+            print(" | ".join(f"{cell:^15}" for cell in row[:6]))
+    
+    def track_ratio_matrix(self, basket: List, path: Optional[str] = None,
+                           threshold: Optional[float] = None) -> bool:
+        """
+        计算一篮子代币（可跨链）的两两比值矩阵并保存为一个快照
+        
+        basket 的每一项为 "<链>:<地址>"、代币地址或 (链, 地址)；0x开头的地址默认属于 COMPARE_CHAIN（需要numpy）
+        """
+        try:
+            from ratio_matrix import run_ratio_matrix
+        except ImportError:
+            print("❌ 比值矩阵需要 numpy，请先运行: pip install numpy")
+            return False
+        entries = self._ratio_matrix_entries(basket)
+        if not entries:
+            return False
+        matrix, _ = run_ratio_matrix(
+            self, entries, path or self.ratio_matrix_file,
+            threshold=self.ratio_matrix_threshold if threshold is None else threshold,
+            moves_path=self.ratio_matrix_moves_file
+        )
+        return matrix.priced >= 2
+    
+    def _ratio_matrix_entries(self, basket: List) -> List[Tuple[str, str]]:
+        """解析并去重比值矩阵的一篮子代币"""
+        from ratio_matrix import parse_basket_entry
+        
+        entries = list(dict.fromkeys(
+            entry if isinstance(entry, tuple) else parse_basket_entry(entry, self.compare_chain)
+            for entry in basket if entry
+        ))
+        if entries:
+            logger.info("🔍 正在计算 %s 个代币的比值矩阵", len(entries))
+        else:
+            logger.error("❌ 比值矩阵的代币列表为空")
+        return entries
+    
+    def show_analytics(self, interval: str = '1h', window: int = 24, token: Optional[str] = None,
+                       since: Optional[float] = None, until: Optional[float] = None,
+                       output: Optional[str] = None):
+        """显示价格历史分析：K线、收益率、滚动波动率、SOL/代币比值和跨链比值（需要numpy）"""
+        try:
+            from price_analytics import print_analytics_report
+        except ImportError:
+            print("❌ 价格分析需要 numpy，请先运行: pip install numpy")
+            return
+        print_analytics_report(self.history_store, interval=interval, window=window, token=token,
+                               since=since, until=until, output=output)
+    
+    def export_history_csv(self, price_path: Optional[str] = None,
+                           comparison_path: Optional[str] = None) -> Dict[str, int]:
+        """把历史存储导出为CSV（格式与CSV后端相同），返回 {类别: 导出行数}"""
+        if not hasattr(self.history_store, 'export_csv'):
+            print(f"📝 当前历史存储已是CSV格式: {self.data_file}, {self.comparison_file}")
+            return {}
+        
+        counts = {}
+        for kind, path in (('prices', price_path or self.data_file),
+                           ('comparisons', comparison_path or self.comparison_file)):
+            counts[kind] = self.history_store.export_csv(kind, path)
+            print(f"💾 已导出 {counts[kind]} 条记录到 {path}")
+        return counts
+    
+    def import_history_csv(self, price_path: Optional[str] = None,
+                           comparison_path: Optional[str] = None) -> Dict[str, int]:
+        """把已有的CSV历史文件导入当前历史存储（用于从CSV迁移到SQLite），返回 {类别: 导入行数}"""
+        if not hasattr(self.history_store, 'import_csv'):
+            print("❌ 当前历史存储为CSV，无需导入（使用 --storage sqlite）")
+            return {}
+        
+        counts = {}
+        for kind, path in (('prices', price_path or self.data_file),
+                           ('comparisons', comparison_path or self.comparison_file)):
+            if not os.path.exists(path):
+                continue
+            counts[kind] = self.history_store.import_csv(kind, path)
+            print(f"📥 已从 {path} 导入 {counts[kind]} 条记录到 {self.history_store.location(kind)}")
+        return counts
+
+def load_token_list(path: str) -> List[str]:
+    """从文件读取代币地址列表（每行一个，支持逗号分隔，#开头为注释）"""
+    token_addresses = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                token_addresses.extend(part.strip() for part in line.split(',') if part.strip())
+    return token_addresses
+
+
+def watchlist_from_args(args, tracker) -> Dict:
+    """守护/服务/回填模式的监控列表：--watchlist 文件，或由 --tokens、--tokens-file 和默认代币地址组成"""
+    if args.watchlist:
+        return load_watchlist(args.watchlist)
+    tokens = []
+    if args.tokens:
+        tokens.extend(args.tokens.split(','))
+    if args.tokens_file:
+        tokens.extend(load_token_list(args.tokens_file))
+    sol_token_address = args.sol_token_address or tracker.default_token_address
+    eth_token_address = args.eth_token or tracker.default_eth_token_address
+    if not tokens and sol_token_address and not eth_token_address:
+        tokens.append(sol_token_address)
+    pairs = []
+    if sol_token_address and eth_token_address:
+        pairs.append({'sol': sol_token_address, 'eth': eth_token_address})
+    return {'tokens': [t.strip() for t in tokens if t.strip()], 'pairs': pairs}
 
 
 def main():
@@ -664,28 +1712,222 @@ def main():
                        help='Solana代币地址（可选，不提供则使用.env中的DEFAULT_TOKEN_ADDRESS）')
     parser.add_argument('--eth-token', type=str,
                        help='以太坊代币地址（用于计算与SOL代币的价格比值）')
+    parser.add_argument('--chain', type=str.lower, choices=list(CHAINS),
+                       help='--eth-token 所在的链（默认读取COMPARE_CHAIN或ethereum，如 base、bsc、arbitrum）')
     parser.add_argument('--history', '--hist', type=int, default=0, 
                        help='显示历史记录（指定条数）')
     parser.add_argument('--comparison-history', type=int, default=0,
                        help='显示比值计算历史记录（指定条数）')
+    parser.add_argument('--analyze', action='store_true',
+                       help='分析历史记录：OHLC K线、收益率、滚动波动率、SOL/代币比值和跨链比值')
+    parser.add_argument('--resample', type=str, default='1h',
+                       help='分析时的K线周期（如 15m、1h、1d，默认1h）')
+    parser.add_argument('--window', type=int, default=24,
+                       help='分析时滚动波动率的窗口（K线根数，默认24）')
+    parser.add_argument('--analytics-output', type=str,
+                       help='把分析得到的K线保存到CSV文件')
+    parser.add_argument('--token', type=str,
+                       help='查看历史记录时只显示该代币地址的记录')
+    parser.add_argument('--since', type=parse_time_arg,
+                       help='查看历史记录的起始时间（如 2024-01-31、"2024-01-31 08:00"、24h、7d）')
+    parser.add_argument('--until', type=parse_time_arg,
+                       help='查看历史记录的截止时间（格式同 --since）')
     parser.add_argument('--apis', type=str,
                        help='指定使用的API源，逗号分隔（如：jupiter,dexscreener）')
+    parser.add_argument('--static-order', action='store_true',
+                       help='严格按指定顺序回退API源，不根据观测到的延迟和成功率调整')
+    parser.add_argument('--concurrent', action='store_true',
+                       help='并发查询所有API源，按优先级取最先返回的有效结果')
+    parser.add_argument('--consensus', action='store_true',
+                       help='共识模式：查询所有API源，取加权中位数并剔除偏离过大的报价')
+    parser.add_argument('--max-deviation', type=float,
+                       help='共识模式下报价相对中位数的最大偏离（默认读取CONSENSUS_MAX_DEVIATION或0.05）')
+    parser.add_argument('--budget', type=float,
+                       help='并发模式下的总延迟预算（秒，默认读取FETCH_BUDGET或8秒）')
+    parser.add_argument('--tokens', type=str,
+                       help='批量追踪多个Solana代币地址，逗号分隔')
+    parser.add_argument('--tokens-file', type=str,
+                       help='批量追踪文件中的Solana代币地址（每行一个，#开头为注释）')
+    parser.add_argument('--watch', action='store_true',
+                       help='守护模式：常驻运行并按间隔轮询代币列表和代币对')
+    parser.add_argument('--watchlist', type=str,
+                       help='守护模式的监控列表文件（JSON，包含tokens和pairs）；服务模式下预加载到热点报价表')
+    parser.add_argument('--interval', type=float,
+                       help='守护模式的默认轮询间隔（秒，默认60）；服务模式的热点报价刷新间隔（默认读取SERVER_POLL_INTERVAL或10）')
+    parser.add_argument('--jitter', type=float, default=0.1,
+                       help='守护模式的调度抖动比例（默认0.1，即间隔的±10%%）')
+    parser.add_argument('--serve', action='store_true',
+                       help='服务模式：常驻运行本地HTTP查询接口（/price、/ratio、/history），后台轮询刷新热点报价')
+    parser.add_argument('--host', type=str,
+                       help='服务模式的监听地址（默认读取SERVER_HOST或127.0.0.1）')
+    parser.add_argument('--port', type=int,
+                       help='服务模式的监听端口（默认读取SERVER_PORT或8787）')
+    parser.add_argument('--backfill', action='store_true',
+                       help='回填模式：从CoinGecko获取代币列表和代币对的历史价格，多进程并行写入历史存储（可中断后继续）')
+    parser.add_argument('--days', type=float,
+                       help='回填最近多少天的历史（默认读取BACKFILL_DAYS或30）')
+    parser.add_argument('--workers', type=int,
+                       help='回填的工作进程数（默认读取BACKFILL_WORKERS或4）')
+    parser.add_argument('--checkpoint', type=str,
+                       help='回填检查点文件（默认读取BACKFILL_CHECKPOINT或backfill_checkpoint.json）')
+    parser.add_argument('--matrix', action='store_true',
+                       help='比值矩阵模式：批量获取 --tokens / --tokens-file / --watchlist 中所有代币的价格，计算两两比值并保存为一个快照')
+    parser.add_argument('--matrix-output', type=str,
+                       help='比值矩阵快照文件（.npz，默认读取RATIO_MATRIX_FILE或ratio_matrix.npz）')
+    parser.add_argument('--matrix-threshold', type=float,
+                       help='只报告比值相对上一个快照变化超过该比例的代币对（如 0.02，默认读取RATIO_MATRIX_THRESHOLD）')
+    parser.add_argument('--alerts', type=str,
+                       help='告警规则配置文件（JSON，默认读取ALERT_RULES）：价格穿越、窗口涨跌幅、比值偏离，投递到webhook或文件')
+    parser.add_argument('--pool-stats', action='store_true',
+                       help='运行结束后显示HTTP连接池与重试统计')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                       help='只输出警告和错误（等同于 LOG_LEVEL=WARNING）')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                       help='输出调试信息（等同于 LOG_LEVEL=DEBUG）')
+    parser.add_argument('--metrics-port', type=int,
+                       help='在本地端口提供Prometheus格式的 /metrics 指标端点（默认读取METRICS_PORT）')
+    parser.add_argument('--metrics-file', type=str,
+                       help='定期把Prometheus格式的指标写入该文件，退出时再写一次（默认读取METRICS_FILE）')
+    parser.add_argument('--storage', choices=HISTORY_BACKENDS,
+                       help='历史记录存储后端（默认读取HISTORY_BACKEND或csv）')
+    parser.add_argument('--export-csv', action='store_true',
+                       help='把历史存储导出为CSV文件（token_price_history.csv / token_price_comparison.csv）')
+    parser.add_argument('--import-csv', action='store_true',
+                       help='把已有的CSV历史文件导入当前历史存储（配合 --storage sqlite 迁移数据）')
     
     args = parser.parse_args()
     
-    tracker = MultiApiSolTokenTracker()
+    load_dotenv()
+    log_level = os.getenv('LOG_LEVEL', 'INFO').strip().upper()
+    if args.quiet:
+        log_level = 'WARNING'
+    elif args.verbose:
+        log_level = 'DEBUG'
+    logging.basicConfig(level=getattr(logging, log_level, logging.INFO), format='%(message)s')
+    
+    tracker = MultiApiSolTokenTracker(history_backend=args.storage)
     
     # 如果指定了API源，覆盖默认设置
     if args.apis:
         tracker.preferred_apis = [api.strip().lower() for api in args.apis.split(',')]
-        print(f"🎯 使用指定的API源: {args.apis}")
+        logger.info("🎯 使用指定的API源: %s", args.apis)
+    
+    if args.static_order:
+        tracker.adaptive_ranking = False
+    
+    if args.chain:
+        tracker.compare_chain = args.chain
+    
+    if args.alerts:
+        tracker.enable_alerts(args.alerts)
+    
+    if args.pool_stats:
+        atexit.register(tracker.print_http_stats)
+    
+    metrics_port = args.metrics_port or int(os.getenv('METRICS_PORT', '0'))
+    if metrics_port:
+        tracker.metrics.serve(metrics_port, host=os.getenv('METRICS_HOST', '127.0.0.1'))
+    metrics_file = args.metrics_file or os.getenv('METRICS_FILE')
+    if metrics_file:
+        tracker.metrics.dump_to_file(metrics_file, interval=float(os.getenv('METRICS_DUMP_INTERVAL', '60')))
+    
+    if args.concurrent:
+        tracker.concurrent_fetch = True
+    if args.budget:
+        tracker.fetch_budget = args.budget
+    if args.consensus:
+        tracker.consensus_mode = True
+    if args.max_deviation is not None:
+        tracker.consensus_max_deviation = args.max_deviation
+    
+    if args.import_csv:
+        tracker.import_history_csv()
+        return
+    
+    if args.export_csv:
+        tracker.export_history_csv()
+        return
+    
+    if args.analyze:
+        tracker.show_analytics(args.resample, args.window, token=args.token, since=args.since,
+                               until=args.until, output=args.analytics_output)
+        return
     
     if args.history > 0:
-        tracker.show_history(args.history)
+        tracker.show_history(args.history, token=args.token, since=args.since, until=args.until)
         return
     
     if args.comparison_history > 0:
-        tracker.show_comparison_history(args.comparison_history)
+        tracker.show_comparison_history(args.comparison_history, token=args.token,
+                                        since=args.since, until=args.until)
+        return
+    
+    # 守护模式：常驻运行，按间隔轮询
+    if args.watch:
+        run_watch(tracker, watchlist_from_args(args, tracker), default_interval=args.interval or 60,
+                  jitter=args.jitter)
+        return
+    
+    # 服务模式：常驻运行，通过本地HTTP接口提供报价
+    if args.serve:
+        poll_interval = args.interval or float(os.getenv('SERVER_POLL_INTERVAL', '10'))
+        max_age = os.getenv('SERVER_MAX_AGE')
+        run_server(
+            tracker,
+            host=args.host or os.getenv('SERVER_HOST', '127.0.0.1'),
+            port=args.port or int(os.getenv('SERVER_PORT', '8787')),
+            poll_interval=poll_interval,
+            watchlist=watchlist_from_args(args, tracker),
+            max_age=float(max_age) if max_age else None,
+            idle_ttl=float(os.getenv('SERVER_IDLE_TTL', '600')),
+            record_history=os.getenv('SERVER_RECORD_HISTORY', 'false').lower() == 'true',
+            history_limit=int(os.getenv('SERVER_HISTORY_LIMIT', '1000'))
+        )
+        return
+    
+    # 回填模式：一次性补齐历史价格
+    if args.backfill:
+        run_backfill(
+            tracker,
+            watchlist_from_args(args, tracker),
+            days=args.days or float(os.getenv('BACKFILL_DAYS', '30')),
+            workers=args.workers or int(os.getenv('BACKFILL_WORKERS', '4')),
+            checkpoint_path=args.checkpoint or os.getenv('BACKFILL_CHECKPOINT', 'backfill_checkpoint.json'),
+            chunk_days=float(os.getenv('BACKFILL_CHUNK_DAYS', '90'))
+        )
+        return
+    
+    # 比值矩阵模式：一篮子代币的两两比值写成一个快照
+    if args.matrix:
+        try:
+            from ratio_matrix import basket_from_watchlist
+        except ImportError:
+            print("❌ 比值矩阵需要 numpy，请先运行: pip install numpy")
+            return
+        if args.watchlist:
+            basket = basket_from_watchlist(load_watchlist(args.watchlist), tracker.compare_chain)
+        else:
+            basket = []
+        if args.tokens:
+            basket.extend(args.tokens.split(','))
+        if args.tokens_file:
+            basket.extend(load_token_list(args.tokens_file))
+        if tracker.track_ratio_matrix(basket, args.matrix_output, args.matrix_threshold):
+            logger.info("\n🎉 比值矩阵计算完成！")
+        else:
+            logger.error("\n❌ 比值矩阵计算失败！")
+        return
+    
+    # 批量追踪模式
+    if args.tokens or args.tokens_file:
+        token_addresses = []
+        if args.tokens:
+            token_addresses.extend(args.tokens.split(','))
+        if args.tokens_file:
+            token_addresses.extend(load_token_list(args.tokens_file))
+        status = tracker.track_tokens(token_addresses)
+        succeeded = sum(1 for ok in status.values() if ok)
+        logger.info("\n🎉 批量追踪完成：成功 %s/%s 个代币", succeeded, len(status))
         return
     
     # 确定要使用的SOL代币地址
@@ -706,7 +1948,7 @@ def main():
             print("   python sol_token_price_tracker.py --help")
             return
         else:
-            print(f"🎯 使用.env文件中的默认SOL代币地址: {sol_token_address}")
+            logger.info("🎯 使用.env文件中的默认SOL代币地址: %s", sol_token_address)
     
     # 确定要使用的ETH代币地址
     eth_token_address = args.eth_token
@@ -716,24 +1958,24 @@ def main():
     # 如果提供了ETH代币地址（命令行或.env），执行比值计算
     if eth_token_address:
         if not args.eth_token:
-            print(f"🎯 使用.env文件中的默认ETH代币地址: {eth_token_address}")
+            logger.info("🎯 使用.env文件中的默认ETH代币地址: %s", eth_token_address)
         success = tracker.compare_sol_eth_tokens(sol_token_address, eth_token_address)
         if success:
-            print("\n🎉 代币比值计算完成！")
-            print("📝 你可以使用 --comparison-history 参数查看比值历史记录")
+            logger.info("\n🎉 代币比值计算完成！")
+            logger.info("📝 你可以使用 --comparison-history 参数查看比值历史记录")
         else:
-            print("\n❌ 代币比值计算失败！")
+            logger.error("\n❌ 代币比值计算失败！")
     else:
         # 执行标准的SOL代币价格追踪
         success = tracker.track_token_price(sol_token_address)
         if success:
-            print("\n🎉 价格追踪完成！")
-            print("📝 你可以使用 --history 参数查看历史记录")
-            print("🔧 你可以使用 --apis 参数指定API源")
-            print("💡 你可以使用 --eth-token 参数来比较与ETH代币的价格比值")
+            logger.info("\n🎉 价格追踪完成！")
+            logger.info("📝 你可以使用 --history 参数查看历史记录")
+            logger.info("🔧 你可以使用 --apis 参数指定API源")
+            logger.info("💡 你可以使用 --eth-token 参数来比较与ETH代币的价格比值")
         else:
-            print("\n❌ 价格追踪失败！")
-            print("💡 尝试使用不同的API源：--apis jupiter,dexscreener")
+            logger.error("\n❌ 价格追踪失败！")
+            logger.info("💡 尝试使用不同的API源：--apis jupiter,dexscreener")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+API源健康度 - 按观测到的延迟和成功率自适应调整API源顺序
+每个API源维护延迟和成功率的指数加权移动平均（EWMA），回退顺序按期望耗时排序；
+连续失败达到阈值时打开熔断器，冷却期内直接跳过该源，冷却期满后放行一次探测请求，
+探测成功则恢复，失败则冷却期翻倍。统计数据可保存到JSON文件，重启后继续使用
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class SourceHealth:
+    """按API源记录请求延迟、成功率和熔断状态（线程安全）"""
+    
+    def __init__(self, alpha: float = 0.2, failure_threshold: int = 3,
+                 cooldown: float = 60, max_cooldown: float = 600,
+                 path: Optional[str] = None):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.path = path
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        
+        if path:
+            self.load()
+            atexit.register(self.save)
+    
+    def _entry(self, source: str) -> Dict:
+        """获取某个API源的统计条目（调用方持有锁）"""
+        entry = self._stats.get(source)
+        if entry is None:
+            entry = {
+                'requests': 0,
+                'errors': 0,
+                'latency': None,        # 延迟EWMA（秒）
+                'success_rate': 1.0,    # 成功率EWMA
+                'failures': 0,          # 连续失败次数
+                'open_until': None,     # 熔断截止时间（时间戳），None表示未熔断
+                'cooldown': self.cooldown,
+                'trips': 0              # 熔断次数
+            }
+            self._stats[source] = entry
+        return entry
+    
+    def allow(self, source: str) -> bool:
+        """
+        请求前调用：熔断期间返回False
+        
+        冷却期满后放行一次探测请求，并把下一次探测推迟一个冷却期，
+        因此探测进行期间的其他请求仍然被跳过
+        """
+        with self._lock:
+            entry = self._entry(source)
+            if entry['open_until'] is None:
+                return True
+            now = time.time()
+            if now < entry['open_until']:
+                return False
+            entry['open_until'] = now + entry['cooldown']
+            return True
+    
+    def record(self, source: str, elapsed: float, ok: bool):
+        """记录一次请求的耗时和结果，更新EWMA和熔断状态"""
+        with self._lock:
+            entry = self._entry(source)
+            entry['requests'] += 1
+            if entry['latency'] is None:
+                entry['latency'] = elapsed
+            else:
+                entry['latency'] += self.alpha * (elapsed - entry['latency'])
+            entry['success_rate'] += self.alpha * ((1.0 if ok else 0.0) - entry['success_rate'])
+            
+            if ok:
+                if entry['open_until'] is not None:
+                    logger.info("✅ %s 探测成功，恢复使用", source)
+                entry['failures'] = 0
+                entry['open_until'] = None
+                entry['cooldown'] = self.cooldown
+                return
+            
+            entry['errors'] += 1
+            entry['failures'] += 1
+            if entry['failures'] < self.failure_threshold:
+                return
+            if entry['open_until'] is not None:
+                # 探测失败：冷却期翻倍
+                entry['cooldown'] = min(self.max_cooldown, entry['cooldown'] * 2)
+            else:
+                entry['trips'] += 1
+                logger.warning("⛔ %s 连续失败 %s 次，熔断 %.0f 秒", source, entry['failures'], entry['cooldown'])
+            entry['open_until'] = time.time() + entry['cooldown']
+    
+    def is_open(self, source: str) -> bool:
+        """熔断器是否处于打开状态（冷却期未满）"""
+        with self._lock:
+            entry = self._stats.get(source)
+            return bool(entry and entry['open_until'] is not None and time.time() < entry['open_until'])
+    
+    def expected_cost(self, source: str) -> Optional[float]:
+        """期望耗时 = 延迟EWMA / 成功率EWMA，没有样本时返回None"""
+        with self._lock:
+            entry = self._stats.get(source)
+            if not entry or entry['latency'] is None:
+                return None
+            return entry['latency'] / max(entry['success_rate'], 0.05)
+    
+    def rank(self, sources: List[str]) -> List[str]:
+        """
+        按健康度重新排列API源
+        
+        还没有样本的源保持原顺序排在最前（以便获得样本），其余按期望耗时升序，
+        熔断中的源排在最后（_make_request 会直接跳过它们，不占用超时时间）
+        """
+        unsampled, sampled, tripped = [], [], []
+        for source in sources:
+            if self.is_open(source):
+                tripped.append(source)
+                continue
+            cost = self.expected_cost(source)
+            if cost is None:
+                unsampled.append(source)
+            else:
+                sampled.append((cost, source))
+        sampled.sort(key=lambda item: item[0])
+        return unsampled + [source for _, source in sampled] + tripped
+    
+    def stats(self) -> Dict[str, Dict]:
+        """返回每个API源的健康度统计"""
+        now = time.time()
+        with self._lock:
+            result = {}
+            for source, entry in self._stats.items():
+                item = dict(entry)
+                item['open'] = entry['open_until'] is not None and now < entry['open_until']
+                result[source] = item
+            return result
+    
+    def load(self):
+        """从JSON文件加载统计数据（文件不存在或损坏时忽略）"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._lock:
+            for source, saved in data.items():
+                entry = self._entry(source)
+                entry.update({key: saved[key] for key in entry if key in saved})
+                if entry['open_until'] is None:
+                    entry['cooldown'] = self.cooldown  # 未熔断的源使用当前配置的冷却期
+    
+    def save(self):
+        """把统计数据原子地写入JSON文件"""
+        if not self.path:
+            return
+        with self._lock:
+            data = {source: dict(entry) for source, entry in self._stats.items()}
+        if not data:
+            return
+        temp_path = f"{self.path}.tmp"
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("⚠️ 保存API源健康度失败: %s", e)
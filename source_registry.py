@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+报价API源与链的注册表 - 取代按链分开配置的 api_sources / eth_api_sources 和逐个硬编码的获取方法
+每条链声明它在各API源中的标识（CoinGecko平台ID、DexScreener链ID、1inch链ID等）；
+每个API源声明连接参数、批量大小、限流额度、链标识的查找键、批量价格URL和响应解析器。
+追踪器只通过 (API源, 链) 调用统一的批量获取流程，并发、缓存、批量和共识对所有链同样生效
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+from quotes import Quote
+
+
+SOLANA = 'solana'
+
+# 链配置：name 为显示名称，其余键为各API源中的链标识（键名对应API源配置中的 chain_key）；
+# apis 为该链默认的API源优先级（可用 PREFERRED_APIS_<链> 覆盖，Solana 使用 PREFERRED_APIS）
+CHAINS: Dict[str, Dict] = {
+    'solana': {'name': 'Solana', 'jupiter': 'solana', 'coingecko': 'solana', 'dexscreener': 'solana',
+               'apis': ('jupiter', 'dexscreener', 'coingecko')},
+    'ethereum': {'name': 'Ethereum', 'coingecko': 'ethereum', 'dexscreener': 'ethereum', 'oneinch': 1},
+    'base': {'name': 'Base', 'coingecko': 'base', 'dexscreener': 'base', 'oneinch': 8453},
+    'bsc': {'name': 'BNB Chain', 'coingecko': 'binance-smart-chain', 'dexscreener': 'bsc', 'oneinch': 56},
+    'arbitrum': {'name': 'Arbitrum', 'coingecko': 'arbitrum-one', 'dexscreener': 'arbitrum', 'oneinch': 42161},
+    'polygon': {'name': 'Polygon', 'coingecko': 'polygon-pos', 'dexscreener': 'polygon', 'oneinch': 137},
+    'optimism': {'name': 'Optimism', 'coingecko': 'optimistic-ethereum', 'dexscreener': 'optimism', 'oneinch': 10},
+    'avalanche': {'name': 'Avalanche', 'coingecko': 'avalanche', 'dexscreener': 'avalanche', 'oneinch': 43114},
+}
+# 没有单独配置 apis 的链（EVM链）的默认API源优先级
+DEFAULT_CHAIN_APIS = ('coingecko', 'oneinch', 'dexscreener')
+
+
+def register_chain(chain: str, name: Optional[str] = None, apis: Optional[Tuple[str, ...]] = None, **source_ids):
+    """
+    注册（或补充）一条链，source_ids 为各API源中的链标识，如 coingecko='base', dexscreener='base'
+    
+    CoinGecko代币列表索引只包含创建追踪器时已注册链的平台，因此应在创建追踪器之前注册
+    """
+    config = CHAINS.setdefault(chain.lower(), {'name': name or chain})
+    if name:
+        config['name'] = name
+    if apis:
+        config['apis'] = tuple(apis)
+    config.update({key: value for key, value in source_ids.items() if value is not None})
+
+
+def chain_config(chain: str) -> Dict:
+    """返回链配置，未注册的链抛出 ValueError"""
+    try:
+        return CHAINS[chain.lower()]
+    except KeyError:
+        raise ValueError(f"未知的链: {chain}（已注册: {', '.join(CHAINS)}）") from None
+
+
+def chain_name(chain: str) -> str:
+    return CHAINS.get(chain, {}).get('name', chain)
+
+
+def default_chain_apis(chain: str) -> Tuple[str, ...]:
+    return chain_config(chain).get('apis', DEFAULT_CHAIN_APIS)
+
+
+def coingecko_platforms() -> Tuple[str, ...]:
+    """所有已注册链的CoinGecko平台ID（CoinGecko代币列表默认为这些平台建立地址索引）"""
+    return tuple(dict.fromkeys(config['coingecko'] for config in CHAINS.values() if config.get('coingecko')))
+
+
+def source_chain_id(source: Dict, chain: str):
+    """API源中该链的标识，不支持该链时返回None"""
+    chain_key = source.get('chain_key')
+    return CHAINS.get(chain, {}).get(chain_key) if chain_key else None
+
+
+def supports_chain(source: Dict, chain: str) -> bool:
+    """API源是否接入了价格接口并支持该链"""
+    if not (source.get('price_url') or source.get('coin_index')):
+        return False
+    return source_chain_id(source, chain) is not None
+
+
+# ---------- 各API源的URL构造与响应解析 ----------
+
+def jupiter_price_url(source: Dict, chain_id: str, ids: List[str]) -> str:
+    return f"{source['base_url']}/v4/price?ids={','.join(ids)}"
+
+
+def dexscreener_tokens_url(source: Dict, chain_id: str, token_addresses: List[str]) -> str:
+    return f"{source['base_url']}/latest/dex/tokens/{','.join(token_addresses)}"
+
+
+def oneinch_price_url(source: Dict, chain_id: int, token_addresses: List[str]) -> str:
+    return f"{source['base_url']}/price/v1.1/{chain_id}/{','.join(token_addresses)}"
+
+
+def parse_jupiter_prices(data: Dict, chain_id: str, token_addresses: List[str]) -> Dict[str, Quote]:
+    """解析Jupiter价格响应，返回 {代币地址: 报价}"""
+    results = {}
+    prices = data.get('data') or {}
+    now = time.time()
+    for token_address in token_addresses:
+        token_data = prices.get(token_address)
+        if token_data and token_data.get('price') is not None:
+            # v4 价格接口只返回符号（mintSymbol），没有代币全名
+            symbol = token_data.get('mintSymbol') or token_data.get('symbol')
+            results[token_address] = Quote(float(token_data['price']), symbol, symbol, 'Jupiter', now)
+    return results
+
+
+def parse_dexscreener_pairs(data: Dict, chain_id: str, token_addresses: List[str]) -> Dict[str, Quote]:
+    """
+    解析DexScreener交易对响应：只保留该链（chainId）上的交易对，
+    按基础代币分组，每个代币选择流动性最高的交易对
+    """
+    wanted = {address.lower(): address for address in token_addresses}
+    best_pairs = {}
+    for pair in data.get('pairs') or []:
+        if pair.get('chainId', chain_id) != chain_id:
+            continue
+        token_address = wanted.get((pair.get('baseToken') or {}).get('address', '').lower())
+        if not token_address or not pair.get('priceUsd'):
+            continue
+        liquidity = float((pair.get('liquidity') or {}).get('usd', 0))
+        if token_address not in best_pairs or liquidity > best_pairs[token_address][0]:
+            best_pairs[token_address] = (liquidity, pair)
+    
+    now = time.time()
+    return {
+        token_address: Quote(float(pair['priceUsd']), pair['baseToken']['name'], pair['baseToken']['symbol'],
+                             'DexScreener', now, liquidity=liquidity)
+        for token_address, (liquidity, pair) in best_pairs.items()
+    }
+
+
+def parse_oneinch_prices(data: Dict, chain_id: int, token_addresses: List[str]) -> Dict[str, Quote]:
+    """解析1inch价格响应（键为小写合约地址，1inch只返回价格）"""
+    prices = {address.lower(): price for address, price in data.items()}
+    now = time.time()
+    results = {}
+    for token_address in token_addresses:
+        price = prices.get(token_address.lower())
+        if price is not None:
+            results[token_address] = Quote(float(price), source='1inch', timestamp=now)
+    return results
+
+
+def parse_coingecko_prices(price_data: Dict, coins: Dict[str, Dict]) -> Dict[str, Quote]:
+    """从simple/price响应中取出一组币种的价格（coins 为 {代币地址: 币种信息}）"""
+    results = {}
+    for token_address, coin in coins.items():
+        if coin['id'] in price_data and 'usd' in price_data[coin['id']]:
+            results[token_address] = Quote(float(price_data[coin['id']]['usd']), coin['name'], coin['symbol'],
+                                           'CoinGecko')
+    return results
+
+
+def default_sources() -> Dict[str, Dict]:
+    """
+    内置API源配置（每次返回新的字典，追踪器可以修改地址和限额）
+    
+    chain_key 为链配置中该源的链标识键；price_url / parser 为批量价格请求的URL构造和解析方法；
+    coin_index 为True的源（CoinGecko）先通过代币列表把合约地址映射为币种ID，再批量查询价格
+    """
+    return {
+        'coingecko': {
+            'name': 'CoinGecko',
+            'base_url': 'https://api.coingecko.com/api/v3',
+            'headers': {},
+            'sol_mint': 'solana',
+            'rate_limit': 10,  # 每分钟请求数
+            'batch_size': 50,  # 单次批量请求的最大代币数
+            'timeout': 10,     # 请求超时（秒）
+            'confidence': 0.8,  # 共识模式下的报价权重
+            'chain_key': 'coingecko',
+            'coin_index': True,
+            'parser': parse_coingecko_prices
+        },
+        'jupiter': {
+            'name': 'Jupiter',
+            'base_url': 'https://price.jup.ag',
+            'headers': {},
+            'sol_mint': 'So11111111111111111111111111111111111111112',
+            'rate_limit': 100,
+            'batch_size': 100,
+            'timeout': 5,
+            'confidence': 1.0,
+            'chain_key': 'jupiter',
+            'price_url': jupiter_price_url,
+            'parser': parse_jupiter_prices
+        },
+        'solscan': {
+            'name': 'Solscan',
+            'base_url': 'https://api.solscan.io',
+            'headers': {'User-Agent': 'Mozilla/5.0'},
+            'sol_mint': 'So11111111111111111111111111111111111111112',
+            'rate_limit': 20,
+            'timeout': 10
+        },
+        'dexscreener': {
+            'name': 'DexScreener',
+            'base_url': 'https://api.dexscreener.com',
+            'headers': {},
+            'sol_mint': 'So11111111111111111111111111111111111111112',
+            'rate_limit': 300,
+            'batch_size': 30,
+            'timeout': 8,
+            'confidence': 1.0,  # 实际权重再乘以交易对的流动性系数
+            'chain_key': 'dexscreener',
+            'price_url': dexscreener_tokens_url,
+            'parser': parse_dexscreener_pairs
+        },
+        'oneinch': {
+            'name': '1inch',
+            'base_url': 'https://api.1inch.dev',
+            'headers': {'Accept': 'application/json'},
+            'rate_limit': 60,
+            'batch_size': 50,
+            'timeout': 8,
+            'confidence': 1.0,
+            'chain_key': 'oneinch',
+            'price_url': oneinch_price_url,
+            'parser': parse_oneinch_prices
+        }
+    }
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from alerts import (AlertEngine, AlertRule, FileSink, PercentChangeRule, PriceCrossRule,
+                    RatioDeviationRule, RollingWindow, build_rule)
+
+
+def test_rolling_window_evicts_by_time():
+    window = RollingWindow(10)
+    window.add(0, 1.0)
+    window.add(5, 3.0)
+    assert len(window) == 2 and window.first == 1.0 and window.mean == 2.0
+    
+    window.add(12, 5.0)  # ts=0 早于 12 - 10
+    assert len(window) == 2 and window.first == 3.0 and window.mean == 4.0
+    
+    window.evict(100)
+    assert len(window) == 0 and window.total == 0.0
+    assert window.first is None and window.mean is None
+
+
+def test_alert_rule_is_abstract():
+    with pytest.raises(TypeError):
+        AlertRule('incomplete')
+
+
+def test_price_cross_fires_once_per_crossing():
+    rule = PriceCrossRule('cross', above=10)
+    subject = ('TOKEN',)
+    # 第一次观测只建立状态：已经高于阈值也不算穿越
+    assert rule.observe(subject, 0, 11) == []
+    assert rule.observe(subject, 1, 9) == []
+    assert [direction for direction, _ in rule.observe(subject, 2, 10.5)] == ['above']
+    assert rule.observe(subject, 3, 12) == []  # 条件持续成立时不重复告警
+    assert rule.observe(subject, 4, 10) == []  # 阈值本身不算穿越
+    assert [direction for direction, _ in rule.observe(subject, 5, 11)] == ['above']
+
+
+def test_price_cross_tracks_subjects_separately():
+    rule = PriceCrossRule('cross', below=5)
+    assert rule.observe(('A',), 0, 6) == []
+    assert rule.observe(('B',), 0, 4) == []
+    assert [direction for direction, _ in rule.observe(('A',), 1, 4)] == ['below']
+
+
+def test_percent_change_uses_oldest_value_in_window():
+    rule = PercentChangeRule('pct', threshold=0.1, window=60)
+    subject = ('TOKEN',)
+    assert rule.observe(subject, 0, 100) == []
+    assert rule.observe(subject, 30, 105) == []
+    
+    (direction, details), = rule.observe(subject, 50, 112)
+    assert direction == 'up' and details['reference'] == 100
+    assert details['change'] == pytest.approx(0.12)
+    # 起点移出窗口后以 ts=30 的 105 为参考，涨幅低于阈值，条件解除
+    assert rule.observe(subject, 70, 112) == []
+    assert rule.observe(subject, 200, 90) == []  # 窗口内只剩当前值
+    assert [direction for direction, _ in rule.observe(subject, 210, 80)] == ['down']
+
+
+def test_ratio_deviation_needs_min_samples():
+    rule = RatioDeviationRule('dev', threshold=0.05, window=3600, min_samples=3)
+    subject = ('TOKEN',)
+    assert rule.observe(subject, 0, 1.0) == []
+    assert rule.observe(subject, 1, 2.0) == []  # 历史值不足 min_samples，不评估
+    assert rule.observe(subject, 2, 1.0) == []
+    
+    (direction, details), = rule.observe(subject, 3, 1.5)
+    assert direction == 'above'
+    assert details['reference'] == pytest.approx(4 / 3)
+
+
+def test_build_rule_from_config():
+    rule = build_rule({'type': 'price_cross', 'token': 'AbC', 'above': 2})
+    assert isinstance(rule, PriceCrossRule) and rule.name == 'price_cross'
+    assert rule.tokens == {'abc'}
+    assert rule.subject({'token_address': 'ABC'}) == ('ABC',)
+    assert rule.subject({'token_address': 'other'}) is None
+    with pytest.raises(ValueError):
+        build_rule({'type': 'unknown'})
+    with pytest.raises(ValueError):
+        build_rule({'type': 'price_cross'})
+
+
+def test_engine_cooldown_and_delivery(tmp_path):
+    path = tmp_path / 'alerts.jsonl'
+    engine = AlertEngine([PriceCrossRule('cross', above=10)], [FileSink(str(path))], cooldown=300)
+    
+    def record(ts, price):
+        return {'ts': ts, 'token_address': 'TOKEN', 'token_symbol': 'TKN', 'token_price': price}
+    
+    assert engine.observe('prices', [record(1_700_000_000, 9)]) == []
+    fired = engine.observe('prices', [record(1_700_000_001, 11)])
+    assert [alert['id'] for alert in fired] == ['cross:TOKEN:above']
+    # 条件解除后再次穿越，但仍在冷却期内
+    assert engine.observe('prices', [record(1_700_000_002, 9), record(1_700_000_003, 11)]) == []
+    assert engine.observe('comparisons', [record(1_700_000_004, 11)]) == []
+    
+    engine.close()
+    lines = path.read_text(encoding='utf-8').splitlines()
+    assert [json.loads(line)['symbol'] for line in lines] == ['TKN']
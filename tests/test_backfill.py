@@ -0,0 +1,56 @@
+import csv
+import json
+
+from backfill import BackfillCheckpoint, plan_ranges, subtract_ranges
+from history_store import PRICE_CSV_HEADER, CsvHistoryStore, format_timestamp
+
+
+def test_subtract_ranges():
+    assert subtract_ranges(0, 100, []) == [(0, 100)]
+    assert subtract_ranges(0, 100, [[0, 100]]) == []
+    assert subtract_ranges(0, 100, [[10, 20], [50, 60]]) == [(0, 10), (20, 50), (60, 100)]
+    # 覆盖区间超出 [start, end) 的部分被忽略
+    assert subtract_ranges(10, 50, [[0, 20], [40, 80]]) == [(20, 40)]
+    assert subtract_ranges(10, 50, [[0, 5], [60, 70]]) == [(10, 50)]
+
+
+def test_plan_ranges_uses_a_fixed_grid():
+    day = 86400
+    ranges = plan_ranges(2.5 * day, 7 * day, chunk_days=2)
+    assert ranges == [(int(2.5 * day), 4 * day), (4 * day, 6 * day), (6 * day, 7 * day)]
+
+
+def test_checkpoint_mark_merges_adjacent_and_overlapping(tmp_path):
+    path = tmp_path / 'checkpoint.json'
+    checkpoint = BackfillCheckpoint(str(path))
+    checkpoint.mark('prices:A', 20, 30)
+    checkpoint.mark('prices:A', 0, 10)
+    checkpoint.mark('prices:A', 10, 15)  # 与 [0, 10) 相邻
+    checkpoint.mark('prices:A', 25, 40)  # 与 [20, 30) 重叠
+    assert checkpoint.done['prices:A'] == [[0, 15], [20, 40]]
+    assert checkpoint.gaps('prices:A', 0, 50) == [(15, 20), (40, 50)]
+    
+    # 每次 mark 后都已写入文件，重新打开得到相同的状态
+    assert json.loads(path.read_text(encoding='utf-8'))['done'] == {'prices:A': [[0, 15], [20, 40]]}
+    assert BackfillCheckpoint(str(path)).gaps('prices:A', 0, 50) == [(15, 20), (40, 50)]
+
+
+def test_csv_sort_by_time_merges_runs_stably(tmp_path):
+    price_path = tmp_path / 'prices.csv'
+    base = 1_700_000_000
+    # 已有的有序记录后面追加了较早时间的回填记录；同一秒内的记录保持原来的先后顺序
+    times = [base + 10, base + 20, base + 30, base + 0, base + 20, base + 5]
+    with open(price_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(PRICE_CSV_HEADER)
+        for i, ts in enumerate(times):
+            writer.writerow([format_timestamp(ts), f'token{i}'] + [''] * (len(PRICE_CSV_HEADER) - 2))
+    
+    store = CsvHistoryStore(str(price_path), str(tmp_path / 'comparisons.csv'))
+    assert store.sort_by_time('prices', run_lines=2)
+    assert not store.sort_by_time('prices', run_lines=2)
+    
+    with open(price_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == PRICE_CSV_HEADER
+    assert [row[1] for row in rows[1:]] == ['token3', 'token5', 'token0', 'token1', 'token4', 'token2']
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from coin_list import CoinListIndexBuilder, build_coin_list_index, parse_platforms
+
+
+COINS = [
+    {'id': 'wrapped-sol', 'name': 'Wrapped SOL', 'symbol': 'sol',
+     'platforms': {'solana': 'So11111111111111111111111111111111111111112'}},
+    {'id': 'usd-coin', 'name': 'USDC', 'symbol': 'usdc',
+     'platforms': {'ethereum': '0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48', 'base': '0xBASEUSDC'}},
+    {'id': 'no-platforms', 'name': 'Bitcoin', 'symbol': 'btc', 'platforms': {}},
+    {'id': 'bridged-usdc', 'name': 'Bridged USDC 中文', 'symbol': 'usdc.e',
+     'platforms': {'ethereum': '0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48'}},
+]
+
+
+def _chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 7, 64, 1 << 20])
+def test_index_is_independent_of_chunk_boundaries(size):
+    data = json.dumps(COINS, ensure_ascii=False, indent=1).encode('utf-8')
+    index = build_coin_list_index(_chunks(data, size), platforms=('solana', 'ethereum'))
+    
+    assert set(index) == {'solana', 'ethereum'}  # 不索引 base
+    assert index['solana']['so11111111111111111111111111111111111111112']['id'] == 'wrapped-sol'
+    # 同一地址出现在多个币种中时保留第一个
+    assert index['ethereum']['0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48'] == {
+        'id': 'usd-coin', 'name': 'USDC', 'symbol': 'usdc'}
+
+
+def test_builder_counts_coins_and_accepts_str_chunks():
+    builder = CoinListIndexBuilder(['ethereum'])
+    text = json.dumps(COINS)
+    builder.feed(text[:50])
+    builder.feed(text[50:])
+    assert len(builder.close()['ethereum']) == 1
+    assert builder.coins == len(COINS)
+
+
+@pytest.mark.parametrize('data', [b'{"id": "x"}', b'[{"id": "x"', b'[] []'])
+def test_invalid_lists_raise_value_error(data):
+    with pytest.raises(ValueError):
+        build_coin_list_index([data])
+
+
+def test_parse_platforms():
+    assert parse_platforms(' Solana, base ,') == ('solana', 'base')
+    assert parse_platforms('', default=('ethereum',)) == ('ethereum',)
@@ -0,0 +1,124 @@
+import csv
+
+import pytest
+
+from history_store import (COMPARISON_CSV_HEADER, PRICE_CSV_HEADER, CsvHistoryStore, SqliteHistoryStore,
+                           _bisect_timestamp, format_timestamp, parse_time_arg)
+
+
+BASE = 1_700_000_000
+
+
+def _record(ts, token='TOKEN', price=1.0):
+    return {'ts': ts, 'token_address': token, 'token_name': 'Token', 'token_symbol': 'TKN',
+            'sol_price': 100.0, 'token_price': price, 'sol_to_token': 100.0 / price,
+            'token_to_sol': price / 100.0, 'source': 'Jupiter', 'note': ''}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CsvHistoryStore(str(tmp_path / 'prices.csv'), str(tmp_path / 'comparisons.csv'))
+    # 每10秒一条记录，两个代币交替
+    store.append('prices', [_record(BASE + i * 10, token='A' if i % 2 else 'B', price=1 + i) for i in range(100)])
+    store.flush()
+    yield store
+    store.close()
+
+
+def test_bisect_timestamp_finds_first_later_line(store):
+    with open(store.location('prices'), 'rb') as file:
+        start = len(file.readline())
+        end = file.seek(0, 2)
+        for i in (0, 1, 50, 98):
+            position = _bisect_timestamp(file, start, end, format_timestamp(BASE + i * 10))
+            file.seek(position)
+            assert file.readline().decode('utf-8').startswith(format_timestamp(BASE + (i + 1) * 10))
+        assert _bisect_timestamp(file, start, end, format_timestamp(BASE - 1)) == start
+        assert _bisect_timestamp(file, start, end, format_timestamp(BASE + 10000)) == end
+
+
+def test_tail_returns_latest_rows_in_order(store):
+    header, rows = store.tail('prices', 3)
+    assert header == PRICE_CSV_HEADER
+    assert [row[0] for row in rows] == [format_timestamp(BASE + i * 10) for i in (97, 98, 99)]
+
+
+def test_tail_filters_by_token_and_time(store):
+    _, rows = store.tail('prices', 5, token='A', until=BASE + 500)
+    assert [row[1] for row in rows] == ['A'] * 5
+    assert rows[-1][0] == format_timestamp(BASE + 490)
+    
+    _, rows = store.tail('prices', 100, since=BASE + 950)
+    assert [row[0] for row in rows] == [format_timestamp(BASE + i * 10) for i in (95, 96, 97, 98, 99)]
+    
+    _, rows = store.tail('prices', 100, since=BASE + 200, until=BASE + 230)
+    assert len(rows) == 4
+
+
+def test_tail_missing_file(tmp_path):
+    store = CsvHistoryStore(str(tmp_path / 'prices.csv'), str(tmp_path / 'comparisons.csv'))
+    assert store.tail('comparisons', 10) is None
+    assert store.tail('prices', 10) == (PRICE_CSV_HEADER, [])
+
+
+def test_iter_chunks_matches_tail(store):
+    rows = [row for chunk in store.iter_chunks('prices', token='B', since=BASE + 100, until=BASE + 300,
+                                               chunk_size=4) for row in chunk]
+    _, expected = store.tail('prices', 1000, token='B', since=BASE + 100, until=BASE + 300)
+    assert rows == expected and len(rows) == 11
+
+
+def test_slightly_unordered_rows_are_not_dropped(tmp_path):
+    store = CsvHistoryStore(str(tmp_path / 'prices.csv'), str(tmp_path / 'comparisons.csv'))
+    # 两个进程各自缓冲10条记录后写出：每100秒内先写出奇数条，再写出偶数条
+    offsets = [block + i for block in range(0, 1000, 100) for parity in (1, 0) for i in range(parity * 10, 100, 20)]
+    store.append('prices', [_record(BASE + offset) for offset in offsets])
+    store.flush()
+    
+    expected = sorted(format_timestamp(BASE + offset) for offset in offsets if 305 <= offset <= 695)
+    _, rows = store.tail('prices', 1000, since=BASE + 305, until=BASE + 695)
+    assert sorted(row[0] for row in rows) == expected
+    rows = [row for chunk in store.iter_chunks('prices', since=BASE + 305, until=BASE + 695, chunk_size=7)
+            for row in chunk]
+    assert sorted(row[0] for row in rows) == expected
+    store.close()
+
+
+def test_legacy_headers_are_upgraded_on_open(tmp_path):
+    price_path, comparison_path = tmp_path / 'prices.csv', tmp_path / 'comparisons.csv'
+    # 旧版本的文件没有源间价差列
+    legacy = {price_path: PRICE_CSV_HEADER[:10], comparison_path: COMPARISON_CSV_HEADER[:14]}
+    for path, header in legacy.items():
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerow([format_timestamp(BASE), 'OLD, "quoted"'] + ['x'] * (len(header) - 2))
+    
+    store = CsvHistoryStore(str(price_path), str(comparison_path))
+    store.append('prices', [dict(_record(BASE + 10), spread=0.01)])
+    store.close()
+    
+    for path, header, count in ((price_path, PRICE_CSV_HEADER, 3), (comparison_path, COMPARISON_CSV_HEADER, 2)):
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        assert len(rows) == count and rows[0] == header
+        assert all(len(row) == len(header) for row in rows)
+        assert rows[1][1] == 'OLD, "quoted"' and rows[1][-1] == ''
+    assert not store._writers['prices'].upgrade_header()  # 已是当前表头
+
+
+def test_parse_time_arg():
+    assert parse_time_arg('24h', now=BASE) == BASE - 86400
+    assert parse_time_arg('30m', now=BASE) == BASE - 1800
+    assert parse_time_arg(format_timestamp(BASE)) == BASE
+    with pytest.raises(ValueError):
+        parse_time_arg('yesterday')
+
+
+def test_sqlite_import_csv_commits_in_chunks(store, tmp_path):
+    sqlite_store = SqliteHistoryStore(str(tmp_path / 'prices.db'))
+    assert sqlite_store.import_csv('prices', store.location('prices'), chunk_size=30) == 100
+    rows = [row for chunk in sqlite_store.iter_chunks('prices') for row in chunk]
+    assert [row[0] for row in rows] == [BASE + i * 10 for i in range(100)]
+    assert rows[-1][1] == 'A' and rows[-1][5] == 100.0
+    sqlite_store.close()
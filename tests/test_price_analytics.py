@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from price_analytics import parse_interval, resample_ohlc, rolling_volatility
+
+
+def test_resample_ohlc_buckets_by_interval():
+    ts = np.array([0, 10, 59, 60, 125, 130], dtype=float)
+    values = np.array([1.0, 3.0, 2.0, 5.0, 4.0, 6.0])
+    candles = resample_ohlc(ts, values, 60)
+    
+    np.testing.assert_array_equal(candles['ts'], [0, 60, 120])
+    np.testing.assert_array_equal(candles['open'], [1.0, 5.0, 4.0])
+    np.testing.assert_array_equal(candles['high'], [3.0, 5.0, 6.0])
+    np.testing.assert_array_equal(candles['low'], [1.0, 5.0, 4.0])
+    np.testing.assert_array_equal(candles['close'], [2.0, 5.0, 6.0])
+    np.testing.assert_array_equal(candles['count'], [3, 1, 2])
+
+
+def test_resample_ohlc_skips_missing_values_and_empty_input():
+    candles = resample_ohlc(np.array([0.0, 1.0, 2.0]), np.array([np.nan, 2.0, np.nan]), 60)
+    np.testing.assert_array_equal(candles['open'], [2.0])
+    np.testing.assert_array_equal(candles['count'], [1])
+    
+    empty = resample_ohlc(np.array([0.0]), np.array([np.nan]), 60)
+    assert all(len(column) == 0 for column in empty.values())
+
+
+def test_rolling_volatility_matches_sample_std():
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0, 0.02, 200) + 5.0  # 均值远离0时检查数值稳定性
+    window = 24
+    result = rolling_volatility(returns, window)
+    
+    assert np.isnan(result[:window - 1]).all()
+    expected = [np.std(returns[i - window + 1:i + 1], ddof=1) for i in range(window - 1, len(returns))]
+    np.testing.assert_allclose(result[window - 1:], expected, rtol=1e-9, atol=1e-12)
+
+
+def test_rolling_volatility_short_series_is_all_nan():
+    assert np.isnan(rolling_volatility(np.array([0.1, 0.2]), 5)).all()
+    assert np.isnan(rolling_volatility(np.array([0.1, 0.2, 0.3]), 1)).all()
+
+
+def test_parse_interval():
+    assert parse_interval('15m') == 900
+    assert parse_interval('1h') == 3600
+    assert parse_interval('1d') == 86400
+    with pytest.raises(ValueError):
+        parse_interval('0h')
@@ -0,0 +1,75 @@
+import numpy as np
+
+from quotes import Quote
+from ratio_matrix import (SOL_MINT, RatioMatrix, build_ratio_matrix, moved_pairs,
+                          outer_ratios, parse_basket_entry)
+
+
+def _matrix(keys, prices, ts=0.0):
+    chains = [key.split(':')[0] for key in keys]
+    addresses = [key.split(':')[1] for key in keys]
+    return RatioMatrix(ts, chains, addresses, addresses, [''] * len(keys), np.array(prices, dtype=float))
+
+
+def test_outer_ratios():
+    ratios = outer_ratios(np.array([2.0, 4.0, 8.0]))
+    np.testing.assert_allclose(ratios, [[1, 0.5, 0.25], [2, 1, 0.5], [4, 2, 1]])
+
+
+def test_outer_ratios_masks_invalid_prices():
+    ratios = outer_ratios(np.array([2.0, np.nan, 0.0, 4.0]))
+    assert np.isnan(ratios[1]).all() and np.isnan(ratios[:, 1]).all()
+    assert np.isnan(ratios[2]).all() and np.isnan(ratios[:, 2]).all()
+    assert ratios[0, 3] == 0.5
+
+
+def test_moved_pairs_reports_each_pair_once_sorted_by_change():
+    previous = _matrix(['solana:A', 'solana:B', 'solana:C'], [1.0, 1.0, 1.0])
+    current = _matrix(['solana:A', 'solana:B', 'solana:C'], [1.0, 1.5, 1.02])
+    moves = moved_pairs(current, previous, threshold=0.05)
+    
+    # A/C 只变化约2%，低于阈值
+    assert [(move['base'], move['quote']) for move in moves] == [(1, 2), (0, 1)]
+    np.testing.assert_allclose(moves[0]['change'], 1.5 / 1.02 - 1)
+    np.testing.assert_allclose(moves[1]['change'], 1 / 1.5 - 1)
+    assert moves[1]['previous'] == 1.0
+
+
+def test_moved_pairs_matches_tokens_by_key_and_skips_missing_prices():
+    previous = _matrix(['solana:A', 'base:B', 'solana:C'], [1.0, 2.0, 4.0])
+    # 代币顺序变化、新增代币 D、C 缺少价格
+    current = _matrix(['solana:D', 'base:B', 'solana:C', 'solana:A'], [9.0, 4.0, np.nan, 1.0])
+    moves = moved_pairs(current, previous, threshold=0.1)
+    
+    assert len(moves) == 1
+    assert {current.keys[moves[0]['base']], current.keys[moves[0]['quote']]} == {'solana:A', 'base:B'}
+    assert moved_pairs(current, _matrix(['solana:Z'], [1.0]), threshold=0.1) == []
+
+
+def test_build_ratio_matrix_prepends_sol():
+    basket = [('solana', 'A'), ('ethereum', '0xB')]
+    quotes = {('solana', 'A'): (Quote(2.0, symbol='AAA'), 'Jupiter')}
+    matrix = build_ratio_matrix(basket, quotes, sol_price=100.0)
+    
+    assert matrix.keys == [f'solana:{SOL_MINT}', 'solana:A', 'ethereum:0xB']
+    assert matrix.symbols == ['SOL', 'AAA', '0xB']
+    assert matrix.priced == 2
+    assert matrix.ratios[0, 1] == 50.0
+
+
+def test_save_and_load_round_trip(tmp_path):
+    matrix = _matrix(['solana:A', 'base:0xB'], [1.5, np.nan], ts=123.0)
+    path = str(tmp_path / 'matrix.npz')
+    matrix.save(path)
+    loaded = RatioMatrix.load(path)
+    
+    assert loaded.ts == 123.0 and loaded.keys == matrix.keys
+    np.testing.assert_array_equal(loaded.ratios, matrix.ratios)
+    assert RatioMatrix.load(str(tmp_path / 'missing.npz')) is None
+
+
+def test_parse_basket_entry():
+    assert parse_basket_entry('base:0xAbc') == ('base', '0xAbc')
+    assert parse_basket_entry('0xAbc', default_chain='bsc') == ('bsc', '0xAbc')
+    assert parse_basket_entry('So1ana') == ('solana', 'So1ana')
+    assert parse_basket_entry({'address': ' 0xAbc ', 'chain': 'Polygon'}) == ('polygon', '0xAbc')
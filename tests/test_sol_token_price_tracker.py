@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from mock_api import MockApiServer, synthetic_address  # noqa: E402
+
+
+@pytest.fixture
+def mock():
+    server = MockApiServer(coin_list_size=50, jitter=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def tracker(mock, tmp_path, monkeypatch):
+    """指向模拟API的追踪器：不限流、不持久化缓存和健康度，历史写入临时目录"""
+    monkeypatch.chdir(tmp_path)
+    for name, value in {'CACHE_BACKEND': 'memory', 'SOURCE_HEALTH_PATH': '', 'ADAPTIVE_RANKING': 'false',
+                        'CONCURRENT_FETCH': 'false', 'CONSENSUS_MODE': 'false', 'ALERT_RULES': '',
+                        'PREFERRED_APIS': 'jupiter,dexscreener,coingecko', 'HTTP_BACKOFF': '0.01'}.items():
+        monkeypatch.setenv(name, value)
+    from sol_token_price_tracker import MultiApiSolTokenTracker
+    
+    tracker = MultiApiSolTokenTracker()
+    mock.point_tracker(tracker)
+    for name in tracker.sources:
+        tracker.rate_limiter.configure(name, None)
+    return tracker
+
+
+def test_429_defers_the_source_and_falls_back_without_waiting(tracker, mock):
+    token = synthetic_address(7)
+    mock.error_rate, mock.error_status = 1.0, 429
+    assert tracker.get_token_price('jupiter', token) is None
+    assert mock.request_counts['jupiter'] == 1  # 429 不重试
+    assert tracker.rate_limiter.deferred('jupiter') > 25
+    
+    mock.error_rate = 0.0
+    start = time.monotonic()
+    sol_price, token_info, source = tracker.get_multi_api_prices(token)
+    assert time.monotonic() - start < 2
+    assert token_info is not None and 'DexScreener' in source
+    assert mock.request_counts['jupiter'] == 1  # 暂停期间没有再请求Jupiter
+
+
+def test_read_timeout_is_not_retried(tracker, mock):
+    token = synthetic_address(8)
+    mock.latency['jupiter'] = 1.0
+    tracker.sources['jupiter']['timeout'] = 0.2
+    start = time.monotonic()
+    assert tracker.get_token_price('jupiter', token) is None
+    assert time.monotonic() - start < 0.8
+    assert mock.request_counts['jupiter'] == 1
+
+
+def test_retry_backoff_is_clamped_to_the_deadline(tracker, mock):
+    tracker.rate_limit_max_wait = None
+    tracker.http_pool.respect_retry_after = True
+    assert tracker._retry_backoff(0, '120') == 120
+    assert tracker._retry_backoff(0, '120', deadline=time.monotonic() + 1) is None
+    assert tracker._retry_backoff(0, deadline=time.monotonic() + 1) is not None
+
+
+def test_concurrent_callers_share_one_executor(tracker):
+    from concurrent.futures import ThreadPoolExecutor
+    
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        executors = set(map(id, pool.map(lambda _: tracker._get_executor(), range(64))))
+    assert len(executors) == 1